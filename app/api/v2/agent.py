@@ -191,6 +191,9 @@ async def agentic_task(
         loop.executor.work_dir = loop.work_dir
         os.makedirs(loop.work_dir, exist_ok=True)
     
+    # 在建立 SSE 响应的同时预热到模型 API 的连接
+    await loop.prepare()
+    
     logger.info(
         f"[Agentic] User {user_id} starting task, model={request.model}, "
         f"work_dir={loop.work_dir}, max_turns={request.max_turns}"
@@ -256,6 +259,8 @@ async def agentic_create_project(
         system_prompt=request.system_prompt
     )
     
+    await loop.prepare()
+    
     logger.info(f"[Agentic] User {user_id} creating project via agentic loop, project_id={project_id}")
     
     try:
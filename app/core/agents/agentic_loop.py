@@ -29,17 +29,25 @@ v5 全部保留: view_truncated, batch_commands, run_script, revert_edit
 
 import os
 import re
-import json
+import shlex
+import signal
 import asyncio
+import threading
 import logging
 import uuid
 import difflib
+import fnmatch
+import itertools
 import time
 import tempfile
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 from typing import Dict, Any, List, Optional, AsyncGenerator, Tuple
 from datetime import datetime
 from pathlib import Path
 
+import orjson
+
 from .tool_registry import ToolRegistry, ToolCategory, PermissionLevel
 from .context_manager import (
     ContextManager, estimate_tokens, estimate_messages_tokens, estimate_message_tokens
@@ -60,6 +68,9 @@ MAX_DISPLAY_RESULT = 3_000
 HEARTBEAT_INTERVAL = 15.0
 API_MAX_RETRIES = 3
 API_BASE_DELAY = 1.0
+# 每轮 max_tokens 自适应: 输出远小于上限时减半, 接近上限时翻倍 (下限保证一次 write_file 不被截断)
+AGENT_MAX_TOKENS = 16384
+AGENT_MIN_TOKENS = 4096
 MAX_SUBAGENT_DEPTH = 2
 MAX_TODO_ITEMS = 50
 
@@ -72,12 +83,218 @@ MODEL_PRICING = {
     "_default":                  {"input": 3.0,   "output": 15.0},
 }
 
-SKIP_DIRS = {
+SKIP_DIRS = frozenset({
     '__pycache__', '.git', 'node_modules', '.venv', 'venv',
     '.cache', '.mypy_cache', '.pytest_cache', '.tox',
     'dist', 'build', '.egg-info', '.eggs', 'htmlcov',
     '.next', '.nuxt', 'coverage'
+})
+
+# 结果只取决于工作区内容、可以缓存的只读工具
+CACHEABLE_TOOLS = frozenset({"read_file", "list_dir", "grep_search"})
+# 不会改动文件的工具 (执行时不清空结果缓存); 其余工具一律视为可能写文件
+READ_ONLY_TOOLS = CACHEABLE_TOOLS | {
+    "batch_read", "file_search", "glob", "view_truncated",
+    "web_search", "web_fetch", "todo_read", "memory_read", "task_complete",
 }
+# 只改写参数 path 指向的单个文件的工具: 只失效与该文件相关的缓存条目
+PATH_WRITE_TOOLS = frozenset({"write_file", "edit_file", "multi_edit"})
+TOOL_CACHE_SIZE = 256
+# 流式响应中可以在模型继续生成时提前执行的工具 (只读, 无副作用)
+PREFETCH_TOOLS = READ_ONLY_TOOLS - {"task_complete"}
+# 单个 chunk 内并行执行的工具数上限, 避免同时压满文件系统/shell
+MAX_PARALLEL_TOOLS = 5
+# 进程级子进程并发上限: 多个会话同时跑 bash 等工具时避免无限 fork
+TOOL_SUBPROCESS_LIMIT = max(4, (os.cpu_count() or 1) * 2)
+_SUBPROCESS_SEM = asyncio.Semaphore(TOOL_SUBPROCESS_LIMIT)
+_subprocess_active = 0
+_subprocess_waiting = 0
+
+
+@asynccontextmanager
+async def _subprocess_slot():
+    """占用一个子进程名额, 覆盖从启动到 communicate() 结束的整个进程生命周期"""
+    global _subprocess_active, _subprocess_waiting
+    _subprocess_waiting += 1
+    try:
+        await _SUBPROCESS_SEM.acquire()
+    finally:
+        _subprocess_waiting -= 1
+    _subprocess_active += 1
+    try:
+        yield
+    finally:
+        _subprocess_active -= 1
+        _SUBPROCESS_SEM.release()
+
+
+async def _reap(proc: asyncio.subprocess.Process) -> None:
+    """杀掉子进程所在的整个进程组 (需 start_new_session=True 启动) 并等待其退出"""
+    if proc.returncode is None:
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    await proc.wait()
+
+
+async def _communicate(proc: asyncio.subprocess.Process, timeout: float) -> Tuple[bytes, bytes]:
+    """带超时的 communicate(); 超时或被取消时先回收进程再抛出, 名额不会提前释放"""
+    try:
+        return await asyncio.wait_for(proc.communicate(), timeout=timeout)
+    except BaseException:
+        await _reap(proc)
+        raise
+
+
+def tool_subprocess_stats() -> Dict[str, int]:
+    """子进程名额使用情况 (供 /health 展示)"""
+    return {"active": _subprocess_active, "waiting": _subprocess_waiting,
+            "limit": TOOL_SUBPROCESS_LIMIT}
+
+
+# grep_search: 每个文件最多报告的匹配行数 (同 grep --max-count), 以及判定二进制文件时读取的字节数
+GREP_MAX_PER_FILE = 50
+GREP_BINARY_PROBE = 8192
+# BRE 方括号表达式中的 POSIX 字符类 -> Python 字符集内容
+_POSIX_CLASSES = {
+    "alpha": "a-zA-Z", "digit": "0-9", "alnum": "a-zA-Z0-9", "upper": "A-Z",
+    "lower": "a-z", "space": " \\t\\n\\r\\f\\v", "blank": " \\t", "xdigit": "0-9A-Fa-f",
+    "punct": "!-/:-@\\[-`{-~",
+}
+
+
+def _bre_to_re(pattern: str) -> str:
+    """
+    把 grep 默认的 POSIX 基本正则 (BRE, 含 GNU 扩展) 翻译成 Python re 语法,
+    使进程内扫描与 `grep -rn` 的匹配结果一致。无法翻译时抛出 re.error。
+    """
+    out: List[str] = []
+    i, n = 0, len(pattern)
+    # 当前位置是否处于表达式开头 (此处的 * 是字面量, ^ 是锚点)
+    at_start = True
+    while i < n:
+        c = pattern[i]
+        if c == "\\" and i + 1 < n:
+            nxt = pattern[i + 1]
+            i += 2
+            if nxt in "(|":
+                out.append(nxt)
+                at_start = True
+                continue
+            if nxt in "){}+?":
+                out.append(nxt)
+            elif nxt in "<>":
+                out.append("\\b")
+            else:
+                out.append("\\" + nxt)
+            at_start = False
+            continue
+        if c == "[":
+            j = i + 1
+            body: List[str] = []
+            if j < n and pattern[j] == "^":
+                body.append("^")
+                j += 1
+            if j < n and pattern[j] == "]":
+                body.append("\\]")
+                j += 1
+            while j < n and pattern[j] != "]":
+                if pattern.startswith("[:", j):
+                    end = pattern.find(":]", j + 2)
+                    if end == -1 or pattern[j + 2:end] not in _POSIX_CLASSES:
+                        raise re.error(f"unsupported bracket expression in {pattern!r}")
+                    body.append(_POSIX_CLASSES[pattern[j + 2:end]])
+                    j = end + 2
+                    continue
+                ch = pattern[j]
+                body.append("\\" + ch if ch in "\\[&~|" else ch)
+                j += 1
+            if j >= n:
+                raise re.error(f"unterminated [ in {pattern!r}")
+            out.append("[" + "".join(body) + "]")
+            i = j + 1
+            at_start = False
+            continue
+        i += 1
+        if c == "*" and at_start:
+            out.append("\\*")
+        elif c == "^":
+            out.append("^" if at_start else "\\^")
+            continue  # ^ 之后仍视为开头
+        elif c == "$":
+            anchor = i == n or pattern.startswith(("\\)", "\\|"), i)
+            out.append("$" if anchor else "\\$")
+        elif c in "|(){}+?":
+            out.append("\\" + c)
+        else:
+            out.append(c)
+        at_start = False
+    return "".join(out)
+
+
+def _dumps(obj: Any) -> str:
+    """工具结果序列化 (orjson, 保留非 ASCII 字符, 允许非字符串键)"""
+    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
+
+def _clip(value: Any, limit: int) -> Any:
+    """截短参数中的长字符串 / 长列表, 预览时不必序列化完整内容 (如 write_file 的 content)"""
+    if isinstance(value, str):
+        return value if len(value) <= limit else value[:limit]
+    if isinstance(value, dict):
+        return {k: _clip(v, limit) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_clip(v, limit) for v in value[:limit // 10 + 1]]
+    return value
+
+
+def preview_args(args: Any, limit: int = 100) -> str:
+    """工具参数的单行 JSON 预览 (最多 limit 个字符), 供日志 / 控制台展示 tool_start 事件"""
+    if not args:
+        return ""
+    text = _dumps(_clip(args, limit))
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+def _tool_failed(result: str) -> bool:
+    """
+    根据解析后的工具结果判断是否失败: error 字段、非零 exit_code、
+    success / passed 为 False 或 batch_commands 有失败的命令。
+    非 JSON 结果 (如 list_dir 的文本) 沿用开头是否出现 "error" 的判断。
+    """
+    try:
+        data = orjson.loads(result)
+    except orjson.JSONDecodeError:
+        return "error" in result.lower()[:50]
+    if not isinstance(data, dict):
+        return False
+    return bool(
+        data.get("error")
+        or data.get("exit_code") not in (None, 0)
+        or data.get("success") is False
+        or data.get("passed") is False
+        or data.get("failed")
+    )
+
+
+def _truncate_output(text: str, limit: int = MAX_TOOL_OUTPUT_LEN) -> str:
+    """
+    超长工具输出保留头部 60% + 尾部 40% (报错信息和统计通常在末尾),
+    尽量在行边界切开, 并标明省略的字符数。
+    """
+    if len(text) <= limit:
+        return text
+    head = limit * 3 // 5
+    tail_start = len(text) - (limit - head)
+    cut = text.rfind("\n", 0, head)
+    if cut > head // 2:
+        head = cut
+    cut = text.find("\n", tail_start, tail_start + (limit - head) // 2)
+    if cut != -1:
+        tail_start = cut + 1
+    return f"{text[:head]}\n...[truncated {tail_start - head} chars]...\n{text[tail_start:]}"
+
 
 def estimate_cost(model: str, input_tokens: int, output_tokens: int) -> float:
     pricing = MODEL_PRICING.get(model, MODEL_PRICING["_default"])
@@ -222,7 +439,7 @@ TOOL_DEFINITIONS = [
         "input_schema": {
             "type": "object",
             "properties": {
-                "pattern": {"type": "string", "description": "Search pattern (regex)"},
+                "pattern": {"type": "string", "description": "Search pattern (grep basic regex, as in `grep -rn`: use \\| \\( \\) \\{ \\} \\+ \\? for operators)"},
                 "path": {"type": "string", "description": "Directory to search"},
                 "include": {"type": "string", "description": "File glob, e.g. '*.py'"}
             },
@@ -266,7 +483,10 @@ TOOL_DEFINITIONS = [
     },
     {
         "name": "task_complete",
-        "description": "Signal task completion with a structured summary.",
+        "description": (
+            "Signal task completion with a structured summary. May be called in the same "
+            "response as your final tool calls; it runs after them and is ignored if any of them fails."
+        ),
         "input_schema": {
             "type": "object",
             "properties": {
@@ -574,7 +794,9 @@ and present files for download with present_files.
    - Use batch_commands for multi-step diagnostics
    - Use revert_to_checkpoint if a fix causes new failures
 
-6. **Completion**: Call task_complete with a clear summary when done.
+6. **Completion**: Call task_complete with a clear summary when done. If your last
+   action needs no follow-up (e.g. a final verification command), call task_complete
+   in the same response as that tool call instead of waiting another turn.
 
 7. **Be concise**: Focus on actions. No emojis. Use absolute paths."""
 
@@ -628,6 +850,85 @@ class TodoManager:
 # 工具执行器 (v7: 集成 PermissionGate + 计时 + ToolRegistry 统计)
 # =============================================================================
 
+class PersistentShell:
+    """
+    常驻 bash 进程 (可选, 见 ToolExecutor 的 persistent_shell 参数)。
+
+    每条命令以子 shell `( cd DIR; eval 'cmd' ) </dev/null` 在其中执行, 省掉每次
+    fork + exec + bash 初始化; 子 shell 保证 cd / export / exit 不影响下一条命令,
+    eval 把引号不配对、多余的 `)` 等语法错误限制在这条命令内。子 shell 退出前
+    wait 其后台任务, 与一次性 shell 等待管道关闭的行为一致 (setsid 等脱离的进程除外)。
+    输出以随机标记行结束, stdout 的标记行后附带退出码。超时时杀掉整个进程组,
+    下次调用重新启动。new_v5_files/command_tools.py 中的同名类采用同一脚本结构。
+    """
+    READ_CHUNK = 65536
+
+    def __init__(self):
+        self._proc: Optional[asyncio.subprocess.Process] = None
+        self._lock = asyncio.Lock()
+
+    async def _ensure(self) -> asyncio.subprocess.Process:
+        if self._proc is None or self._proc.returncode is not None:
+            self._proc = await asyncio.create_subprocess_exec(
+                "bash", "--noprofile", "--norc",
+                stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE, start_new_session=True,
+            )
+        return self._proc
+
+    async def run(self, command: str, cwd: str, timeout: float) -> Tuple[int, bytes, bytes]:
+        """执行命令, 返回 (exit_code, stdout, stderr); 超时抛出 asyncio.TimeoutError"""
+        async with self._lock:
+            proc = await self._ensure()
+            marker = f"__CHEAPBUY_END_{uuid.uuid4().hex}__"
+            d = shlex.quote(cwd)
+            script = (
+                f"( cd {d} || exit 1; export HOME={d}; trap wait EXIT; "
+                f"eval {shlex.quote(command)} ) </dev/null\n"
+                f"printf '\\n{marker}%d\\n' \"$?\"; printf '\\n{marker}\\n' >&2\n"
+            )
+            try:
+                proc.stdin.write(script.encode('utf-8'))
+                await proc.stdin.drain()
+                (out, rc), (err, _) = await asyncio.wait_for(asyncio.gather(
+                    self._read_until(proc.stdout, marker.encode()),
+                    self._read_until(proc.stderr, marker.encode()),
+                ), timeout=timeout)
+            except BaseException:
+                # 超时 / 取消 / shell 异常退出: 状态未知, 丢弃这个进程并等它退出
+                self._proc = None
+                await _reap(proc)
+                raise
+        return int(rc or -1), out, err
+
+    async def _read_until(self, stream: asyncio.StreamReader, marker: bytes) -> Tuple[bytes, bytes]:
+        """读到 "\\n<marker>...\\n" 为止, 返回 (标记前的输出, 标记行剩余部分)"""
+        sep = b"\n" + marker
+        buf = bytearray()
+        start = 0
+        while True:
+            idx = buf.find(sep, start)
+            if idx != -1:
+                end = buf.find(b"\n", idx + len(sep))
+                if end != -1:
+                    return bytes(buf[:idx]), bytes(buf[idx + len(sep):end])
+            else:
+                start = max(0, len(buf) - len(sep))
+            chunk = await stream.read(self.READ_CHUNK)
+            if not chunk:
+                raise ConnectionResetError("persistent shell exited")
+            buf += chunk
+
+    def close(self):
+        """结束 shell 及其仍在运行的子进程"""
+        proc, self._proc = self._proc, None
+        if proc is not None and proc.returncode is None:
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+
 class ToolExecutor:
     MAX_DISPLAY_LINES = 200
     MAX_HEAD_LINES = 100
@@ -636,7 +937,8 @@ class ToolExecutor:
     def __init__(self, work_dir: str, tool_registry: ToolRegistry = None,
                  permission_gate: PermissionGate = None,
                  revert_manager: RevertManager = None,
-                 diff_tracker: DiffTracker = None):
+                 diff_tracker: DiffTracker = None,
+                 persistent_shell: bool = False):
         self.work_dir = os.path.abspath(work_dir)
         os.makedirs(self.work_dir, exist_ok=True)
         self.file_changes: List[Dict[str, Any]] = []
@@ -646,10 +948,7 @@ class ToolExecutor:
         self.revert_manager = revert_manager or RevertManager()
         self.diff_tracker = diff_tracker or DiffTracker()
         self.memory_file = os.path.join(self.work_dir, ".cheapbuy_memory.md")
-
-    async def execute(self, tool_name: str, tool_input: Dict[str, Any]) -> str:
-        """Execute a tool with timing and permission checking"""
-        handlers = {
+        self._handlers = {
             "bash": self._bash, "read_file": self._read_file,
             "batch_read": self._batch_read, "write_file": self._write_file,
             "edit_file": self._edit_file, "multi_edit": self._multi_edit,
@@ -674,16 +973,42 @@ class ToolExecutor:
             "install_package": self._install_package,
             "present_files": self._present_files,
         }
-        handler = handlers.get(tool_name)
+        # 只读工具结果缓存: 任何可能改动文件的工具执行前后都会清空
+        self._result_cache: "OrderedDict[tuple, str]" = OrderedDict()
+        self._cache_generation = 0
+        # bash 工具复用常驻 shell (默认关闭: 每条命令一个独立进程)
+        self._shell = PersistentShell() if persistent_shell else None
+
+    def close(self):
+        """释放常驻 shell 等进程资源"""
+        if self._shell is not None:
+            self._shell.close()
+
+    async def execute(self, tool_name: str, tool_input: Dict[str, Any]) -> str:
+        """Execute a tool with timing and permission checking"""
+        handler = self._handlers.get(tool_name)
         if not handler:
-            return json.dumps({"error": f"Unknown tool: {tool_name}"})
+            return _dumps({"error": f"Unknown tool: {tool_name}"})
 
         # v7: Permission check
         risk = self.permission_gate.assess_tool(tool_name, tool_input)
         if risk == RiskLevel.BLOCKED:
-            return json.dumps({"error": f"Command blocked for safety: {tool_input.get('command', '')[:100]}",
+            return _dumps({"error": f"Command blocked for safety: {tool_input.get('command', '')[:100]}",
                                "risk_level": "blocked"})
 
+        cache_key = None
+        if tool_name in CACHEABLE_TOOLS:
+            cache_key = self._cache_key(tool_name, tool_input)
+            cached = self._result_cache.get(cache_key)
+            if cached is not None:
+                self._result_cache.move_to_end(cache_key)
+                if self.tool_registry:
+                    self.tool_registry.record_call(tool_name, 0.0, error=False)
+                return cached
+        else:
+            self._invalidate_for(tool_name, tool_input)
+        generation = self._cache_generation
+
         # v7: Timed execution
         start_ms = time.time() * 1000
         try:
@@ -692,13 +1017,58 @@ class ToolExecutor:
             # Record stats in registry
             if self.tool_registry:
                 self.tool_registry.record_call(tool_name, duration_ms, error=False)
+            if cache_key is not None:
+                # 执行期间有写操作(并行调用)时结果可能已过期, 不缓存
+                if generation == self._cache_generation and not result.startswith('{"error"'):
+                    self._result_cache[cache_key] = result
+                    if len(self._result_cache) > TOOL_CACHE_SIZE:
+                        self._result_cache.popitem(last=False)
+            else:
+                self._invalidate_for(tool_name, tool_input)
             return result
         except Exception as e:
             duration_ms = time.time() * 1000 - start_ms
             if self.tool_registry:
                 self.tool_registry.record_call(tool_name, duration_ms, error=True)
+            if tool_name not in CACHEABLE_TOOLS:
+                self._invalidate_for(tool_name, tool_input)
             logger.error(f"Tool {tool_name} error: {e}", exc_info=True)
-            return json.dumps({"error": f"Tool execution failed: {str(e)}"})
+            return _dumps({"error": f"Tool execution failed: {str(e)}"})
+
+    def _cache_key(self, tool_name: str, tool_input: Dict[str, Any]) -> tuple:
+        """缓存键: 工具名 + 目标路径 + 参数 + 目标路径的 stat (捕获执行器之外的修改)"""
+        try:
+            target = os.path.normpath(self._resolve(tool_input.get("path", ".")))
+            st = os.stat(target)
+            stat_key = (st.st_ino, st.st_mtime_ns, st.st_size)
+        except (OSError, TypeError):
+            target, stat_key = None, None
+        return (tool_name, target, orjson.dumps(tool_input, default=str, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS), stat_key)
+
+    def _invalidate_cache(self):
+        self._cache_generation += 1
+        self._result_cache.clear()
+
+    def _invalidate_for(self, tool_name: str, tool_input: Dict[str, Any]):
+        """
+        写操作后失效缓存。单文件写工具只清除该文件本身及其上级目录
+        (list_dir / grep_search 结果) 的条目; 其他可能写文件的工具清空全部。
+        """
+        if tool_name in READ_ONLY_TOOLS:
+            return
+        path = tool_input.get("path") if tool_name in PATH_WRITE_TOOLS else None
+        if not isinstance(path, str):
+            self._invalidate_cache()
+            return
+        self._cache_generation += 1
+        written = os.path.normpath(self._resolve(path))
+        stale = [
+            key for key in self._result_cache
+            if key[1] is None or key[1] == written
+            or written.startswith(key[1].rstrip(os.sep) + os.sep)
+        ]
+        for key in stale:
+            del self._result_cache[key]
 
     async def execute_parallel(self, tool_calls: List[Tuple[str, Dict, str]]) -> List[Tuple[str, str, str]]:
         """并行执行多个工具"""
@@ -715,44 +1085,58 @@ class ToolExecutor:
         timeout = min(params.get("timeout", 120), 600)
         risk = self.permission_gate.assess(command)
         try:
-            proc = await asyncio.create_subprocess_shell(
-                command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
-                cwd=self.work_dir, env={**os.environ, "HOME": self.work_dir, "PWD": self.work_dir}
-            )
-            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=timeout)
+            async with _subprocess_slot():
+                if self._shell is not None:
+                    returncode, stdout, stderr = await self._shell.run(command, self.work_dir, timeout)
+                else:
+                    proc = await asyncio.create_subprocess_shell(
+                        command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+                        cwd=self.work_dir, env={**os.environ, "HOME": self.work_dir, "PWD": self.work_dir},
+                        start_new_session=True,
+                    )
+                    stdout, stderr = await _communicate(proc, timeout)
+                    returncode = proc.returncode
             out = stdout.decode('utf-8', errors='replace')
             err = stderr.decode('utf-8', errors='replace')
             if len(out) > 10000:
                 out = out[:5000] + f"\n...[{len(out)-10000} chars truncated]...\n" + out[-5000:]
             if len(err) > 5000:
                 err = err[:5000] + "\n...[truncated]"
-            return json.dumps({"exit_code": proc.returncode, "stdout": out, "stderr": err,
+            return _dumps({"exit_code": returncode, "stdout": out, "stderr": err,
                                "risk_level": risk.value})
         except asyncio.TimeoutError:
-            return json.dumps({"error": f"Command timed out after {timeout}s", "exit_code": -1})
+            return _dumps({"error": f"Command timed out after {timeout}s", "exit_code": -1})
+        except ConnectionResetError as e:
+            return _dumps({"error": f"Shell exited unexpectedly: {e}", "exit_code": -1})
 
     async def _read_file(self, params: Dict) -> str:
+        # 文件读取与格式化放到线程中, 不阻塞事件循环 (并行 chunk 中的其他工具 / 流式输出)
+        return await asyncio.to_thread(self._read_file_sync, params)
+
+    def _read_file_sync(self, params: Dict) -> str:
         path = self._resolve(params["path"])
         if not os.path.exists(path):
-            return json.dumps({"error": f"File not found: {path}"})
+            return _dumps({"error": f"File not found: {path}"})
         if not os.path.isfile(path):
-            return json.dumps({"error": f"Not a file: {path}"})
+            return _dumps({"error": f"Not a file: {path}"})
         try:
             sz = os.path.getsize(path)
+            has_range = "start_line" in params or "end_line" in params
+            if has_range:
+                return self._read_range(path, params, sz)
             if sz > 500_000:
-                return json.dumps({"error": f"File too large ({sz} bytes). Use start_line/end_line.", "file_size": sz})
+                return _dumps({"error": f"File too large ({sz} bytes). Use start_line/end_line.", "file_size": sz})
             with open(path, 'r', encoding='utf-8', errors='replace') as f:
                 lines = f.readlines()
             total = len(lines)
             fname = os.path.basename(path)
-            has_range = "start_line" in params or "end_line" in params
-            if not has_range and total > self.MAX_DISPLAY_LINES:
+            if total > self.MAX_DISPLAY_LINES:
                 head = "".join(f"{i:4d} | {lines[i-1]}" for i in range(1, self.MAX_HEAD_LINES + 1))
                 tail = "".join(f"{i:4d} | {lines[i-1]}" for i in range(total - self.MAX_TAIL_LINES + 1, total + 1))
                 omit = total - self.MAX_HEAD_LINES - self.MAX_TAIL_LINES
                 ts, te = self.MAX_HEAD_LINES + 1, total - self.MAX_TAIL_LINES
                 content = head + f"\n... [{omit} lines truncated — use start_line/end_line to view {ts}-{te}] ...\n\n" + tail
-                return json.dumps({
+                return _dumps({
                     "path": path, "filename": fname, "total_lines": total,
                     "lines": f"1-{self.MAX_HEAD_LINES}+{total-self.MAX_TAIL_LINES+1}-{total}/{total}",
                     "content": content, "truncated": True,
@@ -760,27 +1144,43 @@ class ToolExecutor:
                     "truncated_range": f"{ts}-{te}",
                     "hint": f"View truncated section of {fname}"
                 })
-            start = max(1, params.get("start_line", 1))
-            end = min(total, params.get("end_line", total))
-            content = "".join(f"{i:4d} | {lines[i-1]}" for i in range(start, end + 1))
-            return json.dumps({
+            content = "".join(f"{i:4d} | {line}" for i, line in enumerate(lines, 1))
+            return _dumps({
                 "path": path, "filename": fname, "total_lines": total,
-                "lines": f"{start}-{end}/{total}", "content": content, "truncated": False
+                "lines": f"1-{total}/{total}", "content": content, "truncated": False
             })
         except Exception as e:
-            return json.dumps({"error": f"Failed to read: {str(e)}"})
+            return _dumps({"error": f"Failed to read: {str(e)}"})
+
+    def _read_range(self, path: str, params: Dict, sz: int) -> str:
+        """按行区间读取: 只保留请求的窗口, 其余行流式计数, 内存与文件大小无关"""
+        start = max(1, params.get("start_line", 1))
+        stop = params.get("end_line")
+        if stop is None and sz > 500_000:
+            # 大文件未给 end_line 时只取一屏
+            stop = start + self.MAX_DISPLAY_LINES - 1
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            skipped = sum(1 for _ in itertools.islice(f, start - 1))
+            selected = list(itertools.islice(f, None if stop is None else max(0, stop - start + 1)))
+            total = skipped + len(selected) + sum(1 for _ in f)
+        end = start + len(selected) - 1 if selected else min(total, total if stop is None else stop)
+        content = "".join(f"{i:4d} | {line}" for i, line in enumerate(selected, start))
+        return _dumps({
+            "path": path, "filename": os.path.basename(path), "total_lines": total,
+            "lines": f"{start}-{end}/{total}", "content": content, "truncated": False
+        })
 
     async def _batch_read(self, params: Dict) -> str:
         paths = params.get("paths", [])
         if not paths:
-            return json.dumps({"error": "No paths"})
+            return _dumps({"error": "No paths"})
         if len(paths) > 10:
-            return json.dumps({"error": "Max 10 files per batch_read"})
+            return _dumps({"error": "Max 10 files per batch_read"})
         results, errors = {}, {}
-        for p in paths:
-            r = await self._read_file({"path": p})
+        reads = await asyncio.gather(*(self._read_file({"path": p}) for p in paths))
+        for p, r in zip(paths, reads):
             try:
-                d = json.loads(r)
+                d = orjson.loads(r)
                 if "error" in d:
                     errors[p] = d["error"]
                 else:
@@ -793,45 +1193,40 @@ class ToolExecutor:
                     results[p] = entry
             except Exception:
                 errors[p] = "parse error"
-        return json.dumps({"files_read": len(results), "files_errored": len(errors),
-                           "results": results, "errors": errors or None}, ensure_ascii=False)
+        return _dumps({"files_read": len(results), "files_errored": len(errors),
+                           "results": results, "errors": errors or None})
 
     async def _write_file(self, params: Dict) -> str:
         path = self._resolve(params["path"])
         content = params["content"]
         try:
-            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
-            is_new = not os.path.exists(path)
-            with open(path, 'w', encoding='utf-8') as f:
-                f.write(content)
+            is_new = await asyncio.to_thread(self._write_text, path, content, True)
             lc = content.count('\n') + (1 if content and not content.endswith('\n') else 0)
             fn = os.path.basename(path)
             act = "created" if is_new else "overwritten"
             self.file_changes.append({"action": act, "path": path, "filename": fn, "lines": lc})
-            return json.dumps({"success": True, "path": path, "filename": fn,
+            return _dumps({"success": True, "path": path, "filename": fn,
                                "size": len(content), "lines": lc, "action": act})
         except Exception as e:
-            return json.dumps({"error": f"Write failed: {str(e)}"})
+            return _dumps({"error": f"Write failed: {str(e)}"})
 
     async def _edit_file(self, params: Dict) -> str:
         path = self._resolve(params["path"])
         old_s, new_s = params["old_str"], params["new_str"]
         if not os.path.exists(path):
-            return json.dumps({"error": f"File not found: {path}"})
+            return _dumps({"error": f"File not found: {path}"})
         try:
-            with open(path, 'r', encoding='utf-8') as f:
-                content = f.read()
+            content = await asyncio.to_thread(self._read_text, path)
             cnt = content.count(old_s)
             if cnt == 0:
                 sim = self._find_similar(content, old_s)
-                return json.dumps({"error": "old_str not found", "path": path,
+                return _dumps({"error": "old_str not found", "path": path,
                                    "file_lines": content.count('\n') + 1,
                                    "hint": f"Similar: {sim[:200]}" if sim else "None"})
             if cnt > 1:
-                return json.dumps({"error": f"old_str found {cnt} times, must be unique"})
+                return _dumps({"error": f"old_str found {cnt} times, must be unique"})
             new_content = content.replace(old_s, new_s, 1)
-            with open(path, 'w', encoding='utf-8') as f:
-                f.write(new_content)
+            await asyncio.to_thread(self._write_text, path, new_content)
             added, removed = self._diff_stats(old_s, new_s)
             fn = os.path.basename(path)
             udiff = self._unified_diff(content, new_content, fn)
@@ -848,23 +1243,22 @@ class ToolExecutor:
             )
             self.file_changes.append({"action": "edited", "path": path, "filename": fn,
                                       "added": added, "removed": removed})
-            return json.dumps({"success": True, "path": path, "filename": fn,
+            return _dumps({"success": True, "path": path, "filename": fn,
                                "diff": f"{fn} +{added} -{removed}", "unified_diff": udiff[:2000],
                                "added_lines": added, "removed_lines": removed,
                                "description": params.get("description", f"Edit {fn}")})
         except Exception as e:
-            return json.dumps({"error": f"Edit failed: {str(e)}"})
+            return _dumps({"error": f"Edit failed: {str(e)}"})
 
     async def _multi_edit(self, params: Dict) -> str:
         path = self._resolve(params["path"])
         edits = params.get("edits", [])
         if not edits:
-            return json.dumps({"error": "No edits"})
+            return _dumps({"error": "No edits"})
         if not os.path.exists(path):
-            return json.dumps({"error": f"File not found: {path}"})
+            return _dumps({"error": f"File not found: {path}"})
         try:
-            with open(path, 'r', encoding='utf-8') as f:
-                original = f.read()
+            original = await asyncio.to_thread(self._read_text, path)
             content = original
             ta, tr, applied, errs = 0, 0, 0, []
             for i, e in enumerate(edits):
@@ -882,9 +1276,8 @@ class ToolExecutor:
                 ta += a
                 tr += r
             if applied == 0:
-                return json.dumps({"error": "No edits applied", "errors": errs})
-            with open(path, 'w', encoding='utf-8') as f:
-                f.write(content)
+                return _dumps({"error": "No edits applied", "errors": errs})
+            await asyncio.to_thread(self._write_text, path, content)
             fn = os.path.basename(path)
             udiff = self._unified_diff(original, content, fn)
             self.file_changes.append({"action": "multi_edited", "path": path, "filename": fn,
@@ -895,79 +1288,171 @@ class ToolExecutor:
                    "added_lines": ta, "removed_lines": tr}
             if errs:
                 res["errors"] = errs
-            return json.dumps(res)
+            return _dumps(res)
         except Exception as e:
-            return json.dumps({"error": f"Multi-edit failed: {str(e)}"})
+            return _dumps({"error": f"Multi-edit failed: {str(e)}"})
+
+    @staticmethod
+    def _read_text(path: str) -> str:
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    @staticmethod
+    def _write_text(path: str, content: str, make_dirs: bool = False) -> bool:
+        """写入文件 (在线程中调用), 返回文件此前是否不存在"""
+        if make_dirs:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        is_new = not os.path.exists(path)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return is_new
 
     async def _list_dir(self, params: Dict) -> str:
         path = self._resolve(params.get("path", "."))
         depth = min(params.get("depth", 2), 5)
         if not os.path.isdir(path):
-            return json.dumps({"error": f"Not a directory: {path}"})
+            return _dumps({"error": f"Not a directory: {path}"})
         lines = []
-        self._walk(path, lines, 0, depth)
+        await asyncio.to_thread(self._walk, path, lines, 0, depth)
         return f"[DIR] {path}\n" + "\n".join(lines) if lines else f"[DIR] {path}\n  (empty)"
 
     def _walk(self, p, lines, d, mx):
         if d >= mx:
             return
         try:
-            items = sorted(os.listdir(p))
+            # 先过滤再排序; scandir 自带类型信息, 省掉逐项 isdir/getsize
+            with os.scandir(p) as it:
+                entries = [e for e in it if e.name not in SKIP_DIRS and not e.name.startswith('.')]
         except Exception:
             return
+        entries.sort(key=lambda e: e.name)
         ind = "  " * (d + 1)
-        for item in items:
-            if item in SKIP_DIRS or item.startswith('.'):
-                continue
-            fp = os.path.join(p, item)
-            if os.path.isdir(fp):
+        for entry in entries:
+            item = entry.name
+            if entry.is_dir():
                 try:
-                    c = len([f for f in os.listdir(fp) if not f.startswith('.')])
+                    c = sum(1 for f in os.listdir(entry.path) if not f.startswith('.'))
                 except Exception:
                     c = '?'
                 lines.append(f"{ind}[DIR] {item}/ ({c} items)")
-                self._walk(fp, lines, d + 1, mx)
+                self._walk(entry.path, lines, d + 1, mx)
             else:
-                lines.append(f"{ind}[FILE] {item} ({self._hsz(os.path.getsize(fp))})")
+                lines.append(f"{ind}[FILE] {item} ({self._hsz(entry.stat().st_size)})")
 
     async def _grep_search(self, params: Dict) -> str:
         pattern = params["pattern"]
         path = self._resolve(params.get("path", "."))
-        cmd = ["grep", "-rn", "--max-count=50", "--color=never"]
-        if params.get("include"):
-            cmd += ["--include", params["include"]]
+        try:
+            regex = re.compile(_bre_to_re(pattern).encode('utf-8'))
+        except re.error:
+            # 翻译不了的模式 (如 [[:cntrl:]]) 交给系统 grep
+            return await self._grep_subprocess(pattern, path, params.get("include"))
+        stop = threading.Event()
+        try:
+            lines = await asyncio.wait_for(
+                asyncio.to_thread(self._grep_scan, regex, path, params.get("include"), stop),
+                timeout=15)
+            if not lines:
+                return _dumps({"pattern": pattern, "matches": 0, "content": "(no matches)"})
+            return self._grep_result(pattern, "\n".join(lines) + "\n")
+        except asyncio.TimeoutError:
+            return _dumps({"error": "Search timed out"})
+        except Exception as e:
+            return _dumps({"error": str(e)})
+        finally:
+            # wait_for 超时只取消了等待, 线程仍在扫描; 通知它停下
+            stop.set()
+
+    @staticmethod
+    def _grep_scan(regex, root: str, include: Optional[str],
+                   stop: Optional[threading.Event] = None) -> List[str]:
+        """进程内扫描: 与 grep -rn --max-count=50 输出一致, 省掉每次 fork/exec。stop 被置位时提前返回"""
+        out: List[str] = []
+        if os.path.isfile(root):
+            files = [root]
+            stack: List[str] = []
+        else:
+            files = []
+            stack = [root]
+        while stack or files:
+            if stop is not None and stop.is_set():
+                break
+            if files:
+                fp = files.pop()
+            else:
+                try:
+                    with os.scandir(stack.pop()) as it:
+                        for entry in it:
+                            if entry.is_dir(follow_symlinks=False):
+                                if entry.name not in SKIP_DIRS:
+                                    stack.append(entry.path)
+                            elif entry.is_file(follow_symlinks=False):
+                                if not include or fnmatch.fnmatch(entry.name, include):
+                                    files.append(entry.path)
+                except OSError:
+                    pass
+                continue
+            try:
+                with open(fp, 'rb') as fh:
+                    if b'\0' in fh.read(GREP_BINARY_PROBE):
+                        continue
+                    fh.seek(0)
+                    hits = 0
+                    for i, line in enumerate(fh, 1):
+                        if regex.search(line):
+                            text = line.rstrip(b'\r\n').decode('utf-8', 'replace')
+                            out.append(f"{fp}:{i}:{text}")
+                            hits += 1
+                            if hits >= GREP_MAX_PER_FILE:
+                                break
+            except OSError:
+                continue
+        return out
+
+    @staticmethod
+    def _grep_result(pattern: str, r: str) -> str:
+        mc = len(r.strip().split('\n'))
+        if len(r) > 8000:
+            r = r[:8000] + f"\n...[truncated, {mc} matches]"
+        return _dumps({"pattern": pattern, "matches": mc, "content": r})
+
+    async def _grep_subprocess(self, pattern: str, path: str, include: Optional[str]) -> str:
+        cmd = ["grep", "-rn", f"--max-count={GREP_MAX_PER_FILE}", "--color=never"]
+        if include:
+            cmd += ["--include", include]
         for s in SKIP_DIRS:
             cmd += [f"--exclude-dir={s}"]
         cmd += [pattern, path]
         try:
-            proc = await asyncio.create_subprocess_exec(
-                *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
-            out, _ = await asyncio.wait_for(proc.communicate(), timeout=15)
+            async with _subprocess_slot():
+                proc = await asyncio.create_subprocess_exec(
+                    *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+                    start_new_session=True)
+                out, _ = await _communicate(proc, 15)
             r = out.decode('utf-8', errors='replace')
             if not r:
-                return json.dumps({"pattern": pattern, "matches": 0, "content": "(no matches)"})
-            mc = len(r.strip().split('\n'))
-            if len(r) > 8000:
-                r = r[:8000] + f"\n...[truncated, {mc} matches]"
-            return json.dumps({"pattern": pattern, "matches": mc, "content": r})
+                return _dumps({"pattern": pattern, "matches": 0, "content": "(no matches)"})
+            return self._grep_result(pattern, r)
         except asyncio.TimeoutError:
-            return json.dumps({"error": "Search timed out"})
+            return _dumps({"error": "Search timed out"})
         except Exception as e:
-            return json.dumps({"error": str(e)})
+            return _dumps({"error": str(e)})
 
     async def _file_search(self, params: Dict) -> str:
         pattern = params["pattern"]
         root = self._resolve(params.get("path", "."))
         mx = min(params.get("max_results", 20), 100)
         if not os.path.exists(root):
-            return json.dumps({"error": f"Dir not found: {root}"})
+            return _dumps({"error": f"Dir not found: {root}"})
         try:
             cmd = ["find", root, "-type", "f", "-name", pattern, "-maxdepth", "10"]
             for s in SKIP_DIRS:
                 cmd += ["-not", "-path", f"*/{s}/*"]
-            proc = await asyncio.create_subprocess_exec(
-                *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
-            out, _ = await asyncio.wait_for(proc.communicate(), timeout=10)
+            async with _subprocess_slot():
+                proc = await asyncio.create_subprocess_exec(
+                    *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+                    start_new_session=True)
+                out, _ = await _communicate(proc, 10)
             matches = []
             for fp in out.decode('utf-8', errors='replace').strip().split('\n'):
                 fp = fp.strip()
@@ -981,12 +1466,12 @@ class ToolExecutor:
                     pass
                 if len(matches) >= mx:
                     break
-            return json.dumps({"pattern": pattern, "matches": len(matches),
-                               "results": matches}, ensure_ascii=False)
+            return _dumps({"pattern": pattern, "matches": len(matches),
+                               "results": matches})
         except asyncio.TimeoutError:
-            return json.dumps({"error": "Search timed out"})
+            return _dumps({"error": "Search timed out"})
         except Exception as e:
-            return json.dumps({"error": str(e)})
+            return _dumps({"error": str(e)})
 
     async def _web_search(self, params: Dict) -> str:
         query = params["query"]
@@ -995,18 +1480,18 @@ class ToolExecutor:
             engine = SerperSearchEngine()
             results = await engine.search(query, max_results=10)
             if not results:
-                return json.dumps({"query": query, "results_count": 0, "results": []})
+                return _dumps({"query": query, "results_count": 0, "results": []})
             if isinstance(results[0], dict) and "error" in results[0]:
-                return json.dumps({"query": query, "error": results[0]["error"]})
+                return _dumps({"query": query, "error": results[0]["error"]})
             structured = [{"title": r.get("title", ""), "url": r.get("link", r.get("url", "")),
                            "snippet": r.get("snippet", r.get("description", "")),
                            "domain": r.get("domain", "")} for r in results]
-            return json.dumps({"query": query, "results_count": len(structured),
-                               "results": structured}, ensure_ascii=False)
+            return _dumps({"query": query, "results_count": len(structured),
+                               "results": structured})
         except ImportError:
-            return json.dumps({"query": query, "error": "Web search not available."})
+            return _dumps({"query": query, "error": "Web search not available."})
         except Exception as e:
-            return json.dumps({"query": query, "error": str(e)})
+            return _dumps({"query": query, "error": str(e)})
 
     async def _web_fetch(self, params: Dict) -> str:
         url = params["url"]
@@ -1015,8 +1500,8 @@ class ToolExecutor:
             browser = WebBrowser(max_content_length=15000)
             content = await browser.browse(url, clean=True)
             title = self._extract_title(content, url)
-            return json.dumps({"url": url, "title": title, "content_length": len(content),
-                               "content": content}, ensure_ascii=False)
+            return _dumps({"url": url, "title": title, "content_length": len(content),
+                               "content": content})
         except ImportError:
             try:
                 import httpx
@@ -1030,18 +1515,18 @@ class ToolExecutor:
                     text = re.sub(r'\s+', ' ', text).strip()
                     if len(text) > 15000:
                         text = text[:15000] + "\n...[truncated]"
-                    return json.dumps({"url": url, "title": title, "status": resp.status_code,
-                                       "content_length": len(text), "content": text}, ensure_ascii=False)
+                    return _dumps({"url": url, "title": title, "status": resp.status_code,
+                                       "content_length": len(text), "content": text})
             except Exception as e2:
-                return json.dumps({"url": url, "error": str(e2)})
+                return _dumps({"url": url, "error": str(e2)})
         except Exception as e:
-            return json.dumps({"url": url, "error": str(e)})
+            return _dumps({"url": url, "error": str(e)})
 
     async def _task_complete(self, params: Dict) -> str:
-        return json.dumps({"completed": True, "summary": params.get("summary", "Done"),
+        return _dumps({"completed": True, "summary": params.get("summary", "Done"),
                            "files_changed": params.get("files_changed", []),
                            "total_file_changes": len(self.file_changes),
-                           "file_change_log": self.file_changes[-20:]}, ensure_ascii=False)
+                           "file_change_log": self.file_changes[-20:]})
 
     async def _view_truncated(self, params: Dict) -> str:
         path = self._resolve(params["path"])
@@ -1054,7 +1539,7 @@ class ToolExecutor:
     async def _batch_commands(self, params: Dict) -> str:
         commands = params.get("commands", [])
         if not commands:
-            return json.dumps({"error": "No commands provided"})
+            return _dumps({"error": "No commands provided"})
         continue_on_error = params.get("continue_on_error", False)
         results = []
         succeeded, failed = 0, 0
@@ -1063,7 +1548,7 @@ class ToolExecutor:
             desc = cmd_info.get("description", f"Command {i+1}")
             r_str = await self._bash({"command": command, "timeout": cmd_info.get("timeout", 120)})
             try:
-                r = json.loads(r_str)
+                r = orjson.loads(r_str)
             except Exception:
                 r = {"exit_code": -1, "stdout": "", "stderr": r_str}
             ok = r.get("exit_code", -1) == 0
@@ -1080,11 +1565,11 @@ class ToolExecutor:
             if not ok and not continue_on_error:
                 break
         n = len(results)
-        return json.dumps({
+        return _dumps({
             "total_commands": len(commands), "executed": n,
             "succeeded": succeeded, "failed": failed, "results": results,
             "display_title": f"Ran {n} command{'s' if n != 1 else ''}",
-        }, ensure_ascii=False)
+        })
 
     async def _run_script(self, params: Dict) -> str:
         script = params.get("script", "")
@@ -1092,7 +1577,7 @@ class ToolExecutor:
         timeout = min(params.get("timeout", 300), 600)
         desc = params.get("description", "Script")
         if not script:
-            return json.dumps({"error": "Empty script"})
+            return _dumps({"error": "Empty script"})
         ext_map = {"bash": ".sh", "python3": ".py", "python": ".py", "node": ".js"}
         ext = ext_map.get(interpreter, ".sh")
         script_path = None
@@ -1107,16 +1592,16 @@ class ToolExecutor:
             os.chmod(script_path, 0o755)
             r_str = await self._bash({"command": f"{interpreter} {script_path}", "timeout": timeout})
             try:
-                r = json.loads(r_str)
+                r = orjson.loads(r_str)
             except Exception:
                 r = {"exit_code": -1, "stdout": "", "stderr": r_str}
             r["script"] = script
             r["interpreter"] = interpreter
             r["description"] = desc
             r["display_title"] = desc
-            return json.dumps(r, ensure_ascii=False)
+            return _dumps(r)
         except Exception as e:
-            return json.dumps({"error": str(e), "script": script[:500]})
+            return _dumps({"error": str(e), "script": script[:500]})
         finally:
             if script_path:
                 try:
@@ -1131,10 +1616,10 @@ class ToolExecutor:
             "new_str": params["new_str"], "description": f"Revert: {desc}"
         })
         try:
-            r = json.loads(result_str)
+            r = orjson.loads(result_str)
             r["reverted"] = True
             r["display_title"] = f"Revert: {desc}"
-            return json.dumps(r, ensure_ascii=False)
+            return _dumps(r)
         except Exception:
             return result_str
 
@@ -1143,7 +1628,7 @@ class ToolExecutor:
         root = self._resolve(params.get("path", "."))
         max_results = min(params.get("max_results", 50), 200)
         if not os.path.exists(root):
-            return json.dumps({"error": f"Root not found: {root}"})
+            return _dumps({"error": f"Root not found: {root}"})
         matches = []
         try:
             for fp in Path(root).glob(pattern):
@@ -1159,23 +1644,23 @@ class ToolExecutor:
                 if len(matches) >= max_results:
                     break
         except Exception as e:
-            return json.dumps({"error": f"Glob failed: {str(e)}"})
-        return json.dumps({"pattern": pattern, "root": root, "matches": len(matches),
-                           "results": matches}, ensure_ascii=False)
+            return _dumps({"error": f"Glob failed: {str(e)}"})
+        return _dumps({"pattern": pattern, "root": root, "matches": len(matches),
+                           "results": matches})
 
     async def _todo_write(self, params: Dict) -> str:
         todos = params.get("todos", [])
         if not todos:
-            return json.dumps({"error": "No todos provided"})
+            return _dumps({"error": "No todos provided"})
         result = self.todo_manager.write(todos)
         result["display_title"] = f"Updated todo list ({result['total']} items)"
-        return json.dumps(result, ensure_ascii=False)
+        return _dumps(result)
 
     async def _todo_read(self, params: Dict) -> str:
-        return json.dumps(self.todo_manager.read(), ensure_ascii=False)
+        return _dumps(self.todo_manager.read())
 
     async def _task_stub(self, params: Dict) -> str:
-        return json.dumps({"error": "Task tool must be handled by AgenticLoop"})
+        return _dumps({"error": "Task tool must be handled by AgenticLoop"})
 
     async def _memory_read(self, params: Dict) -> str:
         candidates = [self.memory_file, os.path.join(self.work_dir, "CLAUDE.md"),
@@ -1185,10 +1670,10 @@ class ToolExecutor:
                 try:
                     with open(path, 'r', encoding='utf-8') as f:
                         content = f.read()
-                    return json.dumps({"path": path, "content": content, "size": len(content)}, ensure_ascii=False)
+                    return _dumps({"path": path, "content": content, "size": len(content)})
                 except Exception as e:
-                    return json.dumps({"error": str(e)})
-        return json.dumps({"content": "", "message": "No memory file found. Use memory_write to create one."})
+                    return _dumps({"error": str(e)})
+        return _dumps({"content": "", "message": "No memory file found. Use memory_write to create one."})
 
     async def _memory_write(self, params: Dict) -> str:
         content = params.get("content", "")
@@ -1212,9 +1697,9 @@ class ToolExecutor:
                 existing = "# Project Memory\n\n" + existing
             with open(self.memory_file, 'w', encoding='utf-8') as f:
                 f.write(existing)
-            return json.dumps({"success": True, "path": self.memory_file, "size": len(existing), "mode": mode})
+            return _dumps({"success": True, "path": self.memory_file, "size": len(existing), "mode": mode})
         except Exception as e:
-            return json.dumps({"error": f"Memory write failed: {str(e)}"})
+            return _dumps({"error": f"Memory write failed: {str(e)}"})
 
     # === v9: New tool implementations ===
 
@@ -1225,7 +1710,7 @@ class ToolExecutor:
         reference = params.get("reference_output")
         desc = params.get("description", f"Test: {command[:60]}")
         if not command:
-            return json.dumps({"error": "No test command provided"})
+            return _dumps({"error": "No test command provided"})
         try:
             from .debug_agent import DebugAgent, TestRunner
             runner = TestRunner(self.work_dir)
@@ -1248,18 +1733,18 @@ class ToolExecutor:
                 agent = DebugAgent(self.work_dir, self.revert_manager)
                 diagnosis = await agent.diagnose(result)
                 rd["diagnosis"] = diagnosis
-            return json.dumps(rd, ensure_ascii=False)
+            return _dumps(rd)
         except Exception as e:
             # Fallback to plain bash execution
             r_str = await self._bash({"command": command, "timeout": 300})
             try:
-                r = json.loads(r_str)
+                r = orjson.loads(r_str)
                 r["description"] = desc
                 r["display_title"] = f"Test: {desc}"
                 r["passed"] = r.get("exit_code", -1) == 0
-                return json.dumps(r, ensure_ascii=False)
+                return _dumps(r)
             except Exception:
-                return json.dumps({"error": str(e), "command": command})
+                return _dumps({"error": str(e), "command": command})
 
     async def _revert_to_checkpoint(self, params: Dict) -> str:
         """Revert file to a previous version using RevertManager"""
@@ -1277,22 +1762,22 @@ class ToolExecutor:
                     "action": "reverted", "path": path, "filename": fn,
                     "added": record.removed_lines, "removed": record.added_lines,
                 })
-                return json.dumps({
+                return _dumps({
                     "success": True, "path": path, "filename": fn,
                     "edit_id": record.edit_id,
                     "description": record.description,
                     "diff_display": record.diff_display,
                     "display_title": f"Reverted: {desc}",
                     "reverted": True,
-                }, ensure_ascii=False)
+                })
             else:
-                return json.dumps({
+                return _dumps({
                     "error": f"No edit history found for {path}",
                     "path": path,
                     "edit_history": self.revert_manager.get_history(path=path, limit=5),
                 })
         except Exception as e:
-            return json.dumps({"error": f"Revert failed: {str(e)}"})
+            return _dumps({"error": f"Revert failed: {str(e)}"})
 
     # === Phase 7: All Domains Code Execution tools ===
 
@@ -1318,31 +1803,32 @@ class ToolExecutor:
             with open(tmp_file, 'w', encoding='utf-8') as f:
                 f.write(code)
 
-            proc = await asyncio.create_subprocess_exec(
-                interpreter, tmp_file,
-                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
-                cwd=self.work_dir,
-                env={**os.environ, "HOME": self.work_dir, "PWD": self.work_dir}
-            )
-            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=timeout)
+            async with _subprocess_slot():
+                proc = await asyncio.create_subprocess_exec(
+                    interpreter, tmp_file,
+                    stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+                    cwd=self.work_dir,
+                    env={**os.environ, "HOME": self.work_dir, "PWD": self.work_dir},
+                    start_new_session=True,
+                )
+                stdout, stderr = await _communicate(proc, timeout)
             out = stdout.decode('utf-8', errors='replace')
             err = stderr.decode('utf-8', errors='replace')
 
-            if len(out) > MAX_TOOL_OUTPUT_LEN:
-                out = out[:MAX_TOOL_OUTPUT_LEN // 2] + f"\n...[truncated]...\n" + out[-MAX_TOOL_OUTPUT_LEN // 2:]
+            out = _truncate_output(out)
 
-            return json.dumps({
+            return _dumps({
                 "exit_code": proc.returncode,
                 "stdout": out,
                 "stderr": err,
                 "language": language,
             })
         except asyncio.TimeoutError:
-            return json.dumps({"error": f"Code execution timed out after {timeout}s", "exit_code": -1, "language": language})
+            return _dumps({"error": f"Code execution timed out after {timeout}s", "exit_code": -1, "language": language})
         except FileNotFoundError:
-            return json.dumps({"error": f"Interpreter '{interpreter}' not found. Is {language} installed?", "exit_code": -1, "language": language})
+            return _dumps({"error": f"Interpreter '{interpreter}' not found. Is {language} installed?", "exit_code": -1, "language": language})
         except Exception as e:
-            return json.dumps({"error": f"Execution failed: {str(e)}", "exit_code": -1, "language": language})
+            return _dumps({"error": f"Execution failed: {str(e)}", "exit_code": -1, "language": language})
         finally:
             if os.path.exists(tmp_file):
                 try:
@@ -1358,11 +1844,11 @@ class ToolExecutor:
         timeout = min(params.get("timeout", 300), 600)
 
         if not package:
-            return json.dumps({"error": "No package specified", "exit_code": -1, "manager": manager})
+            return _dumps({"error": "No package specified", "exit_code": -1, "manager": manager})
 
         # Sanitize: reject obvious shell injection (semicolons, backticks, pipes)
         if any(c in package for c in [';', '`', '|', '$', '>', '<', '&']):
-            return json.dumps({"error": "Invalid characters in package name", "exit_code": -1, "manager": manager})
+            return _dumps({"error": "Invalid characters in package name", "exit_code": -1, "manager": manager})
 
         # Build command
         if manager == "pip":
@@ -1372,7 +1858,7 @@ class ToolExecutor:
         elif manager == "apt":
             cmd = f"apt-get install -y {package}"
         else:
-            return json.dumps({"error": f"Unknown manager: {manager}", "exit_code": -1, "manager": manager})
+            return _dumps({"error": f"Unknown manager: {manager}", "exit_code": -1, "manager": manager})
 
         if flags:
             # Sanitize flags too
@@ -1380,16 +1866,18 @@ class ToolExecutor:
             cmd += f" {safe_flags}"
 
         try:
-            proc = await asyncio.create_subprocess_shell(
-                cmd,
-                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
-                cwd=self.work_dir,
-                env={**os.environ, "HOME": self.work_dir, "PWD": self.work_dir}
-            )
-            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=timeout)
+            async with _subprocess_slot():
+                proc = await asyncio.create_subprocess_shell(
+                    cmd,
+                    stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+                    cwd=self.work_dir,
+                    env={**os.environ, "HOME": self.work_dir, "PWD": self.work_dir},
+                    start_new_session=True,
+                )
+                stdout, stderr = await _communicate(proc, timeout)
             out = stdout.decode('utf-8', errors='replace')
             err = stderr.decode('utf-8', errors='replace')
-            return json.dumps({
+            return _dumps({
                 "exit_code": proc.returncode,
                 "stdout": out,
                 "stderr": err,
@@ -1397,15 +1885,15 @@ class ToolExecutor:
                 "package": package,
             })
         except asyncio.TimeoutError:
-            return json.dumps({"error": f"Installation timed out after {timeout}s", "exit_code": -1, "manager": manager})
+            return _dumps({"error": f"Installation timed out after {timeout}s", "exit_code": -1, "manager": manager})
         except Exception as e:
-            return json.dumps({"error": f"Install failed: {str(e)}", "exit_code": -1, "manager": manager})
+            return _dumps({"error": f"Install failed: {str(e)}", "exit_code": -1, "manager": manager})
 
     async def _present_files(self, params: Dict) -> str:
         """Make files available for download by returning metadata."""
         paths = params.get("paths", [])
         if not paths:
-            return json.dumps({"success": False, "error": "No paths provided", "files": []})
+            return _dumps({"success": False, "error": "No paths provided", "files": []})
 
         files = []
         has_error = False
@@ -1450,7 +1938,7 @@ class ToolExecutor:
                 has_error = True
 
         all_ok = len(files) > 0 and not has_error
-        return json.dumps({
+        return _dumps({
             "success": all_ok,
             "files": files,
             "total": len(files),
@@ -1731,8 +2219,7 @@ async def run_subagent(ai_engine, work_dir, prompt, subagent_type="general",
                 return {"success": True, "summary": ti.get("summary", "\n".join(all_text)),
                         "turns": turn, "files_changed": executor.file_changes}
             rs = await executor.execute(tn, ti)
-            if len(rs) > MAX_TOOL_OUTPUT_LEN:
-                rs = rs[:MAX_TOOL_OUTPUT_LEN] + "\n...[truncated]"
+            rs = _truncate_output(rs)
             tool_results.append(_make_tool_result(tid, rs))
         messages.append({"role": "user", "content": tool_results})
 
@@ -1766,7 +2253,7 @@ class AgenticLoop:
 
     def __init__(self, ai_engine, work_dir: str, model: str = None,
                  max_turns: int = 30, system_prompt: str = None,
-                 enable_parallel: bool = True):
+                 enable_parallel: bool = True, persistent_shell: bool = False):
         self.ai_engine = ai_engine
         self.work_dir = os.path.abspath(work_dir)
         self.model = model or self.DEFAULT_MODEL
@@ -1791,6 +2278,8 @@ class AgenticLoop:
         )
         self.chunk_scheduler = ChunkScheduler()
         self.execution_tracker = ExecutionTracker()
+        self._tool_slots = asyncio.Semaphore(MAX_PARALLEL_TOOLS)
+        self._warmup_task: Optional[asyncio.Task] = None
 
         # v7: ToolExecutor with modules (v8: + revert_manager, diff_tracker)
         self.executor = ToolExecutor(
@@ -1799,6 +2288,7 @@ class AgenticLoop:
             permission_gate=self.permission_gate,
             revert_manager=self.revert_manager,
             diff_tracker=self.diff_tracker,
+            persistent_shell=persistent_shell,
         )
 
         # Session metrics
@@ -1808,6 +2298,7 @@ class AgenticLoop:
         self.total_output_tokens = 0
         self.total_cost = 0.0
         self._cancelled = False
+        self._max_tokens = AGENT_MAX_TOKENS
 
         os.makedirs(self.work_dir, exist_ok=True)
 
@@ -1816,6 +2307,14 @@ class AgenticLoop:
         self._cancelled = True
 
     async def run(self, task: str) -> AsyncGenerator[Dict[str, Any], None]:
+        try:
+            async for event in self._run(task):
+                yield event
+        finally:
+            # 结束 (含客户端断开时生成器被关闭) 后释放常驻 shell
+            self.executor.close()
+
+    async def _run(self, task: str) -> AsyncGenerator[Dict[str, Any], None]:
         start_time = datetime.now()
         messages = [{"role": "user", "content": task}]
 
@@ -1831,6 +2330,10 @@ class AgenticLoop:
 
         last_heartbeat = time.time()
 
+        if self._warmup_task is not None:
+            # 预热尚未完成时稍等, 让第一轮请求复用这条连接而不是再并行握手一次
+            await asyncio.wait({self._warmup_task}, timeout=5)
+
         for turn in range(1, self.max_turns + 1):
             if self._cancelled:
                 yield self.event_builder.error("Task cancelled by user", turn=turn)
@@ -1886,15 +2389,34 @@ class AgenticLoop:
             # === AI call with retry ===
             result = None
             last_error = None
+            # tool_use_id -> 解码期间提前启动的只读工具
+            prefetched: Dict[str, asyncio.Task] = {}
             for attempt in range(1, API_MAX_RETRIES + 1):
                 try:
                     result = await self.ai_engine.get_completion(
                         messages=messages, model=self.model,
                         system_prompt=effective_system,
-                        tools=TOOL_DEFINITIONS, temperature=0.3, max_tokens=16384)
+                        tools=TOOL_DEFINITIONS, temperature=0.3, max_tokens=self._max_tokens,
+                        on_block=self._prefetch_hook(prefetched) if self.enable_parallel else None)
+                    if (result.get("stop_reason") == "max_tokens" and self._max_tokens < AGENT_MAX_TOKENS
+                            and attempt < API_MAX_RETRIES):
+                        # 自适应上限过小, 回复 (可能包括 tool_use 参数) 被截断: 恢复完整上限重新请求本轮
+                        logger.info(f"[v7] Output hit max_tokens={self._max_tokens}, retrying with {AGENT_MAX_TOKENS}")
+                        wasted = result.get("usage", {})
+                        self.total_input_tokens += wasted.get("prompt_tokens", 0)
+                        self.total_output_tokens += wasted.get("completion_tokens", 0)
+                        self.total_cost += estimate_cost(self.model, wasted.get("prompt_tokens", 0),
+                                                         wasted.get("completion_tokens", 0))
+                        self._cancel_prefetch(prefetched)
+                        self._max_tokens = AGENT_MAX_TOKENS
+                        result = None
+                        continue
                     break
                 except Exception as e:
                     last_error = e
+                    self._cancel_prefetch(prefetched)
+                    # 失败原因可能就是上限过小 (如截断的输出), 重试时用完整上限
+                    self._max_tokens = AGENT_MAX_TOKENS
                     delay = API_BASE_DELAY * (2 ** (attempt - 1))
                     logger.warning(f"[v7] AI call failed (attempt {attempt}): {e}, retry in {delay}s")
                     if attempt < API_MAX_RETRIES:
@@ -1917,6 +2439,7 @@ class AgenticLoop:
             self.total_output_tokens += output_tokens
             turn_cost = estimate_cost(self.model, input_tokens, output_tokens)
             self.total_cost += turn_cost
+            self._adapt_max_tokens(output_tokens)
 
             if not content_blocks and result.get("content"):
                 content_blocks = [{"type": "text", "text": result["content"]}]
@@ -1977,8 +2500,7 @@ class AgenticLoop:
                         message=desc
                     )
                     # Stream the input JSON
-                    import json as _json
-                    input_str = _json.dumps(tinp, ensure_ascii=False)
+                    input_str = _dumps(tinp)
                     yield self.event_builder.content_block_delta(
                         index=block_index, delta_type="input_json_delta",
                         partial_json=input_str
@@ -2040,6 +2562,7 @@ class AgenticLoop:
             fc_before = len(self.executor.file_changes)
             tool_results = []
             task_completed = False  # v9: detect task_complete
+            turn_failed = False  # 同一轮有工具失败时不因 task_complete 结束
 
             # v9: Reset per-turn execution tracker
             self.execution_tracker.reset()
@@ -2072,14 +2595,31 @@ class AgenticLoop:
                 for chunk in chunks:
                     if len(chunk) > 1 and PipelineOptimizer.can_parallelize(chunk):
                         # Parallel execution within chunk
-                        calls = [(sc.tool_name, sc.tool_input, sc.tool_use_id) for sc in chunk]
-                        par_results = await self.executor.execute_parallel(calls)
-                        result_map = {tid: (rs, tn) for tid, rs, tn in par_results}
+                        # 同一 chunk 中参数完全相同的只读调用只执行一次, 结果共享
+                        shared: Dict[tuple, asyncio.Future] = {}
+                        calls = []
+                        for sc in chunk:
+                            key = self._call_key(sc.tool_name, sc.tool_input)
+                            if key is None:
+                                calls.append(self._run_tool_limited(prefetched, sc))
+                                continue
+                            if key not in shared:
+                                shared[key] = asyncio.ensure_future(self._run_tool_limited(prefetched, sc))
+                            calls.append(shared[key])
+                        par_results = await asyncio.gather(*calls, return_exceptions=True)
+                        result_map = {
+                            sc.tool_use_id: (
+                                rs if isinstance(rs, str)
+                                else _dumps({"error": f"Tool execution failed: {rs}"}),
+                                sc.tool_name,
+                            )
+                            for sc, rs in zip(chunk, par_results)
+                        }
                         for sc in chunk:
                             self.total_tool_calls += 1
                             rs, _ = result_map.get(sc.tool_use_id, ("", sc.tool_name))
-                            if len(rs) > MAX_TOOL_OUTPUT_LEN:
-                                rs = rs[:MAX_TOOL_OUTPUT_LEN] + "\n...[truncated]"
+                            turn_failed = turn_failed or _tool_failed(rs)
+                            rs = _truncate_output(rs)
                             meta = self._extract_meta(sc.tool_name, rs)
                             success = "error" not in rs.lower()[:50]
                             self.execution_tracker.record(
@@ -2100,10 +2640,10 @@ class AgenticLoop:
                         for sc in chunk:
                             self.total_tool_calls += 1
                             tool_start_ms = time.time() * 1000
-                            rs = await self.executor.execute(sc.tool_name, sc.tool_input)
+                            rs = await self._run_tool(prefetched, sc.tool_use_id, sc.tool_name, sc.tool_input)
                             tool_duration_ms = time.time() * 1000 - tool_start_ms
-                            if len(rs) > MAX_TOOL_OUTPUT_LEN:
-                                rs = rs[:MAX_TOOL_OUTPUT_LEN] + "\n...[truncated]"
+                            turn_failed = turn_failed or _tool_failed(rs)
+                            rs = _truncate_output(rs)
                             meta = self._extract_meta(sc.tool_name, rs)
                             success = "error" not in rs.lower()[:50]
                             self.execution_tracker.record(
@@ -2125,10 +2665,10 @@ class AgenticLoop:
                     tn, ti, tid = tu["name"], tu["input"], tu["id"]
                     self.total_tool_calls += 1
                     tool_start_ms = time.time() * 1000
-                    rs = await self.executor.execute(tn, ti)
+                    rs = await self._run_tool(prefetched, tid, tn, ti)
                     tool_duration_ms = time.time() * 1000 - tool_start_ms
-                    if len(rs) > MAX_TOOL_OUTPUT_LEN:
-                        rs = rs[:MAX_TOOL_OUTPUT_LEN] + "\n...[truncated]"
+                    turn_failed = turn_failed or _tool_failed(rs)
+                    rs = _truncate_output(rs)
                     meta = self._extract_meta(tn, rs)
                     success = "error" not in rs.lower()[:50]
                     self.execution_tracker.record(tn, ti, tool_duration_ms, success, meta)
@@ -2162,19 +2702,18 @@ class AgenticLoop:
                         depth=self.subagent_depth + 1,
                         tool_registry=self.tool_registry,
                     )
-                    rs = json.dumps({
+                    rs = _dumps({
                         "success": sub_result.get("success", False),
                         "summary": sub_result.get("summary", ""),
                         "turns": sub_result.get("turns", 0),
                         "subagent_type": subagent_type
-                    }, ensure_ascii=False)
+                    })
                     for fc in sub_result.get("files_changed", []):
                         self.executor.file_changes.append(fc)
                 except Exception as e:
-                    rs = json.dumps({"error": f"SubAgent failed: {str(e)}", "success": False})
+                    rs = _dumps({"error": f"SubAgent failed: {str(e)}", "success": False})
 
-                if len(rs) > MAX_TOOL_OUTPUT_LEN:
-                    rs = rs[:MAX_TOOL_OUTPUT_LEN]
+                rs = _truncate_output(rs)
                 meta = self._extract_meta("task", rs)
                 yield self.event_builder.subagent_result(
                     tool_use_id=tid, result=rs[:MAX_DISPLAY_RESULT],
@@ -2186,6 +2725,8 @@ class AgenticLoop:
                 )
                 tool_results.append(_make_tool_result(tid, rs))
 
+            self._cancel_prefetch(prefetched)
+
             # File change events
             for ch in self.executor.file_changes[fc_before:]:
                 yield self.event_builder.file_change(
@@ -2206,6 +2747,9 @@ class AgenticLoop:
                     turn=turn,
                 )
 
+            # tool_result 顺序须与 assistant 消息中的 tool_use 顺序一致
+            tool_order = {tu["id"]: i for i, tu in enumerate(tool_uses)}
+            tool_results.sort(key=lambda r: tool_order.get(r["tool_use_id"], len(tool_order)))
             messages.append({"role": "user", "content": tool_results})
 
             # v9: Turn summary using ExecutionTracker for accurate display
@@ -2222,7 +2766,7 @@ class AgenticLoop:
             )
 
             # v9: task_complete auto-exit
-            if task_completed:
+            if task_completed and not turn_failed:
                 dur = (datetime.now() - start_time).total_seconds()
                 yield self.event_builder.done(
                     turns=turn, total_tool_calls=self.total_tool_calls,
@@ -2256,6 +2800,76 @@ class AgenticLoop:
             total_cost=round(self.total_cost, 6),
         )
 
+    def _adapt_max_tokens(self, output_tokens: int):
+        """根据本轮实际输出调整下一轮的 max_tokens"""
+        if not output_tokens:
+            return
+        if output_tokens >= self._max_tokens * 3 // 4:
+            self._max_tokens = min(self._max_tokens * 2, AGENT_MAX_TOKENS)
+        elif output_tokens < self._max_tokens // 4:
+            self._max_tokens = max(self._max_tokens // 2, AGENT_MIN_TOKENS)
+
+    async def prepare(self):
+        """
+        在 run() 之前调用: 后台预热到模型 API 的连接, 与构造循环、建立 SSE
+        响应等准备工作重叠, 第一轮请求不再承担 TLS 握手。
+        """
+        warmup = getattr(self.ai_engine, "warmup", None)
+        if warmup is not None and self._warmup_task is None:
+            self._warmup_task = asyncio.create_task(warmup(self.model))
+
+    def _prefetch_hook(self, prefetched: Dict[str, asyncio.Task]):
+        """
+        流式响应的 on_block 回调: 只读工具的 tool_use block 一解码完成就开始执行,
+        与模型继续生成后续内容重叠。一旦出现可能写文件的工具, 之后的调用都留给
+        正常调度, 保证读写顺序不变。
+        """
+        blocked = False
+        started: Dict[tuple, asyncio.Task] = {}
+
+        def on_block(block: Dict[str, Any]) -> None:
+            nonlocal blocked
+            if block.get("type") != "tool_use" or blocked:
+                return
+            if block.get("name") not in PREFETCH_TOOLS:
+                blocked = True
+                return
+            key = self._call_key(block["name"], block.get("input", {}))
+            if key not in started:
+                started[key] = asyncio.create_task(
+                    self.executor.execute(block["name"], block.get("input", {})))
+            prefetched[block["id"]] = started[key]
+
+        return on_block
+
+    @staticmethod
+    def _call_key(tool_name: str, tool_input: Dict) -> Optional[tuple]:
+        """只读工具调用的去重键 (同一轮内相同调用共享结果); 有副作用的工具返回 None"""
+        if tool_name not in PREFETCH_TOOLS:
+            return None
+        return (tool_name, orjson.dumps(tool_input, default=str, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS))
+
+    async def _run_tool(self, prefetched: Dict[str, asyncio.Task],
+                        tool_use_id: str, tool_name: str, tool_input: Dict) -> str:
+        """执行工具; 若已在解码期间提前启动则直接等待其结果"""
+        task = prefetched.pop(tool_use_id, None)
+        if task is not None:
+            return await task
+        return await self.executor.execute(tool_name, tool_input)
+
+    async def _run_tool_limited(self, prefetched: Dict[str, asyncio.Task],
+                                call: ScheduledCall) -> str:
+        """并行 chunk 内执行工具, 受 MAX_PARALLEL_TOOLS 限制"""
+        async with self._tool_slots:
+            return await self._run_tool(prefetched, call.tool_use_id, call.tool_name, call.tool_input)
+
+    @staticmethod
+    def _cancel_prefetch(prefetched: Dict[str, asyncio.Task]) -> None:
+        """丢弃未被使用的提前执行任务"""
+        for task in prefetched.values():
+            task.cancel()
+        prefetched.clear()
+
     async def _load_memory(self) -> str:
         candidates = [
             os.path.join(self.work_dir, ".cheapbuy_memory.md"),
@@ -2276,7 +2890,7 @@ class AgenticLoop:
         """Extract display metadata from tool results"""
         meta = {}
         try:
-            d = json.loads(result_str)
+            d = orjson.loads(result_str)
             if tool_name == "read_file":
                 meta["truncated"] = d.get("truncated", False)
                 meta["filename"] = d.get("filename", "")
@@ -2428,7 +3042,7 @@ def create_agentic_loop(
     ai_engine, user_id: str, project_id: str = None,
     base_workspace: str = None, model: str = None,
     max_turns: int = 30, system_prompt: str = None,
-    enable_parallel: bool = True
+    enable_parallel: bool = True, persistent_shell: bool = False
 ) -> AgenticLoop:
     from app.config import settings
     base = base_workspace or getattr(settings, 'WORKSPACE_PATH', './workspace')
@@ -2438,5 +3052,5 @@ def create_agentic_loop(
         ai_engine=ai_engine, work_dir=work_dir,
         model=model or AgenticLoop.DEFAULT_MODEL,
         max_turns=max_turns, system_prompt=system_prompt,
-        enable_parallel=enable_parallel
+        enable_parallel=enable_parallel, persistent_shell=persistent_shell
     )
\ No newline at end of file
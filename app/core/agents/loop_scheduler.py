@@ -52,11 +52,10 @@ class ScheduledCall:
     @property
     def target_path(self) -> Optional[str]:
         """Get the file path this call operates on"""
-        return (
-            self.tool_input.get("path") or
-            self.tool_input.get("paths", [None])[0] if self.tool_input.get("paths") else
-            None
-        )
+        if self.tool_input.get("path"):
+            return self.tool_input["path"]
+        paths = self.tool_input.get("paths")
+        return paths[0] if paths else None
     
     @property
     def is_read_only(self) -> bool:
@@ -152,15 +151,15 @@ class ChunkScheduler:
                         file_readers[path] = []
                     file_readers[path].append(call.tool_use_id)
             
-            # bash commands and task_complete are sequential by default
-            if call.tool_name in ("bash", "batch_commands", "run_script", "task_complete"):
+            # bash commands are sequential by default
+            if call.tool_name in ("bash", "batch_commands", "run_script"):
                 # Depends on all previous writes
                 for prev_call in calls[:i]:
                     if prev_call.is_write or prev_call.tool_name in ("bash", "batch_commands"):
                         deps[call.tool_use_id].add(prev_call.tool_use_id)
             
-            # Sub-agent tasks depend on everything before them
-            if call.tool_name == "task":
+            # Sub-agent tasks and task_complete depend on everything before them
+            if call.tool_name in ("task", "task_complete"):
                 for prev_call in calls[:i]:
                     deps[call.tool_use_id].add(prev_call.tool_use_id)
         
@@ -179,17 +178,16 @@ class ChunkScheduler:
         
         chunk_id = 0
         while remaining:
-            # Find all calls whose dependencies are satisfied
-            ready = []
-            for tid in remaining:
-                unmet = deps[tid] - scheduled
-                if not unmet:
-                    ready.append(tid)
+            # Find all calls whose dependencies are satisfied (keep original call order)
+            ready = [
+                c.tool_use_id for c in calls
+                if c.tool_use_id in remaining and not deps[c.tool_use_id] - scheduled
+            ]
             
             if not ready:
                 # Circular dependency fallback: just take the first remaining
                 logger.warning("Circular dependency detected in tool scheduling")
-                ready = [next(iter(remaining))]
+                ready = [next(c.tool_use_id for c in calls if c.tool_use_id in remaining)]
             
             chunk = []
             for tid in ready:
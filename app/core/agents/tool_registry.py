@@ -137,6 +137,8 @@ class ToolRegistry:
 
     def __init__(self):
         self._tools: Dict[str, ToolDefinition] = {}
+        # Memoized API schema lists, keyed by tool selection; reset on register
+        self._schema_cache: Dict[Any, List[Dict]] = {}
 
     def register(
         self,
@@ -161,6 +163,7 @@ class ToolRegistry:
             display_label=display_label or name.replace("_", " ").title(),
         )
         self._tools[name] = tool
+        self._schema_cache.clear()
         return tool
 
     def register_from_definition(self, definition: Dict[str, Any]) -> ToolDefinition:
@@ -190,11 +193,11 @@ class ToolRegistry:
     def get_api_schemas(self, tool_names: Optional[List[str]] = None) -> List[Dict]:
         """Get tool schemas for Anthropic API calls"""
         if tool_names:
-            return [
-                self._tools[n].to_api_schema()
-                for n in tool_names if n in self._tools
-            ]
-        return [t.to_api_schema() for t in self._tools.values()]
+            return self.filter_by_names(tool_names)
+        schemas = self._schema_cache.get(None)
+        if schemas is None:
+            schemas = self._schema_cache[None] = [t.to_api_schema() for t in self._tools.values()]
+        return schemas
 
     def filter_by_category(self, categories: Set[ToolCategory]) -> List[ToolDefinition]:
         """Filter tools by category (used for sub-agent tool sets)"""
@@ -202,13 +205,25 @@ class ToolRegistry:
 
     def filter_by_names(self, names: List[str]) -> List[Dict]:
         """Get API schemas for specific tool names"""
-        return [self._tools[n].to_api_schema() for n in names if n in self._tools]
+        key = ("names", tuple(names))
+        schemas = self._schema_cache.get(key)
+        if schemas is None:
+            tools = self._tools
+            schemas = self._schema_cache[key] = [tools[n].to_api_schema() for n in names if n in tools]
+        return schemas
 
     def get_subagent_tools(self, subagent_type: str) -> List[Dict]:
         """
         Get tool set for a specific sub-agent type.
         Matches Claude Code's sub-agent tool restrictions.
         """
+        key = ("subagent", subagent_type)
+        schemas = self._schema_cache.get(key)
+        if schemas is None:
+            schemas = self._schema_cache[key] = self._build_subagent_tools(subagent_type)
+        return schemas
+
+    def _build_subagent_tools(self, subagent_type: str) -> List[Dict]:
         tool_sets = {
             "explore": {ToolCategory.FILE_READ, ToolCategory.SEARCH, ToolCategory.CONTROL},
             "plan": {ToolCategory.FILE_READ, ToolCategory.SEARCH, ToolCategory.PLANNING, ToolCategory.CONTROL},
@@ -1,5 +1,5 @@
 import asyncio
-import json
+import orjson
 from typing import AsyncGenerator, Dict, Any, List, Optional, Union
 from abc import ABC, abstractmethod
 import httpx
@@ -31,6 +31,43 @@ def is_gemini_model(model: str) -> bool:
     return model.lower().startswith("gemini")
 
 
+# 共享的 httpx 客户端, 见 _get_http_client()
+_HTTP_CLIENT: Optional[httpx.AsyncClient] = None
+_HTTP_CLIENT_LOOP: Optional[asyncio.AbstractEventLoop] = None
+# 多个 agentic 会话 + 预热/流式请求同时在途时保持足够的 keep-alive 连接
+_HTTP_LIMITS = httpx.Limits(max_connections=32, max_keepalive_connections=16, keepalive_expiry=60.0)
+
+
+def _http_timeout(read: float) -> httpx.Timeout:
+    """连接/写入/等待连接池使用固定的短超时, 只有读取 (模型生成) 使用调用方给的长超时"""
+    return httpx.Timeout(connect=10.0, read=read, write=30.0, pool=30.0)
+
+
+def _get_http_client() -> httpx.AsyncClient:
+    """
+    返回共享的 httpx 客户端 (首次使用时创建)。
+    
+    Agentic loop 每轮都会 POST 到同一个 /v1/messages 端点, 复用连接池可以
+    省掉每轮的 TCP + TLS 握手。客户端绑定事件循环, 循环变化时重新创建。
+    超时由各请求单独指定。
+    """
+    global _HTTP_CLIENT, _HTTP_CLIENT_LOOP
+    loop = asyncio.get_running_loop()
+    if _HTTP_CLIENT is None or _HTTP_CLIENT.is_closed or _HTTP_CLIENT_LOOP is not loop:
+        _HTTP_CLIENT = httpx.AsyncClient(timeout=_http_timeout(120.0), limits=_HTTP_LIMITS)
+        _HTTP_CLIENT_LOOP = loop
+    return _HTTP_CLIENT
+
+
+async def close_http_client() -> None:
+    """关闭共享的 httpx 客户端 (应用关闭时调用)"""
+    global _HTTP_CLIENT, _HTTP_CLIENT_LOOP
+    if _HTTP_CLIENT is not None and not _HTTP_CLIENT.is_closed:
+        await _HTTP_CLIENT.aclose()
+    _HTTP_CLIENT = None
+    _HTTP_CLIENT_LOOP = None
+
+
 class AIProvider(ABC):
     """AI提供商基类"""
     
@@ -257,6 +294,12 @@ class ClaudeCompatibleProvider(AIProvider):
             self.api_base = self.api_base[:-4]
         
         self.messages_endpoint = f"{self.api_base}/v1/messages"
+        # 请求头每次调用都相同, 构造一次复用 (共享的 httpx 客户端可能服务多个 API key, 不能放在客户端上)
+        self._headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.api_key}",
+            "anthropic-version": "2023-06-01"
+        }
         
     async def get_completion(
         self,
@@ -312,23 +355,27 @@ class ClaudeCompatibleProvider(AIProvider):
             # ★ Agentic Loop 支持：传入 tools 定义
             if kwargs.get("tools"):
                 request_body["tools"] = kwargs["tools"]
+                # 多轮工具调用每轮都重发相同的 system + tools, 标记为可缓存前缀
+                self._mark_prompt_cache(request_body)
             
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {self.api_key}",
-                "anthropic-version": "2023-06-01"
-            }
+            headers = self._headers
             
             # Agentic loop 需要更长的超时（工具调用描述可能很长）
-            timeout = 120.0 if kwargs.get("tools") else 60.0
+            timeout = _http_timeout(120.0 if kwargs.get("tools") else 60.0)
             
             logger.info(f"Calling Claude Messages API with model: {model}, endpoint: {self.messages_endpoint}, tools: {bool(kwargs.get('tools'))}")
             
-            async with httpx.AsyncClient(timeout=timeout) as client:
+            client = _get_http_client()
+            on_block = kwargs.get("on_block")
+            if on_block is not None:
+                # 流式: 每个 content block 解码完成就回调, 调用方可以提前开始执行工具
+                data = await self._stream_message(client, request_body, headers, timeout, on_block)
+            else:
                 response = await client.post(
                     self.messages_endpoint,
-                    json=request_body,
-                    headers=headers
+                    content=orjson.dumps(request_body),
+                    headers=headers,
+                    timeout=timeout,
                 )
                 
                 if response.status_code != 200:
@@ -336,39 +383,48 @@ class ClaudeCompatibleProvider(AIProvider):
                     logger.error(f"Claude API error: {response.status_code} - {error_text}")
                     raise Exception(f"Claude API error: {response.status_code} - {error_text}")
                 
-                data = response.json()
-                
-                # ★ 增强解析：同时提取 text 和 tool_use blocks
-                content_text = ""
-                content_blocks = data.get("content", [])
-                tool_uses = []
-                
-                for block in content_blocks:
-                    if block.get("type") == "text":
-                        content_text += block.get("text", "")
-                    elif block.get("type") == "tool_use":
-                        tool_uses.append(block)
-                
-                usage = {}
-                if data.get("usage"):
-                    usage = {
-                        "prompt_tokens": data["usage"].get("input_tokens", 0),
-                        "completion_tokens": data["usage"].get("output_tokens", 0),
-                        "total_tokens": data["usage"].get("input_tokens", 0) + data["usage"].get("output_tokens", 0)
-                    }
-                
-                return {
-                    # 向后兼容：所有旧代码只读这个字段，不受影响
-                    "content": content_text,
-                    "usage": usage,
-                    "finish_reason": data.get("stop_reason", "end_turn"),
-                    "tool_calls": None,
-                    # ★ Agentic Loop 新增字段
-                    "content_blocks": content_blocks,   # 原始 content block 数组
-                    "tool_uses": tool_uses,             # tool_use block 列表
-                    "stop_reason": data.get("stop_reason", "end_turn"),
+                data = orjson.loads(response.content)
+            
+            # ★ 增强解析：同时提取 text 和 tool_use blocks
+            text_parts = []
+            content_blocks = data.get("content", [])
+            tool_uses = []
+            
+            for block in content_blocks:
+                if block.get("type") == "text":
+                    text_parts.append(block.get("text", ""))
+                elif block.get("type") == "tool_use":
+                    tool_uses.append(block)
+            content_text = "".join(text_parts)
+            
+            usage = {}
+            if data.get("usage"):
+                usage = {
+                    "prompt_tokens": data["usage"].get("input_tokens", 0),
+                    "completion_tokens": data["usage"].get("output_tokens", 0),
+                    "total_tokens": data["usage"].get("input_tokens", 0) + data["usage"].get("output_tokens", 0),
+                    "cache_read_input_tokens": data["usage"].get("cache_read_input_tokens", 0),
+                    "cache_creation_input_tokens": data["usage"].get("cache_creation_input_tokens", 0),
                 }
-                
+                if kwargs.get("tools"):
+                    logger.info(
+                        f"Claude usage: input={usage['prompt_tokens']}, "
+                        f"cache_read={usage['cache_read_input_tokens']}, "
+                        f"cache_write={usage['cache_creation_input_tokens']}"
+                    )
+            
+            return {
+                # 向后兼容：所有旧代码只读这个字段，不受影响
+                "content": content_text,
+                "usage": usage,
+                "finish_reason": data.get("stop_reason", "end_turn"),
+                "tool_calls": None,
+                # ★ Agentic Loop 新增字段
+                "content_blocks": content_blocks,   # 原始 content block 数组
+                "tool_uses": tool_uses,             # tool_use block 列表
+                "stop_reason": data.get("stop_reason", "end_turn"),
+            }
+            
         except httpx.TimeoutException:
             logger.error("Claude API timeout")
             raise Exception("Request timed out. Please try again.")
@@ -379,6 +435,140 @@ class ClaudeCompatibleProvider(AIProvider):
             logger.error(f"Claude API error: {e}")
             raise Exception(f"Claude API error: {str(e)}")
     
+    async def warmup(self) -> None:
+        """
+        预先建立到 API 的连接 (TCP + TLS), 使第一轮请求复用连接池中的连接。
+        任何响应 (包括 404) 都可以, 失败也不影响后续请求。
+        """
+        try:
+            await _get_http_client().head(self.api_base, timeout=10.0)
+        except Exception as e:
+            logger.debug(f"Claude API warmup failed: {e}")
+    
+    _CACHE_CONTROL = {"type": "ephemeral"}
+    
+    @classmethod
+    def _mark_prompt_cache(cls, request_body: Dict[str, Any]) -> None:
+        """
+        给 system、最后一个 tool 和最后一条 user 消息加 cache_control:
+        system + tools 是静态前缀, 最后一条 user 消息是滚动断点, 下一轮请求
+        只需预填充新追加的内容。共 3 个断点 (API 上限为 4)。
+        不修改调用方传入的 tools / messages。
+        """
+        system = request_body.get("system")
+        if isinstance(system, str):
+            request_body["system"] = [
+                {"type": "text", "text": system, "cache_control": cls._CACHE_CONTROL}
+            ]
+        tools = request_body["tools"]
+        if "cache_control" not in tools[-1]:
+            request_body["tools"] = tools[:-1] + [{**tools[-1], "cache_control": cls._CACHE_CONTROL}]
+        messages = request_body["messages"]
+        if messages and messages[-1].get("role") == "user":
+            last = messages[-1]
+            content = last.get("content")
+            if isinstance(content, str):
+                content = [{"type": "text", "text": content, "cache_control": cls._CACHE_CONTROL}]
+            elif isinstance(content, list) and content:
+                content = content[:-1] + [{**content[-1], "cache_control": cls._CACHE_CONTROL}]
+            else:
+                return
+            request_body["messages"] = messages[:-1] + [{**last, "content": content}]
+    
+    # SSE delta 类型 -> 累积到的 content block 字段
+    _DELTA_FIELDS = {
+        "text_delta": ("text", "text"),
+        "thinking_delta": ("thinking", "thinking"),
+        "signature_delta": ("signature", "signature"),
+        "input_json_delta": ("partial_json", "input"),
+    }
+    
+    async def _stream_message(
+        self,
+        client: httpx.AsyncClient,
+        request_body: Dict[str, Any],
+        headers: Dict[str, str],
+        timeout: httpx.Timeout,
+        on_block,
+    ) -> Dict[str, Any]:
+        """
+        以 SSE 流式调用 /v1/messages, 每个 content block 结束 (content_block_stop)
+        时立即调用 on_block(block)。返回与非流式响应相同结构的 data
+        (content / usage / stop_reason)。
+        """
+        blocks: Dict[int, Dict[str, Any]] = {}
+        parts: Dict[int, Dict[str, List[str]]] = {}
+        usage: Dict[str, int] = {}
+        stop_reason = "end_turn"
+        
+        async with client.stream(
+            "POST",
+            self.messages_endpoint,
+            content=orjson.dumps({**request_body, "stream": True}),
+            headers=headers,
+            timeout=timeout,
+        ) as response:
+            if response.status_code != 200:
+                error_text = (await response.aread()).decode("utf-8", errors="replace")
+                logger.error(f"Claude API error: {response.status_code} - {error_text}")
+                raise Exception(f"Claude API error: {response.status_code} - {error_text}")
+            
+            async for line in response.aiter_lines():
+                if not line.startswith("data: "):
+                    continue
+                data_str = line[6:]
+                if data_str == "[DONE]":
+                    break
+                try:
+                    event = orjson.loads(data_str)
+                except orjson.JSONDecodeError:
+                    continue
+                event_type = event.get("type")
+                
+                if event_type == "content_block_delta":
+                    delta = event.get("delta", {})
+                    field = self._DELTA_FIELDS.get(delta.get("type"))
+                    if field and event.get("index") in parts:
+                        source, target = field
+                        parts[event["index"]].setdefault(target, []).append(delta.get(source, ""))
+                elif event_type == "content_block_start":
+                    index = event["index"]
+                    blocks[index] = dict(event.get("content_block") or {})
+                    parts[index] = {}
+                elif event_type == "content_block_stop":
+                    index = event.get("index")
+                    if index not in blocks:
+                        continue
+                    block = blocks[index]
+                    complete = True
+                    for target, chunks in parts.pop(index).items():
+                        if target == "input":
+                            raw = "".join(chunks)
+                            try:
+                                block["input"] = orjson.loads(raw) if raw else {}
+                            except orjson.JSONDecodeError:
+                                # 参数被 max_tokens 截断: 与非流式响应一样给空参数,
+                                # 不回调 on_block, 由调用方根据 stop_reason 处理
+                                block["input"] = {}
+                                complete = False
+                        else:
+                            block[target] = block.get(target, "") + "".join(chunks)
+                    if complete:
+                        on_block(block)
+                elif event_type == "message_start":
+                    usage.update((event.get("message") or {}).get("usage") or {})
+                elif event_type == "message_delta":
+                    stop_reason = (event.get("delta") or {}).get("stop_reason") or stop_reason
+                    usage.update(event.get("usage") or {})
+                elif event_type == "error":
+                    raise Exception(f"Claude API error: {event.get('error')}")
+        
+        return {
+            "content": [blocks[i] for i in sorted(blocks)],
+            "usage": usage,
+            "stop_reason": stop_reason,
+        }
+    
     async def stream_completion(
         self,
         messages: List[Dict[str, str]],
@@ -415,52 +605,49 @@ class ClaudeCompatibleProvider(AIProvider):
             if system_content:
                 request_body["system"] = system_content
             
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {self.api_key}",
-                "anthropic-version": "2023-06-01"
-            }
+            headers = self._headers
             
             logger.info(f"Calling Claude Messages API (stream) with model: {model}")
             
-            async with httpx.AsyncClient(timeout=120.0) as client:
-                async with client.stream(
-                    "POST",
-                    self.messages_endpoint,
-                    json=request_body,
-                    headers=headers
-                ) as response:
-                    if response.status_code != 200:
-                        error_text = await response.aread()
-                        logger.error(f"Claude stream error: {response.status_code} - {error_text}")
-                        yield StreamChunk(
-                            content=f"Error: {error_text.decode()}",
-                            type="error",
-                            metadata={"error": True, "status_code": response.status_code}
-                        )
-                        return
-                    
-                    async for line in response.aiter_lines():
-                        if not line:
+            client = _get_http_client()
+            async with client.stream(
+                "POST",
+                self.messages_endpoint,
+                content=orjson.dumps(request_body),
+                headers=headers,
+                timeout=_http_timeout(120.0),
+            ) as response:
+                if response.status_code != 200:
+                    error_text = await response.aread()
+                    logger.error(f"Claude stream error: {response.status_code} - {error_text}")
+                    yield StreamChunk(
+                        content=f"Error: {error_text.decode()}",
+                        type="error",
+                        metadata={"error": True, "status_code": response.status_code}
+                    )
+                    return
+                
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    if line.startswith("data: "):
+                        data_str = line[6:]
+                        if data_str == "[DONE]":
+                            break
+                        try:
+                            data = orjson.loads(data_str)
+                            event_type = data.get("type", "")
+                            
+                            if event_type == "content_block_delta":
+                                delta = data.get("delta", {})
+                                if delta.get("type") == "text_delta":
+                                    text = delta.get("text", "")
+                                    if text:
+                                        yield StreamChunk(content=text, type="text")
+                                        
+                        except orjson.JSONDecodeError:
                             continue
-                        if line.startswith("data: "):
-                            data_str = line[6:]
-                            if data_str == "[DONE]":
-                                break
-                            try:
-                                data = json.loads(data_str)
-                                event_type = data.get("type", "")
-                                
-                                if event_type == "content_block_delta":
-                                    delta = data.get("delta", {})
-                                    if delta.get("type") == "text_delta":
-                                        text = delta.get("text", "")
-                                        if text:
-                                            yield StreamChunk(content=text, type="text")
-                                            
-                            except json.JSONDecodeError:
-                                continue
-                                
+                            
         except Exception as e:
             logger.error(f"Claude stream error: {e}")
             yield StreamChunk(
@@ -778,6 +965,16 @@ class AIEngine:
         
         return provider
     
+    async def warmup(self, model: str, **kwargs) -> None:
+        """为模型对应的提供商预热连接 (提供商不支持时忽略)"""
+        try:
+            provider = self._get_provider(model, kwargs.get("api_key"), kwargs.get("api_url"))
+        except ValueError:
+            return
+        warmup = getattr(provider, "warmup", None)
+        if warmup is not None:
+            await warmup()
+    
     async def generate(
         self,
         prompt: str,
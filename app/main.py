@@ -94,6 +94,10 @@ async def lifespan(app: FastAPI):
     # 关闭Redis连接
     from app.db.session import close_redis
     await close_redis()
+    
+    # 关闭共享的 LLM HTTP 连接池
+    from app.core.ai_engine import close_http_client
+    await close_http_client()
 
 # 创建FastAPI应用
 app = FastAPI(
@@ -207,6 +211,14 @@ async def health_check():
         logger.error(f"AI engine health check failed: {e}")
         ai_status = "unhealthy"
     
+    # Agentic 工具子进程并发情况
+    try:
+        from app.core.agents.agentic_loop import tool_subprocess_stats
+        tool_subprocesses = tool_subprocess_stats()
+    except Exception as e:
+        logger.error(f"Tool subprocess stats unavailable: {e}")
+        tool_subprocesses = None
+    
     overall_status = "healthy" if all([
         db_status == "healthy",
         redis_status == "healthy",
@@ -222,6 +234,7 @@ async def health_check():
             "redis": redis_status,
             "ai_engine": ai_status
         },
+        "tool_subprocesses": tool_subprocesses,
         "features": {
             "unified_chat": True,
             "intent_recognition": True,
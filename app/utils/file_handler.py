@@ -1,34 +1,75 @@
 # app/utils/file_handler.py
 import os
+import csv
+import io
+import importlib
 import mimetypes
-from typing import Optional, Dict, Any
+import zipfile
+from typing import Optional, Dict, Any, Callable, Tuple
+from collections import OrderedDict
+from functools import lru_cache
 import aiofiles
 from pathlib import Path
+from xml.etree.ElementTree import iterparse
 
-# 尝试导入可选依赖
-try:
-    import PyPDF2
-    HAS_PDF_SUPPORT = True
-except ImportError:
-    HAS_PDF_SUPPORT = False
 
-try:
-    import docx
-    HAS_DOCX_SUPPORT = True
-except ImportError:
-    HAS_DOCX_SUPPORT = False
+@lru_cache(maxsize=None)
+def _optional_import(module_name: str):
+    """首次使用时才导入可选依赖（pandas 等导入开销很大），未安装时返回 None"""
+    try:
+        return importlib.import_module(module_name)
+    except ImportError:
+        return None
+
+
+# WordprocessingML 命名空间下的段落和文本节点标签
+_W_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+_W_PARAGRAPH = _W_NS + 'p'
+_W_TEXT = _W_NS + 't'
+
+# 内容流超过该大小的PDF页面视为图形密集页面，先检查是否可能含有文字
+PDF_GRAPHICS_HEAVY_BYTES = 1_000_000
+
+# 文本文件读取上限（字节），超出部分截断
+MAX_TEXT_BYTES = 50 * 1024 * 1024
 
-try:
-    import pandas as pd
-    HAS_PANDAS = True
-except ImportError:
-    HAS_PANDAS = False
+
+def _content_stream_length(doc, page) -> int:
+    """读取页面内容流的 /Length，无需解压内容流本身"""
+    total = 0
+    for xref in page.get_contents():
+        kind, value = doc.xref_get_key(xref, "Length")
+        if kind == "int":
+            total += int(value)
+    return total
+
+
+def _extract_text_from_pdf_pymupdf(pymupdf, file_path: str) -> str:
+    """使用 PyMuPDF 提取文本，跳过不含字体的图形密集页面"""
+    content = []
+    with pymupdf.open(file_path) as doc:
+        for page in doc:
+            if (_content_stream_length(doc, page) > PDF_GRAPHICS_HEAVY_BYTES
+                    and not page.get_fonts()):
+                # 页面资源里没有任何字体就不可能有文字，无需解析数 MB 的绘图指令
+                content.append('')
+                continue
+            content.append(page.get_text("text", flags=pymupdf.TEXT_PRESERVE_WHITESPACE))
+    return '\n'.join(content)
 
 
 def extract_text_from_pdf(file_path: str) -> str:
-    """从PDF文件提取文本"""
-    if not HAS_PDF_SUPPORT:
-        return "PDF support not available. Please install PyPDF2."
+    """从PDF文件提取文本（优先使用可选依赖 PyMuPDF，AGPL 许可需单独安装；否则使用 PyPDF2）"""
+    pymupdf = _optional_import('pymupdf')
+    if pymupdf is not None:
+        try:
+            return _extract_text_from_pdf_pymupdf(pymupdf, file_path)
+        except Exception as e:
+            return f"Error reading PDF: {str(e)}"
+    
+    PyPDF2 = _optional_import('PyPDF2')
+    if PyPDF2 is None:
+        return "PDF support not available. Please install PyMuPDF or PyPDF2."
     
     try:
         with open(file_path, 'rb') as file:
@@ -43,15 +84,20 @@ def extract_text_from_pdf(file_path: str) -> str:
 
 def extract_text_from_docx(file_path: str) -> str:
     """从Word文档提取文本"""
-    if not HAS_DOCX_SUPPORT:
-        return "DOCX support not available. Please install python-docx."
-    
+    # 直接对 word/document.xml 做一次 iterparse，不构建 python-docx 的完整 DOM
     try:
-        doc = docx.Document(file_path)
-        content = []
-        for paragraph in doc.paragraphs:
-            content.append(paragraph.text)
-        return '\n'.join(content)
+        paragraphs = []
+        runs = []
+        with zipfile.ZipFile(file_path) as archive, archive.open('word/document.xml') as f:
+            for _, element in iterparse(f):
+                if element.tag == _W_TEXT:
+                    if element.text:
+                        runs.append(element.text)
+                elif element.tag == _W_PARAGRAPH:
+                    paragraphs.append(''.join(runs))
+                    runs.clear()
+                    element.clear()
+        return '\n'.join(paragraphs)
     except Exception as e:
         return f"Error reading document: {str(e)}"
 
@@ -59,33 +105,51 @@ def extract_text_from_docx(file_path: str) -> str:
 def extract_text_from_txt(file_path: str) -> str:
     """从文本文件提取内容"""
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return f.read()
+        path = Path(file_path)
+        if path.stat().st_size > MAX_TEXT_BYTES:
+            # 超大文件只读取前 MAX_TEXT_BYTES 字节，避免占满服务器内存
+            with open(file_path, 'rb') as f:
+                raw = f.read(MAX_TEXT_BYTES)
+            return raw.decode('utf-8', errors='replace')
+        return path.read_text(encoding='utf-8', errors='replace')
     except Exception as e:
         return f"Error reading text file: {str(e)}"
 
 
 def extract_text_from_csv(file_path: str) -> str:
     """从CSV文件提取内容"""
-    if not HAS_PANDAS:
-        # 如果没有pandas，使用基础方法
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return f.read()
-        except Exception as e:
-            return f"Error reading CSV: {str(e)}"
-    
+    # 只需要原始文本，直接用 csv 模块流式处理，避免 pandas 类型推断和 to_string 的开销
     try:
-        df = pd.read_csv(file_path)
-        return df.to_string()
+        with open(file_path, 'r', newline='', encoding='utf-8') as f:
+            buf = io.StringIO()
+            writer = csv.writer(buf, dialect='excel', lineterminator='\n')
+            writer.writerows(csv.reader(f))
+            return buf.getvalue()
     except Exception as e:
         return f"Error reading CSV file: {str(e)}"
 
 
 def extract_text_from_excel(file_path: str) -> str:
     """从Excel文件提取内容"""
-    if not HAS_PANDAS:
-        return "Excel support not available. Please install pandas."
+    # .xlsx 使用 openpyxl 只读模式流式解析，跳过 pandas；.xls 仍需 pandas/xlrd
+    openpyxl = _optional_import('openpyxl')
+    if openpyxl is not None and Path(file_path).suffix.lower() != '.xls':
+        try:
+            wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+            try:
+                return '\n'.join(
+                    '\t'.join('' if value is None else str(value) for value in row)
+                    for sheet in wb.worksheets
+                    for row in sheet.iter_rows(values_only=True)
+                )
+            finally:
+                wb.close()
+        except Exception as e:
+            return f"Error reading Excel file: {str(e)}"
+    
+    pd = _optional_import('pandas')
+    if pd is None:
+        return "Excel support not available. Please install openpyxl or pandas."
     
     try:
         df = pd.read_excel(file_path)
@@ -94,6 +158,54 @@ def extract_text_from_excel(file_path: str) -> str:
         return f"Error reading Excel file: {str(e)}"
 
 
+# 扩展名 -> (提取函数, 内容类型)
+EXT_HANDLERS: Dict[str, Tuple[Callable[[str], str], str]] = {
+    '.txt': (extract_text_from_txt, "text"),
+    '.md': (extract_text_from_txt, "text"),
+    '.log': (extract_text_from_txt, "text"),
+    '.pdf': (extract_text_from_pdf, "pdf"),
+    '.docx': (extract_text_from_docx, "document"),
+    '.doc': (extract_text_from_docx, "document"),
+    '.xlsx': (extract_text_from_excel, "spreadsheet"),
+    '.xls': (extract_text_from_excel, "spreadsheet"),
+    '.csv': (extract_text_from_csv, "csv"),
+    **{ext: (extract_text_from_txt, "code")
+       for ext in ('.py', '.js', '.java', '.cpp', '.c', '.go', '.rs', '.php', '.rb')},
+}
+
+# MIME类型 -> (提取函数, 内容类型)
+MIME_HANDLERS: Dict[str, Tuple[Callable[[str], str], str]] = {
+    'application/pdf': (extract_text_from_pdf, "pdf"),
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.document': (extract_text_from_docx, "document"),
+    'application/msword': (extract_text_from_docx, "document"),
+    'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet': (extract_text_from_excel, "spreadsheet"),
+    'application/vnd.ms-excel': (extract_text_from_excel, "spreadsheet"),
+    'text/csv': (extract_text_from_csv, "csv"),
+}
+
+_TEXT_HANDLER = (extract_text_from_txt, "text")
+
+# 扩展名和MIME类型指向不同类别时的优先级（数值小者优先），
+# 与原 if/elif 链的顺序一致：text/* 优先，所以 .csv / .py 等仍按 "text" 提取
+_TYPE_PRIORITY = {"text": 0, "pdf": 1, "document": 2, "spreadsheet": 3, "csv": 4, "code": 5}
+
+# mimetypes 只看最后的类型后缀和压缩后缀，按后缀缓存推断结果；
+# 上传路径各不相同，以完整路径为键几乎不会命中
+@lru_cache(maxsize=256)
+def _guess_mime_by_suffix(suffixes: str) -> Tuple[Optional[str], Optional[str]]:
+    return mimetypes.guess_type("f" + suffixes)
+
+
+def guess_mime_type(file_path: str) -> Tuple[Optional[str], Optional[str]]:
+    """推断文件的 MIME 类型和编码，返回值与 mimetypes.guess_type 相同"""
+    return _guess_mime_by_suffix("".join(Path(file_path).suffixes[-2:]))
+
+# 提取结果缓存：(路径, mtime_ns, 大小, MIME类型) -> 结果，按 LRU 淘汰
+EXTRACT_CACHE_SIZE = 256
+EXTRACT_CACHE_MAX_CONTENT = 2 * 1024 * 1024
+_EXTRACT_CACHE: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+
+
 async def extract_file_content(file_path: str, mime_type: Optional[str] = None) -> Dict[str, Any]:
     """
     从文件中提取内容
@@ -105,59 +217,58 @@ async def extract_file_content(file_path: str, mime_type: Optional[str] = None)
     Returns:
         包含提取内容的字典
     """
-    if not os.path.exists(file_path):
+    try:
+        file_stat = os.stat(file_path)
+    except OSError:
         return {"type": "error", "content": "File not found"}
     
     if not mime_type:
-        mime_type, _ = mimetypes.guess_type(file_path)
+        mime_type, _ = guess_mime_type(file_path)
+    
+    cache_key = (file_path, file_stat.st_mtime_ns, file_stat.st_size, mime_type)
+    cached = _EXTRACT_CACHE.get(cache_key)
+    if cached is not None:
+        _EXTRACT_CACHE.move_to_end(cache_key)
+        return dict(cached)
     
+    result = _extract_by_type(file_path, mime_type, file_stat)
+    
+    # 只缓存成功且不太大的结果，控制内存占用
+    if result["type"] != "error" and len(result["content"]) <= EXTRACT_CACHE_MAX_CONTENT:
+        _EXTRACT_CACHE[cache_key] = result
+        if len(_EXTRACT_CACHE) > EXTRACT_CACHE_SIZE:
+            _EXTRACT_CACHE.popitem(last=False)
+        return dict(result)
+    return result
+
+
+def _extract_by_type(file_path: str, mime_type: Optional[str], file_stat: os.stat_result) -> Dict[str, Any]:
+    """按扩展名/MIME类型分派到具体的提取函数"""
     file_extension = Path(file_path).suffix.lower()
     
     try:
-        # 文本文件
-        if mime_type and mime_type.startswith('text/') or file_extension in ['.txt', '.md', '.log']:
-            content = extract_text_from_txt(file_path)
-            return {"type": "text", "content": content}
-        
-        # PDF文件
-        elif mime_type == 'application/pdf' or file_extension == '.pdf':
-            content = extract_text_from_pdf(file_path)
-            return {"type": "pdf", "content": content}
-        
-        # Word文档
-        elif mime_type in ['application/vnd.openxmlformats-officedocument.wordprocessingml.document', 
-                          'application/msword'] or file_extension in ['.docx', '.doc']:
-            content = extract_text_from_docx(file_path)
-            return {"type": "document", "content": content}
+        candidates = [h for h in (EXT_HANDLERS.get(file_extension), MIME_HANDLERS.get(mime_type)) if h]
+        if mime_type and mime_type.startswith('text/'):
+            candidates.append(_TEXT_HANDLER)
+        handler = min(candidates, key=lambda h: _TYPE_PRIORITY[h[1]], default=None)
         
-        # Excel文件
-        elif mime_type in ['application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-                          'application/vnd.ms-excel'] or file_extension in ['.xlsx', '.xls']:
-            content = extract_text_from_excel(file_path)
-            return {"type": "spreadsheet", "content": content}
-        
-        # CSV文件
-        elif mime_type == 'text/csv' or file_extension == '.csv':
-            content = extract_text_from_csv(file_path)
-            return {"type": "csv", "content": content}
-        
-        # 代码文件
-        elif file_extension in ['.py', '.js', '.java', '.cpp', '.c', '.go', '.rs', '.php', '.rb']:
-            content = extract_text_from_txt(file_path)
-            return {"type": "code", "content": content, "language": file_extension[1:]}
+        if handler:
+            extract, content_type = handler
+            result = {"type": content_type, "content": extract(file_path)}
+            if content_type == "code":
+                result["language"] = file_extension[1:]
+            return result
         
         # 默认：返回文件信息
-        else:
-            file_stat = os.stat(file_path)
-            return {
-                "type": "unsupported",
-                "content": f"File type not supported for content extraction",
-                "file_info": {
-                    "size": file_stat.st_size,
-                    "mime_type": mime_type,
-                    "extension": file_extension
-                }
+        return {
+            "type": "unsupported",
+            "content": f"File type not supported for content extraction",
+            "file_info": {
+                "size": file_stat.st_size,
+                "mime_type": mime_type,
+                "extension": file_extension
             }
+        }
             
     except Exception as e:
         return {
@@ -168,11 +279,12 @@ async def extract_file_content(file_path: str, mime_type: Optional[str] = None)
 
 def get_file_info(file_path: str) -> Dict[str, Any]:
     """获取文件信息"""
-    if not os.path.exists(file_path):
+    try:
+        file_stat = os.stat(file_path)
+    except OSError:
         return {"error": "File not found"}
     
-    file_stat = os.stat(file_path)
-    mime_type, _ = mimetypes.guess_type(file_path)
+    mime_type, _ = guess_mime_type(file_path)
     
     return {
         "filename": os.path.basename(file_path),
@@ -1,4 +1,4 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Set, Tuple
 import json
 import os
 from pathlib import Path
@@ -8,6 +8,9 @@ from app.config import settings
 # 翻译字符串存储
 translations: Dict[str, Dict[str, str]] = {}
 
+# 不含格式化占位符的 (语言, 键)，get_text 对这些条目跳过 str.format
+_NO_FMT: Set[Tuple[str, str]] = set()
+
 # 默认翻译
 default_translations = {
     "en": {
@@ -118,7 +121,7 @@ default_translations = {
 
 def init_translations():
     """初始化翻译"""
-    global translations
+    global translations, _NO_FMT
     
     # 加载默认翻译
     translations = default_translations.copy()
@@ -133,6 +136,14 @@ def init_translations():
                     translations[lang_code] = json.load(f)
             except Exception as e:
                 print(f"Failed to load translation file {lang_file}: {e}")
+    
+    # 预先标记静态文本，运行时无需再调用 format
+    _NO_FMT = {
+        (lang_code, key)
+        for lang_code, entries in translations.items()
+        for key, value in entries.items()
+        if isinstance(value, str) and '{' not in value and '}' not in value
+    }
 
 def get_text(key: str, lang: str = "en", **kwargs) -> str:
     """
@@ -153,9 +164,14 @@ def get_text(key: str, lang: str = "en", **kwargs) -> str:
     if lang in translations and key in translations[lang]:
         text = translations[lang][key]
     elif key in translations.get("en", {}):
+        lang = "en"
         text = translations["en"][key]
     else:
-        text = key  # 如果找不到翻译，返回键本身
+        return key  # 如果找不到翻译，返回键本身
+    
+    # 静态文本无需格式化
+    if (lang, key) in _NO_FMT:
+        return text
     
     # 格式化文本
     if kwargs:
@@ -83,6 +83,8 @@ def extract_image_urls(text: str) -> List[str]:
     
     return re.findall(image_pattern, text, re.IGNORECASE)
 
+_SENTENCE_SPLIT_RE = re.compile(r'(?<=[.!?])\s+')
+
 def split_long_message(text: str, max_length: int = 3500) -> List[str]:
     """
     分割长消息，保持格式完整性
@@ -91,31 +93,49 @@ def split_long_message(text: str, max_length: int = 3500) -> List[str]:
         return [text]
     
     messages = []
-    current_message = ""
+    # 当前消息以片段列表累积，长度用整数单独维护，避免反复拼接和 len()
+    current_parts = []
+    current_len = 0
+    
+    def flush():
+        messages.append(''.join(current_parts).strip())
     
     # 按段落分割
     paragraphs = text.split('\n\n')
     
     for paragraph in paragraphs:
+        paragraph_len = len(paragraph)
         # 如果单个段落就超过最大长度，需要进一步分割
-        if len(paragraph) > max_length:
+        if paragraph_len > max_length:
             # 尝试按句子分割
-            sentences = re.split(r'(?<=[.!?])\s+', paragraph)
-            for sentence in sentences:
-                if len(current_message) + len(sentence) + 2 > max_length:
-                    messages.append(current_message.strip())
-                    current_message = sentence
+            for sentence in _SENTENCE_SPLIT_RE.split(paragraph):
+                sentence_len = len(sentence)
+                if current_len + sentence_len + 2 > max_length:
+                    flush()
+                    current_parts = [sentence]
+                    current_len = sentence_len
+                elif current_len:
+                    current_parts.append(" ")
+                    current_parts.append(sentence)
+                    current_len += sentence_len + 1
                 else:
-                    current_message += " " + sentence if current_message else sentence
+                    current_parts = [sentence]
+                    current_len = sentence_len
         else:
-            if len(current_message) + len(paragraph) + 4 > max_length:
-                messages.append(current_message.strip())
-                current_message = paragraph
+            if current_len + paragraph_len + 4 > max_length:
+                flush()
+                current_parts = [paragraph]
+                current_len = paragraph_len
+            elif current_len:
+                current_parts.append("\n\n")
+                current_parts.append(paragraph)
+                current_len += paragraph_len + 2
             else:
-                current_message += "\n\n" + paragraph if current_message else paragraph
+                current_parts = [paragraph]
+                current_len = paragraph_len
     
-    if current_message:
-        messages.append(current_message.strip())
+    if current_len:
+        flush()
     
     return messages
 
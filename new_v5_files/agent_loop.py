@@ -13,18 +13,182 @@ when the model produces plain text without tool calls, the loop terminates.
 """
 
 import asyncio
-import json
 import time
 import uuid
-from typing import Any, Dict, List, Optional, AsyncGenerator
+from collections import Counter
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple, AsyncGenerator, AsyncIterator
 from dataclasses import dataclass, field
 from enum import Enum
+from functools import lru_cache
+
+import orjson
 
 from .tool_registry import ToolRegistry
 from .context_manager import ContextManager
 from .event_queue import EventQueue
 
 
+def _json_dumps(obj: Any) -> bytes:
+    """Serialize to UTF-8 JSON bytes (non-ASCII kept as-is, like ensure_ascii=False)"""
+    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+
+def _clip(value: Any, limit: int) -> Any:
+    """Shorten long strings/lists so a preview never serializes full tool arguments"""
+    if isinstance(value, str):
+        return value[:limit]
+    if isinstance(value, dict):
+        return {k: _clip(v, limit) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_clip(v, limit) for v in value[:limit // 10 + 1]]
+    return value
+
+
+def _preview(obj: Any, limit: int = 100) -> str:
+    """Short JSON preview of tool arguments, at most `limit` characters"""
+    return _json_dumps(_clip(obj, limit)).decode()[:limit]
+
+
+def format_sse_frame(event: Dict) -> bytes:
+    """Encode an event as a single SSE `data:` frame"""
+    return b"data: " + _json_dumps(event) + b"\n\n"
+
+
+@lru_cache(maxsize=None)
+def _frame_prefix(event_type: str) -> bytes:
+    """`data: {"type":...,"data":` - constant per event type"""
+    return b'data: {"type":' + _json_dumps(event_type) + b',"data":'
+
+
+def _frame_tail(session_id: Optional[str]) -> bytes:
+    """`,"session_id":...}` plus frame terminator - constant per run"""
+    return b',"session_id":' + _json_dumps(session_id) + b"}\n\n"
+
+
+class SSEEvent(dict):
+    """
+    An emitted loop event. Behaves as a plain dict, and additionally
+    carries its SSE wire frame, encoded once on first access so that
+    every transport/subscriber reuses the same bytes.
+    
+    Envelopes built by `AgentLoop._emit_event` carry their pre-encoded
+    session tail; only `data` and `timestamp` are serialized per event.
+    """
+    __slots__ = ("_frame", "_tail")
+    
+    @property
+    def frame(self) -> bytes:
+        try:
+            return self._frame
+        except AttributeError:
+            pass
+        try:
+            tail = self._tail
+        except AttributeError:
+            frame = format_sse_frame(self)
+        else:
+            frame = b"".join((
+                _frame_prefix(self["type"]), _json_dumps(self["data"]),
+                b',"timestamp":', _json_dumps(self["timestamp"]), tail,
+            ))
+        self._frame = frame
+        return frame
+
+
+class EventBatcher:
+    """
+    Coalesce loop events into fewer network writes.
+    
+    Frames of events arriving within FLUSH_INTERVAL of the first buffered
+    one are concatenated into a single chunk (each stays its own SSE
+    event on the wire). Completion/terminal events and a full buffer
+    flush immediately so latency-sensitive updates are never held back.
+    """
+    FLUSH_INTERVAL = 0.008  # seconds
+    MAX_BUFFER_BYTES = 16 * 1024
+    FLUSH_NOW_EVENTS = frozenset({
+        "tool_completed", "tool_error", "error", "text_response",
+        "waiting_approval", "session_paused", "max_iterations", "session_complete",
+    })
+    
+    def __init__(self, events: AsyncIterator[Dict]):
+        self._events = events
+    
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        loop = asyncio.get_running_loop()
+        source = self._events.__aiter__()
+        buffer: List[bytes] = []
+        buffered = 0
+        deadline = 0.0
+        pending: Optional[asyncio.Future] = None
+        try:
+            while True:
+                if pending is None:
+                    pending = asyncio.ensure_future(source.__anext__())
+                timeout = max(0.0, deadline - loop.time()) if buffer else None
+                done, _ = await asyncio.wait({pending}, timeout=timeout)
+                if not done:
+                    yield b"".join(buffer)
+                    buffer, buffered = [], 0
+                    continue
+                
+                next_event, pending = pending, None
+                try:
+                    event = next_event.result()
+                except StopAsyncIteration:
+                    break
+                
+                frame = event.frame if isinstance(event, SSEEvent) else format_sse_frame(event)
+                if not buffer:
+                    deadline = loop.time() + self.FLUSH_INTERVAL
+                buffer.append(frame)
+                buffered += len(frame)
+                if event.get("type") in self.FLUSH_NOW_EVENTS or buffered >= self.MAX_BUFFER_BYTES:
+                    yield b"".join(buffer)
+                    buffer, buffered = [], 0
+            
+            if buffer:
+                yield b"".join(buffer)
+        finally:
+            if pending is not None:
+                pending.cancel()
+
+
+# Tool name -> display/stats category
+TOOL_CATEGORIES: Mapping[str, str] = MappingProxyType({
+    "bash": "command",
+    "run_command": "command",
+    "execute_script": "command",
+    "view_file": "view",
+    "read_file": "view",
+    "view_truncated": "view",
+    "glob": "view",
+    "grep": "view",
+    "ls": "view",
+    "edit_file": "edit",
+    "write_file": "edit",
+    "multi_edit": "edit",
+    "str_replace": "edit",
+    "web_search": "search",
+    "web_fetch": "fetch",
+    "todo_read": "todo",
+    "todo_write": "todo",
+})
+
+# Category -> step title fragment for a given call count
+STEP_TITLE_TEMPLATES: Mapping[str, Callable[[int], str]] = MappingProxyType({
+    "command": lambda n: f"Ran {n} command{'s' if n > 1 else ''}",
+    "view": lambda n: f"Viewed {n} file{'s' if n > 1 else ''}",
+    "edit": lambda n: f"edited {n} file{'s' if n > 1 else ''}",
+    "search": lambda n: "Searched the web",
+    "fetch": lambda n: f"Fetched {n} page{'s' if n > 1 else ''}",
+})
+
+# Tool categories with no side effects; consecutive calls in these run concurrently
+PARALLEL_SAFE_CATEGORIES = frozenset({"view", "search", "fetch"})
+
+
 class LoopStatus(str, Enum):
     IDLE = "idle"
     RUNNING = "running"
@@ -43,7 +207,7 @@ class StepType(str, Enum):
     SUMMARY = "summary"
 
 
-@dataclass
+@dataclass(slots=True)
 class ToolCall:
     """Represents a single tool invocation"""
     id: str
@@ -63,7 +227,7 @@ class ToolCall:
         return None
 
 
-@dataclass
+@dataclass(slots=True)
 class AgentStep:
     """A single step in the agentic loop"""
     id: str
@@ -79,7 +243,7 @@ class AgentStep:
     files_changed: List[Dict[str, Any]] = field(default_factory=list)
 
 
-@dataclass
+@dataclass(slots=True)
 class LoopSession:
     """Tracks an entire agentic loop session"""
     session_id: str
@@ -97,24 +261,29 @@ class LoopSession:
     # Context management
     messages: List[Dict[str, Any]] = field(default_factory=list)
     context_usage_pct: float = 0.0
+    next_id: int = 0
     
     def to_dict(self) -> Dict:
+        step_to_dict = self._step_to_dict
         return {
             "session_id": self.session_id,
             "status": self.status.value,
-            "steps": [self._step_to_dict(s) for s in self.steps],
-            "stats": {
-                "total_tool_calls": self.total_tool_calls,
-                "total_files_viewed": self.total_files_viewed,
-                "total_files_edited": self.total_files_edited,
-                "total_commands_run": self.total_commands_run,
-                "total_searches": self.total_searches,
-            },
+            "steps": [step_to_dict(s) for s in self.steps],
+            "stats": self._stats_dict(),
             "started_at": self.started_at,
             "completed_at": self.completed_at,
             "context_usage_pct": self.context_usage_pct,
         }
     
+    def _stats_dict(self) -> Dict:
+        return {
+            "total_tool_calls": self.total_tool_calls,
+            "total_files_viewed": self.total_files_viewed,
+            "total_files_edited": self.total_files_edited,
+            "total_commands_run": self.total_commands_run,
+            "total_searches": self.total_searches,
+        }
+    
     def _step_to_dict(self, step: AgentStep) -> Dict:
         return {
             "id": step.id,
@@ -153,7 +322,9 @@ class AgentLoop:
     """
     
     MAX_ITERATIONS = 100  # Safety rail: max loop iterations
-    CONTEXT_COMPACT_THRESHOLD = 0.92  # Compact at 92% usage (like Claude Code)
+    CONTEXT_COMPACT_SOFT_THRESHOLD = 0.70  # Start background compaction of old history
+    CONTEXT_COMPACT_THRESHOLD = 0.95  # Hard wall: block until compacted
+    COMPACT_KEEP_RECENT = 6  # Most recent messages never handed to background compaction
     
     def __init__(
         self,
@@ -162,22 +333,40 @@ class AgentLoop:
         event_queue: EventQueue,
         llm_client: Any = None,
         max_iterations: int = MAX_ITERATIONS,
+        enable_parallel_tool_execution: bool = True,
+        emit_progress_events: bool = True,
+        tool_definitions: Optional[List[Dict]] = None,
     ):
         self.tool_registry = tool_registry
         self.context_manager = context_manager
         self.event_queue = event_queue
         self.llm_client = llm_client
         self.max_iterations = max_iterations
+        self.enable_parallel_tool_execution = enable_parallel_tool_execution
+        # Headless callers (batch evals, run-to-completion) can skip the
+        # purely informational progress events; lifecycle, tool results
+        # and errors are always emitted.
+        self.emit_progress_events = emit_progress_events
         self._current_session: Optional[LoopSession] = None
-        self._interrupt_flag = False
-        self._pause_flag = False
+        self._frame_tail = _frame_tail(None)
+        self._interrupt_event = asyncio.Event()
+        self._resume_event = asyncio.Event()  # cleared while paused
+        self._resume_event.set()
+        # Callers running many loops over one registry pass a shared list
+        self._tool_definitions: Optional[List[Dict]] = tool_definitions
+        self._compact_task: Optional[asyncio.Task] = None
+        self._compact_split = 0
+        self._last_compaction_ok = False
+        # Background compaction fires once per excursion above the soft
+        # threshold; it re-arms only after usage drops back below it
+        self._compact_armed = True
     
     async def run(
         self,
         user_message: str,
         system_prompt: Optional[str] = None,
         session_id: Optional[str] = None,
-    ) -> AsyncGenerator[Dict, None]:
+    ) -> AsyncGenerator[SSEEvent, None]:
         """
         Execute the agentic loop.
         
@@ -191,7 +380,9 @@ class AgentLoop:
             started_at=time.time(),
         )
         self._current_session = session
-        self._interrupt_flag = False
+        self._frame_tail = _frame_tail(session.session_id)
+        self._interrupt_event.clear()
+        self._compact_armed = True
         
         # Initialize context
         messages = self.context_manager.build_messages(
@@ -202,227 +393,362 @@ class AgentLoop:
         
         yield self._emit_event("session_start", session.to_dict())
         
-        iteration = 0
-        while iteration < self.max_iterations:
-            # Check for interrupts
-            if self._interrupt_flag:
-                session.status = LoopStatus.PAUSED
-                yield self._emit_event("session_paused", {"reason": "user_interrupt"})
-                break
-            
-            if self._pause_flag:
-                session.status = LoopStatus.WAITING_APPROVAL
-                yield self._emit_event("waiting_approval", {})
-                # Wait for resume signal
-                while self._pause_flag and not self._interrupt_flag:
-                    await asyncio.sleep(0.1)
-                if self._interrupt_flag:
+        # Tasks that may still be running if the consumer closes this
+        # generator early (e.g. client disconnect); reaped in the finally
+        exec_task: Optional[asyncio.Task] = None
+        next_event: Optional[asyncio.Future] = None
+        try:
+            iteration = 0
+            while iteration < self.max_iterations:
+                # Check for interrupts
+                if self._interrupt_event.is_set():
+                    session.status = LoopStatus.PAUSED
+                    yield self._emit_event("session_paused", {"reason": "user_interrupt"})
                     break
-                session.status = LoopStatus.RUNNING
             
-            iteration += 1
+                if not self._resume_event.is_set():
+                    session.status = LoopStatus.WAITING_APPROVAL
+                    yield self._emit_event("waiting_approval", {})
+                    # Wait for resume signal
+                    resumed = asyncio.create_task(self._resume_event.wait())
+                    interrupted = asyncio.create_task(self._interrupt_event.wait())
+                    await asyncio.wait(
+                        {resumed, interrupted}, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    resumed.cancel()
+                    interrupted.cancel()
+                    if self._interrupt_event.is_set():
+                        break
+                    session.status = LoopStatus.RUNNING
             
-            # === THINK: Get model response ===
-            yield self._emit_event("thinking", {"iteration": iteration})
+                iteration += 1
             
-            try:
-                response = await self._call_llm(messages)
-            except Exception as e:
-                session.status = LoopStatus.ERROR
-                session.error = str(e)
-                yield self._emit_event("error", {"message": str(e)})
-                break
+                # === THINK: Get model response ===
+                if self.emit_progress_events:
+                    yield self._emit_event("thinking", {"iteration": iteration})
             
-            # Parse response for tool calls
-            tool_calls = self._extract_tool_calls(response)
-            text_content = self._extract_text(response)
+                try:
+                    response = await self._call_llm(messages)
+                except Exception as e:
+                    session.status = LoopStatus.ERROR
+                    session.error = str(e)
+                    yield self._emit_event("error", {"message": str(e)})
+                    break
             
-            # If no tool calls, the model is done - loop terminates
-            if not tool_calls:
-                step = AgentStep(
-                    id=str(uuid.uuid4()),
-                    step_type=StepType.TEXT_RESPONSE,
-                    content=text_content,
-                    display_title="Response",
-                    display_detail=text_content[:200] if text_content else "",
-                )
-                session.steps.append(step)
-                yield self._emit_event("text_response", {
-                    "content": text_content,
-                    "step": session._step_to_dict(step),
-                })
-                session.status = LoopStatus.COMPLETED
-                break
+                # Parse response for tool calls
+                tool_calls, text_content = self._parse_response(response)
             
-            # === ACT: Execute tool calls ===
-            step = AgentStep(
-                id=str(uuid.uuid4()),
-                step_type=StepType.TOOL_CALL,
-                content=None,
-                tool_calls=tool_calls,
-            )
+                # If no tool calls, the model is done - loop terminates
+                if not tool_calls:
+                    step = AgentStep(
+                        id=self._new_id("step"),
+                        step_type=StepType.TEXT_RESPONSE,
+                        content=text_content,
+                        display_title="Response",
+                        display_detail=text_content[:200] if text_content else "",
+                    )
+                    session.steps.append(step)
+                    yield self._emit_event("text_response", {
+                        "content": text_content,
+                        "step": session._step_to_dict(step),
+                    })
+                    session.status = LoopStatus.COMPLETED
+                    break
             
-            # Generate display title (like Claude Code's UI)
-            step.display_title = self._generate_step_title(tool_calls)
-            step.display_detail = self._generate_step_detail(tool_calls)
+                # === ACT: Execute tool calls ===
+                step = AgentStep(
+                    id=self._new_id("step"),
+                    step_type=StepType.TOOL_CALL,
+                    content=None,
+                    tool_calls=tool_calls,
+                )
             
-            yield self._emit_event("tool_calls_start", {
-                "step_id": step.id,
-                "display_title": step.display_title,
-                "tool_count": len(tool_calls),
-                "tools": [{"name": tc.tool_name, "description": tc.description} for tc in tool_calls],
-            })
+                # Generate display title (like Claude Code's UI)
+                step.display_title = self._generate_step_title(tool_calls)
+                step.display_detail = self._generate_step_detail(tool_calls)
             
-            # Execute each tool call
-            tool_results = []
-            for tc in tool_calls:
-                tc.status = "running"
-                tc.started_at = time.time()
-                
-                yield self._emit_event("tool_executing", {
-                    "tool_call_id": tc.id,
-                    "tool_name": tc.tool_name,
-                    "description": tc.description,
+                yield self._emit_event("tool_calls_start", {
+                    "step_id": step.id,
+                    "display_title": step.display_title,
+                    "tool_count": len(tool_calls),
+                    "tools": [{"name": tc.tool_name, "description": tc.description} for tc in tool_calls],
                 })
-                
-                try:
-                    result = await self.tool_registry.execute(
-                        tc.tool_name, tc.arguments
-                    )
-                    tc.result = result
-                    tc.status = "completed"
-                    tc.completed_at = time.time()
-                    
-                    # Track stats
-                    session.total_tool_calls += 1
-                    self._update_stats(session, tc)
-                    
-                    yield self._emit_event("tool_completed", {
-                        "tool_call_id": tc.id,
-                        "tool_name": tc.tool_name,
-                        "duration_ms": tc.duration_ms,
-                        "result_preview": self._preview_result(result),
-                    })
-                    
-                    tool_results.append({
-                        "tool_use_id": tc.id,
-                        "content": json.dumps(result) if isinstance(result, dict) else str(result),
-                    })
-                    
-                except Exception as e:
-                    tc.status = "failed"
-                    tc.error = str(e)
-                    tc.completed_at = time.time()
-                    
-                    yield self._emit_event("tool_error", {
-                        "tool_call_id": tc.id,
-                        "tool_name": tc.tool_name,
-                        "error": str(e),
-                    })
-                    
-                    tool_results.append({
-                        "tool_use_id": tc.id,
-                        "content": f"Error: {e}",
-                        "is_error": True,
-                    })
             
-            # Collect file changes from edit tools
-            step.files_changed = self._collect_file_changes(tool_calls)
-            session.steps.append(step)
+                # Execute tool calls; events are drained as they arrive so the
+                # stream stays live while independent calls run concurrently
+                pending_events: asyncio.Queue = asyncio.Queue()
+                exec_task = asyncio.create_task(
+                    self._execute_tool_calls(session, tool_calls, pending_events)
+                )
+                while True:
+                    next_event = asyncio.ensure_future(pending_events.get())
+                    done, _ = await asyncio.wait(
+                        {next_event, exec_task}, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    if next_event in done:
+                        yield next_event.result()
+                        continue
+                    next_event.cancel()
+                    break
+                while not pending_events.empty():
+                    yield pending_events.get_nowait()
+                tool_results = exec_task.result()
             
-            yield self._emit_event("step_completed", {
-                "step": session._step_to_dict(step),
-                "stats": session.to_dict()["stats"],
-            })
+                # Collect file changes from edit tools
+                step.files_changed = self._collect_file_changes(tool_calls)
+                session.steps.append(step)
             
-            # === OBSERVE: Feed results back to model ===
-            # Add assistant message with tool calls
-            messages.append({
-                "role": "assistant",
-                "content": response.get("content", []),
-            })
+                yield self._emit_event("step_completed", {
+                    "step": session._step_to_dict(step),
+                    "stats": session._stats_dict(),
+                })
             
-            # Add tool results
-            for tr in tool_results:
+                # === OBSERVE: Feed results back to model ===
+                # Add assistant message with tool calls
                 messages.append({
-                    "role": "user",
-                    "content": [{
-                        "type": "tool_result",
-                        "tool_use_id": tr["tool_use_id"],
-                        "content": tr["content"],
-                    }],
+                    "role": "assistant",
+                    # Own copy: the client may reuse its response list, and
+                    # history entries must not change once appended
+                    "content": list(response.get("content", ())),
                 })
             
-            # Context management: check if compaction needed
-            session.context_usage_pct = self.context_manager.get_usage_pct(messages)
-            if session.context_usage_pct > self.CONTEXT_COMPACT_THRESHOLD:
-                yield self._emit_event("context_compacting", {
-                    "usage_pct": session.context_usage_pct,
-                })
-                messages = await self.context_manager.compact(messages)
-                yield self._emit_event("context_compacted", {
-                    "new_usage_pct": self.context_manager.get_usage_pct(messages),
-                })
+                # Add tool results
+                for tr in tool_results:
+                    messages.append({
+                        "role": "user",
+                        "content": [{
+                            "type": "tool_result",
+                            "tool_use_id": tr["tool_use_id"],
+                            "content": tr["content"],
+                        }],
+                    })
+            
+                # Context management: compact old history in the background from
+                # the soft threshold; only block once the hard wall is reached
+                session.context_usage_pct = self.context_manager.get_usage_pct(messages)
+                if self._compact_task is not None and self._compact_task.done():
+                    messages = self._swap_in_compacted(session, messages)
+                    if self._last_compaction_ok:
+                        yield self._emit_event("context_compacted_bg", {
+                            "new_usage_pct": session.context_usage_pct,
+                        })
+            
+                if session.context_usage_pct <= self.CONTEXT_COMPACT_SOFT_THRESHOLD:
+                    self._compact_armed = True
+                elif self._compact_task is None and self._compact_armed:
+                    split = self._compaction_split(messages)
+                    if split > 0:
+                        self._compact_armed = False
+                        self._compact_split = split
+                        self._compact_task = asyncio.create_task(
+                            self.context_manager.compact(messages[:split])
+                        )
+                        yield self._emit_event("context_compacting_bg", {
+                            "usage_pct": session.context_usage_pct,
+                            "messages": split,
+                        })
+            
+                if session.context_usage_pct > self.CONTEXT_COMPACT_THRESHOLD:
+                    yield self._emit_event("context_compacting", {
+                        "usage_pct": session.context_usage_pct,
+                    })
+                    if self._compact_task is not None:
+                        await asyncio.wait({self._compact_task})
+                        messages = self._swap_in_compacted(session, messages)
+                    if session.context_usage_pct > self.CONTEXT_COMPACT_THRESHOLD:
+                        messages = await self.context_manager.compact(messages)
+                        session.context_usage_pct = self.context_manager.get_usage_pct(messages)
+                    yield self._emit_event("context_compacted", {
+                        "new_usage_pct": session.context_usage_pct,
+                    })
             
-            session.messages = messages
-            # === REPEAT: Continue the loop ===
+                session.messages = messages
+                # === REPEAT: Continue the loop ===
         
-        # Loop ended
-        if session.status == LoopStatus.RUNNING:
-            if iteration >= self.max_iterations:
-                session.status = LoopStatus.ERROR
-                session.error = f"Max iterations ({self.max_iterations}) reached"
-                yield self._emit_event("max_iterations", {"max": self.max_iterations})
-            else:
-                session.status = LoopStatus.COMPLETED
+            # Loop ended
+            if session.status == LoopStatus.RUNNING:
+                if iteration >= self.max_iterations:
+                    session.status = LoopStatus.ERROR
+                    session.error = f"Max iterations ({self.max_iterations}) reached"
+                    yield self._emit_event("max_iterations", {"max": self.max_iterations})
+                else:
+                    session.status = LoopStatus.COMPLETED
         
-        session.completed_at = time.time()
-        yield self._emit_event("session_complete", session.to_dict())
+            session.completed_at = time.time()
+            yield self._emit_event("session_complete", session.to_dict())
+    
+        finally:
+            running = [t for t in (exec_task, next_event) if t is not None and not t.done()]
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+            if self._compact_task is not None:
+                self._compact_task.cancel()
+                self._compact_task = None
     
     def interrupt(self):
         """Interrupt the current loop (like Ctrl+C in Claude Code)"""
-        self._interrupt_flag = True
+        self._interrupt_event.set()
     
     def pause(self):
         """Pause the loop and wait for approval"""
-        self._pause_flag = True
+        self._resume_event.clear()
     
     def resume(self):
         """Resume a paused loop"""
-        self._pause_flag = False
+        self._resume_event.set()
     
     # === Private helpers ===
     
+    async def _execute_tool_calls(
+        self,
+        session: LoopSession,
+        tool_calls: List[ToolCall],
+        events: asyncio.Queue,
+    ) -> List[Dict]:
+        """
+        Execute a turn's tool calls, returning results in call order.
+        
+        Consecutive read-only calls run concurrently; any call that may have
+        side effects runs alone, so writes are never reordered.
+        """
+        if not self.enable_parallel_tool_execution:
+            return [await self._execute_tool_call(session, tc, events) for tc in tool_calls]
+        
+        results: List[Dict] = []
+        batch: List[ToolCall] = []
+        for tc in tool_calls:
+            if self._categorize_tool(tc.tool_name) in PARALLEL_SAFE_CATEGORIES:
+                batch.append(tc)
+                continue
+            if batch:
+                results.extend(await asyncio.gather(
+                    *(self._execute_tool_call(session, b, events) for b in batch)
+                ))
+                batch = []
+            results.append(await self._execute_tool_call(session, tc, events))
+        if batch:
+            results.extend(await asyncio.gather(
+                *(self._execute_tool_call(session, b, events) for b in batch)
+            ))
+        return results
+    
+    async def _execute_tool_call(
+        self,
+        session: LoopSession,
+        tc: ToolCall,
+        events: asyncio.Queue,
+    ) -> Dict:
+        """Execute a single tool call, queueing its events; never raises"""
+        tc.status = "running"
+        tc.started_at = time.time()
+        
+        if self.emit_progress_events:
+            events.put_nowait(self._emit_event("tool_executing", {
+                "tool_call_id": tc.id,
+                "tool_name": tc.tool_name,
+                "description": tc.description,
+            }))
+        
+        try:
+            result = await self.tool_registry.execute(
+                tc.tool_name, tc.arguments
+            )
+            tc.result = result
+            tc.status = "completed"
+            tc.completed_at = time.time()
+            
+            # Track stats
+            session.total_tool_calls += 1
+            self._update_stats(session, tc)
+            
+            events.put_nowait(self._emit_event("tool_completed", {
+                "tool_call_id": tc.id,
+                "tool_name": tc.tool_name,
+                "duration_ms": tc.duration_ms,
+                "result_preview": self._preview_result(result),
+            }))
+            
+            return {
+                "tool_use_id": tc.id,
+                "content": _json_dumps(result).decode() if isinstance(result, dict) else str(result),
+            }
+            
+        except Exception as e:
+            tc.status = "failed"
+            tc.error = str(e)
+            tc.completed_at = time.time()
+            
+            events.put_nowait(self._emit_event("tool_error", {
+                "tool_call_id": tc.id,
+                "tool_name": tc.tool_name,
+                "error": str(e),
+            }))
+            
+            return {
+                "tool_use_id": tc.id,
+                "content": f"Error: {e}",
+                "is_error": True,
+            }
+    
     async def _call_llm(self, messages: List[Dict]) -> Dict:
         """Call the LLM with tool definitions"""
         if self.llm_client:
+            # The tool set is fixed for the lifetime of the loop
+            if self._tool_definitions is None:
+                self._tool_definitions = self.tool_registry.get_tool_definitions()
             return await self.llm_client.chat(
                 messages=messages,
-                tools=self.tool_registry.get_tool_definitions(),
+                tools=self._tool_definitions,
             )
         # Fallback: mock response for testing
         return {"content": [{"type": "text", "text": "Task completed."}]}
     
-    def _extract_tool_calls(self, response: Dict) -> List[ToolCall]:
-        """Extract tool calls from LLM response"""
+    def _compaction_split(self, messages: List[Dict]) -> int:
+        """
+        Index splitting history into a compactable prefix and a recent tail.
+        The split always lands on an assistant message, so a tool_use turn is
+        never separated from its tool results. Returns 0 if there is none.
+        """
+        for i in range(len(messages) - self.COMPACT_KEEP_RECENT, 0, -1):
+            if messages[i].get("role") == "assistant":
+                return i
+        return 0
+    
+    def _swap_in_compacted(self, session: LoopSession, messages: List[Dict]) -> List[Dict]:
+        """Replace the prefix with the finished background compaction result"""
+        task, self._compact_task = self._compact_task, None
+        self._last_compaction_ok = not task.cancelled() and task.exception() is None
+        if not self._last_compaction_ok:
+            return messages
+        messages = task.result() + messages[self._compact_split:]
+        session.context_usage_pct = self.context_manager.get_usage_pct(messages)
+        return messages
+    
+    def _new_id(self, prefix: str) -> str:
+        """Session-unique step/tool-call ID; a counter is far cheaper than uuid4"""
+        session = self._current_session
+        session.next_id += 1
+        return f"{prefix}_{session.session_id[:8]}_{session.next_id}"
+    
+    def _parse_response(self, response: Dict) -> Tuple[List[ToolCall], str]:
+        """Extract tool calls and joined text from an LLM response in one pass"""
         tool_calls = []
-        for block in response.get("content", []):
-            if block.get("type") == "tool_use":
+        texts = []
+        for block in response.get("content", ()):
+            block_type = block.get("type")
+            if block_type == "tool_use":
+                arguments = block.get("input", {})
                 tool_calls.append(ToolCall(
-                    id=block.get("id", str(uuid.uuid4())),
+                    id=block.get("id") or self._new_id("tc"),
                     tool_name=block["name"],
-                    arguments=block.get("input", {}),
-                    description=block.get("input", {}).get("description", ""),
+                    arguments=arguments,
+                    description=arguments.get("description", ""),
                 ))
-        return tool_calls
-    
-    def _extract_text(self, response: Dict) -> str:
-        """Extract text content from LLM response"""
-        texts = []
-        for block in response.get("content", []):
-            if block.get("type") == "text":
+            elif block_type == "text":
                 texts.append(block["text"])
-        return "\n".join(texts)
+        return tool_calls, "\n".join(texts)
     
     def _generate_step_title(self, tool_calls: List[ToolCall]) -> str:
         """
@@ -432,24 +758,12 @@ class AgentLoop:
         - "Ran a command, edited a file"
         - "Searched the web"
         """
-        actions = {}
-        for tc in tool_calls:
-            category = self._categorize_tool(tc.tool_name)
-            actions[category] = actions.get(category, 0) + 1
-        
-        parts = []
-        for category, count in actions.items():
-            if category == "command":
-                parts.append(f"Ran {count} command{'s' if count > 1 else ''}")
-            elif category == "view":
-                parts.append(f"Viewed {count} file{'s' if count > 1 else ''}")
-            elif category == "edit":
-                parts.append(f"edited {count} file{'s' if count > 1 else ''}")
-            elif category == "search":
-                parts.append("Searched the web")
-            elif category == "fetch":
-                parts.append(f"Fetched {count} page{'s' if count > 1 else ''}")
-        
+        counts = Counter(TOOL_CATEGORIES.get(tc.tool_name, "other") for tc in tool_calls)
+        parts = [
+            STEP_TITLE_TEMPLATES[category](count)
+            for category, count in counts.items()
+            if category in STEP_TITLE_TEMPLATES
+        ]
         return ", ".join(parts) if parts else "Processing"
     
     def _generate_step_detail(self, tool_calls: List[ToolCall]) -> str:
@@ -459,31 +773,12 @@ class AgentLoop:
             if tc.description:
                 details.append(tc.description)
             else:
-                details.append(f"{tc.tool_name}: {json.dumps(tc.arguments)[:100]}")
+                details.append(f"{tc.tool_name}: {_preview(tc.arguments)}")
         return "\n".join(details)
     
     def _categorize_tool(self, tool_name: str) -> str:
         """Categorize tools for display grouping"""
-        categories = {
-            "bash": "command",
-            "run_command": "command",
-            "execute_script": "command",
-            "view_file": "view",
-            "read_file": "view",
-            "view_truncated": "view",
-            "glob": "view",
-            "grep": "view",
-            "ls": "view",
-            "edit_file": "edit",
-            "write_file": "edit",
-            "multi_edit": "edit",
-            "str_replace": "edit",
-            "web_search": "search",
-            "web_fetch": "fetch",
-            "todo_read": "todo",
-            "todo_write": "todo",
-        }
-        return categories.get(tool_name, "other")
+        return TOOL_CATEGORIES.get(tool_name, "other")
     
     def _update_stats(self, session: LoopSession, tc: ToolCall):
         """Update session statistics based on tool call"""
@@ -514,19 +809,20 @@ class AgentLoop:
     def _preview_result(self, result: Any, max_len: int = 500) -> str:
         """Create a preview of tool result for streaming"""
         if isinstance(result, dict):
-            text = json.dumps(result, ensure_ascii=False)
+            text = _json_dumps(result).decode()
         else:
             text = str(result)
         return text[:max_len] + ("..." if len(text) > max_len else "")
     
-    def _emit_event(self, event_type: str, data: Dict) -> Dict:
+    def _emit_event(self, event_type: str, data: Dict) -> SSEEvent:
         """Create a standardized event for SSE streaming"""
-        event = {
-            "type": event_type,
-            "data": data,
-            "timestamp": time.time(),
-            "session_id": self._current_session.session_id if self._current_session else None,
-        }
+        event = SSEEvent(
+            type=event_type,
+            data=data,
+            timestamp=time.time(),
+            session_id=self._current_session.session_id if self._current_session else None,
+        )
+        event._tail = self._frame_tail
         # Also push to event queue for other listeners
         self.event_queue.push(event)
         return event
@@ -12,9 +12,14 @@ Features #6-7, #10-11 from requirements:
 
 import asyncio
 import os
+import re
+import signal
 import time
 import shlex
-from typing import Any, Dict, List, Optional
+import uuid
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
 
 
 # Commands that require approval (high risk)
@@ -32,6 +37,325 @@ SAFE_COMMANDS = [
     "python --version", "node --version", "npm --version",
 ]
 
+# Single-pass matchers for the lists above
+_HIGH_RISK_RE = re.compile("|".join(re.escape(p) for p in HIGH_RISK_PATTERNS))
+_SAFE_COMMAND_RE = re.compile(r"(?:" + "|".join(re.escape(c) for c in SAFE_COMMANDS) + r")\b")
+
+
+# Environment for every spawned shell/interpreter, built once at import
+_BASE_ENV = {**os.environ, "TERM": "dumb"}
+
+# Max bytes of stdout/stderr kept per command; the rest is discarded
+MAX_OUTPUT = 50000
+
+
+class CommandOutcome(NamedTuple):
+    """Captured result of a finished command"""
+    exit_code: int
+    stdout: bytes
+    stderr: bytes
+    stdout_total: int
+    stderr_total: int
+
+
+class PersistentShell:
+    """
+    A long-lived bash process owned by one agent session.
+    
+    Each command runs in a subshell of it, which costs a fork instead of
+    fork + exec + shell startup. The subshell keeps per-command semantics:
+    `cd`, exports and `exit` do not carry over to the next command, and
+    every command starts in the working_dir it was given. Before exiting,
+    the subshell waits for the background jobs it started, just as the
+    one-shot path waits for its pipes to close.
+    The end of each command is detected by a random marker that the
+    shell prints on both stdout and stderr after the command finishes.
+    
+    Limitation: a process that detaches itself from the subshell (setsid,
+    disown) is not waited for. It keeps the shell's stdout/stderr open, so
+    anything it prints later shows up in a later command's output.
+    """
+    
+    def __init__(self):
+        self._process: Optional[asyncio.subprocess.Process] = None
+        self._lock = asyncio.Lock()
+    
+    async def run(
+        self, command: str, timeout: float, working_dir: Optional[str] = None
+    ) -> Optional[CommandOutcome]:
+        """Run a command; returns None on timeout"""
+        async with self._lock:
+            if self._process is None or self._process.returncode is not None:
+                self._process = await asyncio.create_subprocess_exec(
+                    "bash", "--noprofile", "--norc",
+                    stdin=asyncio.subprocess.PIPE,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                    env=_BASE_ENV,
+                    start_new_session=True,
+                )
+            process = self._process
+            
+            # eval keeps syntax errors (e.g. unbalanced quotes) inside this
+            # command; /dev/null stops it from consuming the shell's own stdin;
+            # the EXIT trap also runs when the command calls `exit` itself
+            cd = b""
+            if working_dir:
+                cd = b"cd " + shlex.quote(working_dir).encode() + b" || exit 1; "
+            marker = f"__SKYNET_END_{uuid.uuid4().hex}__".encode()
+            process.stdin.write(
+                b"( " + cd + b"trap wait EXIT; eval " + shlex.quote(command).encode()
+                + b" ) </dev/null; "
+                b"printf '\\n%s %s\\n' " + marker + b' "$?"; '
+                b"printf '\\n%s\\n' " + marker + b" >&2\n"
+            )
+            try:
+                await process.stdin.drain()
+            except ConnectionResetError:
+                pass  # shell already gone; the reads below see EOF
+            
+            reader = asyncio.create_task(_read_both_until_marker(process, marker))
+            done, _ = await asyncio.wait({reader}, timeout=timeout)
+            if not done:
+                reader.cancel()
+                self._kill()
+                return None
+            
+            (stdout, stdout_total, status), (stderr, stderr_total, _) = reader.result()
+            if status is None:
+                # The command killed the shell itself (e.g. `kill $$`)
+                self._process = None
+                returncode = await process.wait()
+            else:
+                returncode = int(status)
+            return CommandOutcome(returncode, stdout, stderr, stdout_total, stderr_total)
+    
+    def _kill(self):
+        """Kill the shell and anything it started; the next run respawns it"""
+        if self._process is not None and self._process.returncode is None:
+            _kill_process_group(self._process)
+        self._process = None
+    
+    close = _kill
+
+
+# Agent session whose persistent shell bash() should use. Set by the server
+# around an agent run; when unset (e.g. /api/command/run) every command
+# runs in its own one-off shell.
+shell_session: ContextVar[Optional[str]] = ContextVar("shell_session", default=None)
+
+# Persistent shells by session id, least recently used first
+_SHELLS: "OrderedDict[str, PersistentShell]" = OrderedDict()
+MAX_SHELLS = 32
+
+
+def _get_shell(session_id: str) -> PersistentShell:
+    shell = _SHELLS.get(session_id)
+    if shell is None:
+        shell = _SHELLS[session_id] = PersistentShell()
+        while len(_SHELLS) > MAX_SHELLS:
+            _, evicted = _SHELLS.popitem(last=False)
+            evicted.close()
+    _SHELLS.move_to_end(session_id)
+    return shell
+
+
+def close_shell(session_id: str) -> None:
+    """Kill a session's persistent shell (call when the session ends)"""
+    shell = _SHELLS.pop(session_id, None)
+    if shell is not None:
+        shell.close()
+
+
+def close_all_shells() -> None:
+    """Kill every persistent shell (call on shutdown)"""
+    while _SHELLS:
+        _, shell = _SHELLS.popitem(last=False)
+        shell.close()
+
+
+async def _read_until_marker(
+    stream: asyncio.StreamReader, marker: bytes
+) -> Tuple[bytes, int, Optional[bytes]]:
+    """
+    Read until a line starting with `marker`. Returns the first MAX_OUTPUT
+    bytes of output before it, the total output size, and the rest of the
+    marker line (None on EOF). Output past the cap is discarded as it
+    arrives, so memory stays bounded however much the command prints.
+    """
+    token = b"\n" + marker
+    buf = bytearray()
+    dropped = 0
+    search_from = 0
+    while True:
+        idx = buf.find(token, search_from)
+        if idx != -1:
+            line_end = buf.find(b"\n", idx + len(token))
+            if line_end != -1:
+                return (
+                    bytes(buf[:min(idx, MAX_OUTPUT)]),
+                    idx + dropped,
+                    bytes(buf[idx + len(token):line_end]).strip(),
+                )
+        else:
+            # Keep the first MAX_OUTPUT bytes plus a tail long enough to
+            # hold a marker split across reads
+            excess = len(buf) - len(token) - MAX_OUTPUT
+            if excess > 0:
+                del buf[MAX_OUTPUT:MAX_OUTPUT + excess]
+                dropped += excess
+            search_from = max(MAX_OUTPUT if dropped else 0, len(buf) - len(token))
+        chunk = await stream.read(65536)
+        if not chunk:
+            return bytes(buf[:MAX_OUTPUT]), len(buf) + dropped, None
+        buf.extend(chunk)
+
+
+async def _read_both_until_marker(process: asyncio.subprocess.Process, marker: bytes):
+    # Both pipes are drained together so a chatty stderr cannot block stdout
+    return await asyncio.gather(
+        _read_until_marker(process.stdout, marker),
+        _read_until_marker(process.stderr, marker),
+    )
+
+
+async def _drain(stream: asyncio.StreamReader) -> Tuple[bytes, int]:
+    """Read a stream to EOF, keeping only the first MAX_OUTPUT bytes"""
+    buf = bytearray()
+    total = 0
+    while True:
+        chunk = await stream.read(65536)
+        if not chunk:
+            return bytes(buf), total
+        total += len(chunk)
+        room = MAX_OUTPUT - len(buf)
+        if room > 0:
+            buf.extend(chunk[:room])
+
+
+async def _collect(process: asyncio.subprocess.Process) -> CommandOutcome:
+    """Drain stdout/stderr with a size cap and wait for exit"""
+    (stdout, stdout_total), (stderr, stderr_total), returncode = await asyncio.gather(
+        _drain(process.stdout), _drain(process.stderr), process.wait()
+    )
+    return CommandOutcome(returncode, stdout, stderr, stdout_total, stderr_total)
+
+
+async def _collect_with_timeout(
+    process: asyncio.subprocess.Process, timeout: float
+) -> Optional[CommandOutcome]:
+    """
+    _collect() with a deadline; on timeout the process is killed and None
+    returned. asyncio.wait reports the timeout through its return value,
+    so no TimeoutError is raised and unwound on this path.
+    """
+    collector = asyncio.create_task(_collect(process))
+    done, _ = await asyncio.wait({collector}, timeout=timeout)
+    if done:
+        return collector.result()
+    _kill_process_group(process)
+    collector.cancel()
+    await process.wait()
+    return None
+
+
+def _kill_process_group(process: asyncio.subprocess.Process):
+    """Kill a process started with start_new_session=True and all its children"""
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+async def _run_oneshot(
+    command: str, timeout: float, working_dir: Optional[str]
+) -> Optional[CommandOutcome]:
+    """
+    Run a command in its own bash; returns None on timeout. bash rather than
+    /bin/sh, so a command means the same thing here as in a persistent shell.
+    """
+    process = await asyncio.create_subprocess_exec(
+        "bash", "--noprofile", "--norc", "-c", command,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        cwd=working_dir,
+        env=_BASE_ENV,
+        start_new_session=True,
+    )
+    
+    return await _collect_with_timeout(process, timeout)
+
+
+def _utf8_boundary(data: bytes) -> int:
+    """
+    Length of the longest prefix of `data` that does not end inside a
+    UTF-8 sequence. Only the last few bytes are inspected.
+    """
+    end = len(data)
+    i = end - 1
+    # Skip back over at most 3 continuation bytes (10xxxxxx)
+    while i >= 0 and end - i <= 3 and data[i] & 0xC0 == 0x80:
+        i -= 1
+    if i < 0:
+        return end
+    lead = data[i]
+    if lead >= 0xF0:
+        width = 4
+    elif lead >= 0xE0:
+        width = 3
+    elif lead >= 0xC0:
+        width = 2
+    else:
+        return end
+    return end if end - i >= width else i
+
+
+def _command_result(
+    command: str,
+    outcome: Optional[CommandOutcome],
+    timeout: float,
+    risk_level: str,
+    description: str,
+) -> Dict[str, Any]:
+    """Build the tool result dict from a command outcome"""
+    if outcome is None:
+        return {
+            "success": False,
+            "exit_code": -1,
+            "stdout": "",
+            "stderr": f"Command timed out after {timeout}s",
+            "command": command,
+            "error": "timeout",
+        }
+    returncode = outcome.exit_code
+    
+    stdout = outcome.stdout
+    stderr = outcome.stderr
+    # A capped stream may end mid-character; cut back to a whole one
+    if outcome.stdout_total > len(stdout):
+        stdout = stdout[:_utf8_boundary(stdout)]
+    if outcome.stderr_total > len(stderr):
+        stderr = stderr[:_utf8_boundary(stderr)]
+    
+    stdout_str = stdout.decode("utf-8", errors="replace")
+    stderr_str = stderr.decode("utf-8", errors="replace")
+    
+    # Output beyond MAX_OUTPUT bytes was never kept
+    if outcome.stdout_total > MAX_OUTPUT:
+        stdout_str += f"\n... [output truncated, {outcome.stdout_total} total bytes]"
+    if outcome.stderr_total > MAX_OUTPUT:
+        stderr_str += f"\n... [stderr truncated, {outcome.stderr_total} total bytes]"
+    
+    return {
+        "success": returncode == 0,
+        "exit_code": returncode,
+        "stdout": stdout_str,
+        "stderr": stderr_str,
+        "command": command,
+        "risk_level": risk_level,
+        "display_title": description or _generate_command_title(command),
+    }
+
 
 async def bash(
     command: str,
@@ -43,60 +367,34 @@ async def bash(
     Execute a shell command.
     
     Like Claude Code's Bash tool:
-    - Persistent session (uses working_dir)
+    - Reuses the agent session's shell when shell_session is set
+      (each command still runs in a fresh subshell), else a one-off shell
     - Timeout protection
-    - Risk assessment
+    - Risk assessment (high-risk commands run in an isolated one-off shell)
     - Output capture (stdout + stderr)
     """
+    return await _run_command(command, timeout, working_dir, description)
+
+
+async def _run_command(
+    command: str,
+    timeout: float,
+    working_dir: Optional[str],
+    description: str,
+    persistent: bool = True,
+) -> Dict[str, Any]:
+    """bash() body; persistent=False runs in a one-off shell (safe to run concurrently)"""
     # Risk assessment
     risk_level = _assess_risk(command)
+    session_id = shell_session.get() if persistent else None
     
     try:
-        process = await asyncio.create_subprocess_shell(
-            command,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-            cwd=working_dir,
-            env={**os.environ, "TERM": "dumb"},
-        )
-        
-        try:
-            stdout, stderr = await asyncio.wait_for(
-                process.communicate(), timeout=timeout
-            )
-        except asyncio.TimeoutError:
-            process.kill()
-            return {
-                "success": False,
-                "exit_code": -1,
-                "stdout": "",
-                "stderr": f"Command timed out after {timeout}s",
-                "command": command,
-                "error": "timeout",
-            }
-        
-        stdout_str = stdout.decode("utf-8", errors="replace")
-        stderr_str = stderr.decode("utf-8", errors="replace")
-        
-        # Truncate very long output
-        MAX_OUTPUT = 50000
-        stdout_truncated = len(stdout_str) > MAX_OUTPUT
-        stderr_truncated = len(stderr_str) > MAX_OUTPUT
+        if risk_level == "high" or session_id is None:
+            outcome = await _run_oneshot(command, timeout, working_dir)
+        else:
+            outcome = await _get_shell(session_id).run(command, timeout, working_dir)
         
-        if stdout_truncated:
-            stdout_str = stdout_str[:MAX_OUTPUT] + f"\n... [output truncated, {len(stdout_str)} total chars]"
-        if stderr_truncated:
-            stderr_str = stderr_str[:MAX_OUTPUT] + f"\n... [stderr truncated, {len(stderr_str)} total chars]"
-        
-        return {
-            "success": process.returncode == 0,
-            "exit_code": process.returncode,
-            "stdout": stdout_str,
-            "stderr": stderr_str,
-            "command": command,
-            "risk_level": risk_level,
-            "display_title": description or _generate_command_title(command),
-        }
+        return _command_result(command, outcome, timeout, risk_level, description)
         
     except Exception as e:
         return {
@@ -120,48 +418,50 @@ async def run_script(
     Run a multi-line script.
     
     Used for Feature #6: "Ran 7 commands" with expandable Script display.
-    Creates a temp script file, executes it, cleans up.
+    The script is handed straight to the interpreter (no temp file):
+    bash gets it via -c, python/node read it from stdin.
     """
-    import tempfile
-    
-    # Determine file extension and shebang
-    ext_map = {"bash": ".sh", "python": ".py", "node": ".js"}
-    shebang_map = {
-        "bash": "#!/bin/bash\nset -e\n",
-        "python": "#!/usr/bin/env python3\n",
-        "node": "#!/usr/bin/env node\n",
-    }
-    
-    ext = ext_map.get(interpreter, ".sh")
-    shebang = shebang_map.get(interpreter, "#!/bin/bash\n")
+    if interpreter in ("bash", "sh"):
+        # Passed as an argument so commands in the script can't read the
+        # rest of the script from stdin
+        argv = [interpreter, "-c", "set -e\n" + script]
+        stdin_data = None
+    else:
+        argv = [interpreter, "-"]
+        stdin_data = script.encode()
     
     try:
-        with tempfile.NamedTemporaryFile(
-            mode="w", suffix=ext, delete=False, dir=working_dir or "/tmp"
-        ) as f:
-            f.write(shebang + script)
-            script_path = f.name
-        
-        os.chmod(script_path, 0o755)
-        
-        result = await bash(
-            command=f"{interpreter} {script_path}",
-            timeout=timeout,
-            working_dir=working_dir,
-            description=description,
+        process = await asyncio.create_subprocess_exec(
+            *argv,
+            stdin=asyncio.subprocess.PIPE if stdin_data is not None else asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=working_dir,
+            env=_BASE_ENV,
+            start_new_session=True,
         )
-        
-        result["script"] = script
-        result["interpreter"] = interpreter
-        result["display_title"] = description or "Script"
-        
-        return result
-        
-    finally:
-        try:
-            os.unlink(script_path)
-        except OSError:
-            pass
+        if stdin_data is not None:
+            process.stdin.write(stdin_data)
+            process.stdin.close()
+        outcome = await _collect_with_timeout(process, timeout)
+        result = _command_result(
+            f"{interpreter} <script>", outcome, timeout, "medium", description
+        )
+    except Exception as e:
+        result = {
+            "success": False,
+            "exit_code": -1,
+            "stdout": "",
+            "stderr": str(e),
+            "command": f"{interpreter} <script>",
+            "error": str(e),
+        }
+    
+    result["script"] = script
+    result["interpreter"] = interpreter
+    result["display_title"] = description or "Script"
+    
+    return result
 
 
 async def batch_commands(
@@ -169,9 +469,11 @@ async def batch_commands(
     working_dir: Optional[str] = None,
     stop_on_error: bool = True,
     description: str = "",
+    parallel: bool = False,
+    max_concurrency: int = 4,
 ) -> Dict[str, Any]:
     """
-    Run multiple commands in sequence.
+    Run multiple commands (in sequence unless parallel is set).
     
     Implements Feature #6-7: "Ran 7 commands" / "Ran 3 commands"
     Each command has a description and the result shows success/failure for each.
@@ -179,24 +481,44 @@ async def batch_commands(
     Args:
         commands: List of {"command": "...", "description": "..."}
         stop_on_error: If True, stop on first failure
+        parallel: Run independent commands concurrently, each in its own shell
+            (ignored when stop_on_error is set, which needs ordering)
+        max_concurrency: Max commands in flight when parallel
     """
+    if parallel and not stop_on_error:
+        sem = asyncio.Semaphore(max(1, max_concurrency))
+        
+        async def _one(cmd_info: Dict[str, str]) -> Dict[str, Any]:
+            async with sem:
+                return await _run_command(
+                    cmd_info.get("command", ""),
+                    120,
+                    working_dir,
+                    cmd_info.get("description", ""),
+                    persistent=False,
+                )
+        
+        raw_results = await asyncio.gather(*(_one(c) for c in commands))
+    else:
+        raw_results = []
+        for cmd_info in commands:
+            result = await bash(
+                command=cmd_info.get("command", ""),
+                working_dir=working_dir,
+                description=cmd_info.get("description", ""),
+            )
+            raw_results.append(result)
+            if stop_on_error and not result["success"]:
+                break
+    
     results = []
     total_success = 0
     total_failed = 0
     
-    for cmd_info in commands:
-        command = cmd_info.get("command", "")
-        cmd_desc = cmd_info.get("description", "")
-        
-        result = await bash(
-            command=command,
-            working_dir=working_dir,
-            description=cmd_desc,
-        )
-        
+    for cmd_info, result in zip(commands, raw_results):
         results.append({
-            "command": command,
-            "description": cmd_desc,
+            "command": cmd_info.get("command", ""),
+            "description": cmd_info.get("description", ""),
             "success": result["success"],
             "exit_code": result["exit_code"],
             "stdout_preview": result["stdout"][:500] if result["stdout"] else "",
@@ -207,8 +529,6 @@ async def batch_commands(
             total_success += 1
         else:
             total_failed += 1
-            if stop_on_error:
-                break
     
     return {
         "success": total_failed == 0,
@@ -225,13 +545,11 @@ def _assess_risk(command: str) -> str:
     """Assess risk level of a command"""
     cmd_lower = command.lower().strip()
     
-    for pattern in HIGH_RISK_PATTERNS:
-        if pattern in cmd_lower:
-            return "high"
+    if _HIGH_RISK_RE.search(cmd_lower):
+        return "high"
     
-    for safe in SAFE_COMMANDS:
-        if cmd_lower.startswith(safe):
-            return "low"
+    if _SAFE_COMMAND_RE.match(cmd_lower):
+        return "low"
     
     return "medium"
 
@@ -300,6 +618,8 @@ COMMAND_TOOL_DEFINITIONS = [
                 },
                 "working_dir": {"type": "string"},
                 "stop_on_error": {"type": "boolean"},
+                "parallel": {"type": "boolean", "description": "Run independent commands concurrently (requires stop_on_error=false)"},
+                "max_concurrency": {"type": "integer", "description": "Max concurrent commands when parallel (default: 4)"},
                 "description": {"type": "string"},
             },
             "required": ["commands"],
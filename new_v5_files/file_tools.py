@@ -10,9 +10,137 @@ Implements Claude Code's file operation tools:
 - view_files: Batch view multiple files (Feature #3)
 """
 
+import asyncio
+import io
 import os
 import difflib
-from typing import Any, Dict, List, Optional, Tuple
+import itertools
+import re
+import stat
+import tempfile
+import threading
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+# Auto-truncation for large files (like Claude Code does)
+MAX_LINES = 500
+HEAD_TAIL_LINES = 200
+COUNT_CHUNK_SIZE = 1 << 20
+TAIL_BLOCK_SIZE = 64 * 1024
+
+DIFF_CONTEXT_LINES = 3  # difflib.unified_diff's default n
+# Line boundaries str.splitlines() honours besides "\n" and "\r\n"
+_OTHER_LINE_BREAK_RE = re.compile("\r(?!\n)|[\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]")
+
+VIEW_FILES_CONCURRENCY = 32
+PREVIEW_CHARS = 500
+
+# read_file result cache, keyed by file identity + requested range
+READ_CACHE_SIZE = 128
+READ_CACHE_MAX_CONTENT = 4 * 1024 * 1024  # characters
+_READ_CACHE: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+_READ_CACHE_LOCK = threading.Lock()  # reads run on the thread pool
+
+# Process umask, applied to files created through a temp file
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def _open_text(path: str):
+    return open(path, "r", encoding="utf-8", errors="replace")
+
+
+def _count_lines(path: str) -> int:
+    """
+    Count a file's lines on raw bytes, as text-mode iteration would split them.
+    
+    No decoding happens: "\n", "\r\n" and a lone "\r" each end a line
+    (universal newlines), and UTF-8 never uses those bytes inside a character.
+    """
+    count = 0
+    prev_cr = False
+    last = b"\n"
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(COUNT_CHUNK_SIZE)
+            if not chunk:
+                break
+            if prev_cr and chunk[:1] == b"\n":
+                count -= 1  # "\r\n" split across chunks was counted twice
+            count += chunk.count(b"\n")
+            carriage_returns = chunk.count(b"\r")
+            if carriage_returns:
+                count += carriage_returns - chunk.count(b"\r\n")
+            prev_cr = chunk[-1:] == b"\r"
+            last = chunk[-1:]
+    return count + (last not in (b"\n", b"\r"))
+
+
+def _read_line_range(path: str, start: int, stop: Optional[int]) -> Tuple[List[str], int]:
+    """
+    Return lines [start, stop) and the file's total line count.
+    
+    Only the first `stop` lines are materialized; the total comes from a
+    byte-level newline count.
+    """
+    with _open_text(path) as f:
+        lines = list(itertools.islice(f, stop))
+        if stop is None or len(lines) < stop:
+            return lines[start:], len(lines)
+    return lines[start:], _count_lines(path)
+
+
+def _read_tail(path: str, n: int) -> List[str]:
+    """Return the last n lines, reading backwards from the end of the file."""
+    size = os.path.getsize(path)
+    block = max(TAIL_BLOCK_SIZE, n * 128)
+    with open(path, "rb") as f:
+        while True:
+            offset = max(0, size - block)
+            f.seek(offset)
+            text = f.read().decode("utf-8", errors="replace")
+            lines = io.StringIO(text, newline=None).readlines()
+            if offset > 0:
+                lines = lines[1:]  # partial first line
+            if len(lines) >= n or offset == 0:
+                return lines[-n:] if n else []
+            block *= 4
+
+
+def _atomic_write(path: str, data: bytes, create_dirs: bool = False) -> None:
+    """
+    Replace a file's contents via a temp file + rename.
+    
+    Readers (and a crash mid-write) never observe a truncated file. The
+    parent directory is only created when the temp file can't be made,
+    and existing permissions are carried over to the new inode.
+    """
+    target = os.path.realpath(path)
+    directory = os.path.dirname(target)
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+    except FileNotFoundError:
+        if not create_dirs:
+            raise
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+    
+    try:
+        try:
+            mode = stat.S_IMODE(os.stat(target).st_mode)
+        except FileNotFoundError:
+            mode = 0o666 & ~_UMASK
+        os.fchmod(fd, mode)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, target)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
 
 
 async def read_file(
@@ -24,42 +152,75 @@ async def read_file(
     """
     Read a file's contents, optionally a specific line range.
     
+    The blocking I/O runs on the default thread pool so concurrent reads
+    overlap instead of stalling the event loop.
+    
     Returns:
         dict with content, total_lines, truncated info
     """
-    if not os.path.exists(path):
+    return await asyncio.to_thread(_read_file_sync, path, start_line, end_line)
+
+
+def _read_file_sync(
+    path: str,
+    start_line: Optional[int],
+    end_line: Optional[int],
+) -> Dict[str, Any]:
+    try:
+        st = os.stat(path)
+    except OSError:
         return {"error": f"File not found: {path}", "success": False}
     
-    try:
-        with open(path, "r", encoding="utf-8", errors="replace") as f:
-            lines = f.readlines()
-    except Exception as e:
-        return {"error": str(e), "success": False}
+    # Writes here go through a rename, so an edited file always gets a new
+    # inode; mtime/size catch in-place edits made by other processes.
+    cache_key = (path, st.st_ino, st.st_mtime_ns, st.st_size, start_line, end_line)
+    with _READ_CACHE_LOCK:
+        cached = _READ_CACHE.get(cache_key)
+        if cached is not None:
+            _READ_CACHE.move_to_end(cache_key)
+    if cached is not None:
+        return dict(cached)
     
-    total_lines = len(lines)
+    result = _read_file_uncached(path, start_line, end_line)
     
-    if start_line is not None or end_line is not None:
-        start = (start_line or 1) - 1  # Convert to 0-indexed
-        end = end_line or total_lines
-        selected_lines = lines[start:end]
-        content = "".join(selected_lines)
-        is_truncated = start > 0 or end < total_lines
-    else:
-        # Auto-truncate large files (like Claude Code does)
-        MAX_LINES = 500
-        if total_lines > MAX_LINES:
-            # Show first 200 and last 200 lines
-            head = lines[:200]
-            tail = lines[-200:]
-            content = (
-                "".join(head) + 
-                f"\n... [{total_lines - 400} lines truncated] ...\n" +
-                "".join(tail)
-            )
-            is_truncated = True
+    # Only cache successful reads of moderate size to bound memory
+    if result["success"] and len(result["content"]) <= READ_CACHE_MAX_CONTENT:
+        with _READ_CACHE_LOCK:
+            _READ_CACHE[cache_key] = result
+            if len(_READ_CACHE) > READ_CACHE_SIZE:
+                _READ_CACHE.popitem(last=False)
+        return dict(result)
+    return result
+
+
+def _read_file_uncached(
+    path: str,
+    start_line: Optional[int],
+    end_line: Optional[int],
+) -> Dict[str, Any]:
+    try:
+        if start_line is not None or end_line is not None:
+            start = max(0, (start_line or 1) - 1)  # Convert to 0-indexed
+            stop = max(start, end_line) if end_line is not None else None
+            selected_lines, total_lines = _read_line_range(path, start, stop)
+            content = "".join(selected_lines)
+            is_truncated = start > 0 or (stop is not None and stop < total_lines)
         else:
-            content = "".join(lines)
-            is_truncated = False
+            head, total_lines = _read_line_range(path, 0, MAX_LINES + 1)
+            if total_lines > MAX_LINES:
+                # Show first 200 and last 200 lines
+                tail = _read_tail(path, HEAD_TAIL_LINES)
+                content = (
+                    "".join(head[:HEAD_TAIL_LINES]) + 
+                    f"\n... [{total_lines - 2 * HEAD_TAIL_LINES} lines truncated] ...\n" +
+                    "".join(tail)
+                )
+                is_truncated = True
+            else:
+                content = "".join(head)
+                is_truncated = False
+    except Exception as e:
+        return {"error": str(e), "success": False}
     
     return {
         "success": True,
@@ -89,32 +250,30 @@ async def view_truncated(
         return {"error": f"File not found: {path}", "success": False}
     
     try:
-        with open(path, "r", encoding="utf-8", errors="replace") as f:
-            lines = f.readlines()
+        if section in ("middle", "end"):
+            total_lines = _count_lines(path)
+            if section == "end":
+                start, end = max(0, total_lines - 200), total_lines
+                selected = _read_tail(path, end - start)
+            else:
+                mid = total_lines // 2
+                start = max(0, mid - 100)
+                end = min(total_lines, mid + 100)
+                selected, _ = _read_line_range(path, start, end)
+        else:
+            start, end = 0, 200
+            if "-" in section:
+                try:
+                    parts = section.split("-")
+                    start = max(0, int(parts[0]) - 1)
+                    end = max(start, int(parts[1]))
+                except (ValueError, IndexError):
+                    start, end = 0, 200
+            selected, total_lines = _read_line_range(path, start, end)
+            end = min(end, total_lines)
     except Exception as e:
         return {"error": str(e), "success": False}
     
-    total_lines = len(lines)
-    
-    if section == "start":
-        start, end = 0, min(200, total_lines)
-    elif section == "end":
-        start, end = max(0, total_lines - 200), total_lines
-    elif section == "middle":
-        mid = total_lines // 2
-        start = max(0, mid - 100)
-        end = min(total_lines, mid + 100)
-    elif "-" in section:
-        try:
-            parts = section.split("-")
-            start = int(parts[0]) - 1
-            end = int(parts[1])
-        except (ValueError, IndexError):
-            start, end = 0, min(200, total_lines)
-    else:
-        start, end = 0, min(200, total_lines)
-    
-    selected = lines[start:end]
     content = "".join(selected)
     
     return {
@@ -127,6 +286,45 @@ async def view_truncated(
     }
 
 
+def _preview_file(path: str) -> Dict[str, Any]:
+    """
+    Summarize one file for view_files without reading it into memory.
+    
+    The preview is the first PREVIEW_CHARS characters of what read_file would
+    return; the line count comes from a byte-level scan.
+    """
+    if not os.path.exists(path):
+        error = f"File not found: {path}"
+    else:
+        try:
+            with _open_text(path) as f:
+                preview = f.read(PREVIEW_CHARS)
+            total_lines = _count_lines(path)
+        except Exception as e:
+            error = str(e)
+        else:
+            is_truncated = total_lines > MAX_LINES
+            if is_truncated and preview.count("\n") >= HEAD_TAIL_LINES:
+                # The head ends inside the preview, so the truncation marker
+                # and tail show up in it too; build it the same way read_file does
+                preview = _read_file_uncached(path, None, None).get("content", "")[:PREVIEW_CHARS]
+            return {
+                "path": path,
+                "success": True,
+                "total_lines": total_lines,
+                "is_truncated": is_truncated,
+                "preview": preview,
+            }
+    
+    return {
+        "path": path,
+        "success": False,
+        "total_lines": 0,
+        "is_truncated": False,
+        "preview": error,
+    }
+
+
 async def view_files(
     paths: List[str],
     description: str = "",
@@ -137,16 +335,14 @@ async def view_files(
     
     Returns summary of all viewed files.
     """
-    results = []
-    for path in paths:
-        result = await read_file(path=path)
-        results.append({
-            "path": path,
-            "success": result["success"],
-            "total_lines": result.get("total_lines", 0),
-            "is_truncated": result.get("is_truncated", False),
-            "preview": result.get("content", "")[:500] if result["success"] else result.get("error", ""),
-        })
+    # Bound the reads in flight so "view all *.py" can't exhaust file descriptors
+    semaphore = asyncio.Semaphore(VIEW_FILES_CONCURRENCY)
+    
+    async def preview_one(path: str) -> Dict[str, Any]:
+        async with semaphore:
+            return await asyncio.to_thread(_preview_file, path)
+    
+    results = await asyncio.gather(*(preview_one(path) for path in paths))
     
     return {
         "success": True,
@@ -163,11 +359,11 @@ async def write_file(
 ) -> Dict[str, Any]:
     """Write content to a new file"""
     try:
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        with open(path, "w", encoding="utf-8") as f:
-            f.write(content)
+        # Encode once: the same bytes are written and scanned for newlines
+        data = content.encode("utf-8")
+        _atomic_write(path, data, create_dirs=True)
         
-        line_count = content.count("\n") + (1 if content and not content.endswith("\n") else 0)
+        line_count = data.count(b"\n") + (1 if data and not data.endswith(b"\n") else 0)
         
         return {
             "success": True,
@@ -182,6 +378,140 @@ async def write_file(
         return {"error": str(e), "success": False}
 
 
+def _replacement_diff(
+    original: str,
+    updated: str,
+    index: int,
+    old_len: int,
+    new_len: int,
+    name: str,
+) -> Iterator[str]:
+    """
+    Unified diff for a single replacement at `index`.
+    
+    Yields exactly what difflib.unified_diff gives for the whole file, but
+    difflib's matcher only runs over the changed lines plus enough unchanged
+    lines on each side to anchor the same alignment, so the cost no longer
+    grows with the file size.
+    """
+    a = original.splitlines(keepends=True)
+    b = updated.splitlines(keepends=True)
+    if _OTHER_LINE_BREAK_RE.search(original):
+        # Counting "\n" below would not match str.splitlines()
+        return difflib.unified_diff(a, b, f"a/{name}", f"b/{name}", lineterm="")
+    
+    # Lines difflib's autojunk heuristic ignores when matching the whole file
+    popular = set()
+    if len(b) >= 200:
+        ntest = len(b) // 100 + 1
+        popular = {line for line, count in Counter(b).items() if count > ntest}
+    
+    def longest_run(lines: List[str], lo: int, hi: int) -> Tuple[int, int]:
+        # Longest stretch of lines[lo:hi] difflib can anchor a match on,
+        # and the index where it first ends
+        best, end, run = 0, -1, 0
+        for k in range(lo, hi):
+            run = 0 if lines[k] in popular else run + 1
+            if run > best:
+                best, end = run, k
+        return best, end
+    
+    def widen(indices: range, rival: int) -> int:
+        # Take at least `margin` lines, and enough to hold a longer anchor
+        # than `rival`
+        taken = run = 0
+        for k in indices:
+            if taken >= margin and run > rival:
+                break
+            run = 0 if a[k] in popular else run + 1
+            taken += 1
+        return taken
+    
+    # Lines wholly before / after the replaced text are the same in a and b;
+    # walk outwards from there to the full common prefix and suffix
+    common = min(len(a), len(b))
+    prefix = original.count("\n", 0, index)
+    while prefix < common and a[prefix] == b[prefix]:
+        prefix += 1
+    suffix = max(len(a) - 1 - original.count("\n", 0, index + old_len), 0)
+    while suffix < common and a[-1 - suffix] == b[-1 - suffix]:
+        suffix += 1
+    
+    keep_prefix, overlap = True, None
+    if prefix + suffix > common:
+        # The changed lines repeat their neighbours, so the common prefix and
+        # suffix overlap. difflib keeps the one holding the longest anchor
+        # whole (the first found on a tie) and trims the other
+        overlap = (prefix, suffix)
+        head_run, head_end = longest_run(a, 0, prefix)
+        tail_run, tail_end = longest_run(a, len(a) - suffix, len(a))
+        keep_prefix = not tail_run or (
+            (-head_run, head_end, head_end) <= (-tail_run, tail_end, tail_end + len(b) - len(a))
+        )
+        if keep_prefix:
+            suffix = common - prefix
+        else:
+            prefix = common - suffix
+    
+    # Each side of the window needs a longer anchor than anything inside the
+    # changed lines, and the side kept whole a longer one than the other
+    anchor = max(longest_run(a, prefix, len(a) - suffix)[0],
+                 longest_run(b, prefix, len(b) - suffix)[0])
+    margin = (DIFF_CONTEXT_LINES + original.count("\n", index, index + old_len)
+              + updated.count("\n", index, index + new_len))
+    while True:
+        if keep_prefix:
+            cut = suffix - widen(range(len(a) - suffix, len(a)), anchor)
+            rival = longest_run(a, len(a) - overlap[1], len(a) - cut)[0] if overlap else 0
+            start = prefix - widen(range(prefix - 1, -1, -1), max(anchor, rival))
+        else:
+            start = prefix - widen(range(prefix - 1, -1, -1), anchor)
+            rival = longest_run(a, start, overlap[0])[0]
+            cut = suffix - widen(range(len(a) - suffix, len(a)), max(anchor, rival))
+        matcher = difflib.SequenceMatcher(
+            None, a[start:len(a) - cut], b[start:len(b) - cut], autojunk=False
+        )
+        for line in popular:
+            matcher.b2j.pop(line, None)
+        if not start and not cut:
+            break
+        # The unchanged lines in the window must still be matched as a whole,
+        # otherwise the changed lines latched onto similar lines nearby and
+        # the window is too small to tell how the whole file aligns
+        blocks = matcher.get_matching_blocks()
+        head, tail = prefix - start, suffix - cut
+        if ((not head or (0, 0, head) in blocks)
+                and (not tail or (len(matcher.a) - tail, len(matcher.b) - tail, tail) in blocks)):
+            break
+        margin *= 2
+    return _unified_diff_lines(matcher, start, name)
+
+
+def _unified_diff_lines(
+    matcher: difflib.SequenceMatcher, line_offset: int, name: str
+) -> Iterator[str]:
+    """difflib.unified_diff's output for `matcher`, shifted by `line_offset` lines."""
+    def hunk_range(start: int, stop: int) -> str:
+        length = stop - start
+        if length == 1:
+            return str(start + line_offset + 1)
+        return f"{start + line_offset + (1 if length else 0)},{length}"
+    
+    a, b = matcher.a, matcher.b
+    for number, group in enumerate(matcher.get_grouped_opcodes(DIFF_CONTEXT_LINES)):
+        if not number:
+            yield f"--- a/{name}"
+            yield f"+++ b/{name}"
+        yield (f"@@ -{hunk_range(group[0][1], group[-1][2])}"
+               f" +{hunk_range(group[0][3], group[-1][4])} @@")
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                yield from (" " + line for line in a[i1:i2])
+                continue
+            yield from ("-" + line for line in a[i1:i2])
+            yield from ("+" + line for line in b[j1:j2])
+
+
 async def edit_file(
     path: str,
     old_str: str,
@@ -203,34 +533,34 @@ async def edit_file(
     except Exception as e:
         return {"error": str(e), "success": False}
     
-    # Verify old_str appears exactly once
-    count = original_content.count(old_str)
-    if count == 0:
+    # Verify old_str appears exactly once: locate it, then look for a second
+    # occurrence after it (the full count is only needed for the error)
+    index = original_content.find(old_str)
+    if index < 0:
         return {"error": f"String not found in {path}", "success": False}
-    if count > 1:
+    if original_content.find(old_str, index + max(len(old_str), 1)) >= 0:
+        count = original_content.count(old_str)
         return {"error": f"String appears {count} times in {path}, must be unique", "success": False}
     
-    # Perform replacement
-    new_content = original_content.replace(old_str, new_str, 1)
-    
     # Calculate diff stats
-    old_lines = old_str.split("\n")
-    new_lines = new_str.split("\n")
-    additions = len(new_lines)
-    deletions = len(old_lines)
-    
-    # Write back
-    with open(path, "w", encoding="utf-8") as f:
-        f.write(new_content)
-    
-    # Generate unified diff for display
-    diff = list(difflib.unified_diff(
-        original_content.splitlines(keepends=True),
-        new_content.splitlines(keepends=True),
-        fromfile=f"a/{os.path.basename(path)}",
-        tofile=f"b/{os.path.basename(path)}",
-        lineterm="",
-    ))
+    additions = new_str.count("\n") + 1
+    deletions = old_str.count("\n") + 1
+    
+    if old_str == new_str:
+        # Nothing changes on disk; skip the write and the diff
+        diff = []
+    else:
+        # Perform replacement
+        new_content = original_content[:index] + new_str + original_content[index + len(old_str):]
+        
+        # Write back
+        _atomic_write(path, new_content.encode("utf-8"))
+        
+        # Generate unified diff for display
+        diff = _replacement_diff(
+            original_content, new_content, index, len(old_str), len(new_str),
+            os.path.basename(path),
+        )
     
     return {
         "success": True,
@@ -238,7 +568,7 @@ async def edit_file(
         "file": path,
         "additions": additions,
         "deletions": deletions,
-        "diff": "".join(diff[:50]),  # First 50 lines of diff
+        "diff": "".join(itertools.islice(diff, 50)),  # First 50 lines of diff
         "display_title": f"{description or 'Edit'}\n{os.path.basename(path)}, +{additions}, -{deletions}",
     }
 
@@ -272,15 +602,17 @@ async def multi_edit(
         old_str = edit["old_str"]
         new_str = edit["new_str"]
         
-        if old_str not in content:
+        # One scan to locate the edit and one rebuild, instead of an `in`
+        # check followed by replace() scanning the file again
+        index = content.find(old_str)
+        if index < 0:
             return {"error": f"String not found: {old_str[:50]}...", "success": False}
         
-        content = content.replace(old_str, new_str, 1)
-        total_additions += len(new_str.split("\n"))
-        total_deletions += len(old_str.split("\n"))
+        content = content[:index] + new_str + content[index + len(old_str):]
+        total_additions += new_str.count("\n") + 1
+        total_deletions += old_str.count("\n") + 1
     
-    with open(path, "w", encoding="utf-8") as f:
-        f.write(content)
+    _atomic_write(path, content.encode("utf-8"))
     
     return {
         "success": True,
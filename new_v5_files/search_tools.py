@@ -10,12 +10,54 @@ Implements:
 """
 
 import asyncio
+import fnmatch
+import heapq
+import itertools
 import os
 import re
+import stat
+import time
 import glob as glob_module
-import json
-from typing import Any, Dict, List, Optional
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 from pathlib import Path
+from urllib.parse import urlparse
+
+import orjson
+
+# Longest single ripgrep JSON line we buffer (minified files can be huge)
+RG_LINE_LIMIT = 1 << 20
+
+# Shared HTTP session for web tools, see _get_session()
+_SESSION = None
+_SESSION_LOOP: Optional[asyncio.AbstractEventLoop] = None
+
+# web_fetch reads at most max_length * FETCH_BYTES_PER_CHAR bytes of a page
+FETCH_CHUNK_SIZE = 16 * 1024
+FETCH_BYTES_PER_CHAR = 4
+
+# (url, max_length) -> (fresh until, ETag, result). Fresh entries are served
+# without touching the network; stale ones with an ETag are revalidated.
+FETCH_CACHE_TTL = 300.0  # seconds
+FETCH_CACHE_SIZE = 128
+_FETCH_CACHE: "OrderedDict[Tuple[str, int], Tuple[float, Optional[str], Dict[str, Any]]]" = OrderedDict()
+
+GLOB_MAX_RESULTS = 100
+# Directories glob wildcards never descend into
+_IGNORE_DIRS = frozenset({".git", "node_modules", "__pycache__", "dist", "build"})
+
+_LS_SKIP = frozenset({"node_modules", "__pycache__"})
+
+# scheme://netloc fast path for _extract_domain
+_DOMAIN_RE = re.compile(r"[a-zA-Z][a-zA-Z0-9+.\-]*://([^/?#]+)")
+_TITLE_RE = re.compile(r"<title[^>]*>(.*?)</title>", re.IGNORECASE | re.DOTALL)
+_SCRIPT_STYLE_RE = re.compile(
+    r"<script[^>]*>.*?</script>|<style[^>]*>.*?</style>", re.DOTALL | re.IGNORECASE
+)
+_TAG_RE = re.compile(r"<[^>]+>")
+_HTML_ENTITIES = {"&amp;": "&", "&lt;": "<", "&gt;": ">", "&nbsp;": " ", "&quot;": '"'}
+_ENTITY_RE = re.compile("|".join(map(re.escape, _HTML_ENTITIES)))
 
 
 async def web_search(
@@ -39,11 +81,11 @@ async def web_search(
         search_key = os.environ.get("SEARCH_API_KEY", "")
         
         if search_url and search_key:
-            async with aiohttp.ClientSession() as session:
-                params = {"q": query, "count": max_results, "key": search_key}
-                async with session.get(search_url, params=params) as resp:
-                    data = await resp.json()
-                    results = data.get("results", [])
+            session = await _get_session()
+            params = {"q": query, "count": max_results, "key": search_key}
+            async with session.get(search_url, params=params) as resp:
+                data = await resp.json()
+                results = data.get("results", [])
         else:
             # Fallback: mock results for development
             results = [{
@@ -96,27 +138,57 @@ async def web_fetch(
     """
     try:
         import aiohttp
-        from html.parser import HTMLParser
         
         headers = {
             "User-Agent": "Mozilla/5.0 (compatible; SkynetBot/1.0)",
         }
         
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=30)) as resp:
-                html = await resp.text()
-                content_type = resp.headers.get("content-type", "")
+        key = (url, max_length)
+        cached = _FETCH_CACHE.get(key)
+        if cached is not None:
+            _FETCH_CACHE.move_to_end(key)
+            if cached[0] > time.monotonic():
+                return dict(cached[2])
+            if cached[1]:
+                headers["If-None-Match"] = cached[1]
+        
+        # Stop downloading once there is enough markup to fill max_length
+        byte_limit = max_length * FETCH_BYTES_PER_CHAR
+        body = bytearray()
+        body_truncated = False
+        session = await _get_session()
+        timeout = aiohttp.ClientTimeout(total=30, sock_read=10)
+        async with session.get(url, headers=headers, timeout=timeout) as resp:
+            if resp.status == 304 and cached is not None:
+                _cache_fetch(key, cached[1], cached[2])
+                return dict(cached[2])
+            status = resp.status
+            etag = resp.headers.get("ETag")
+            async for chunk in resp.content.iter_chunked(FETCH_CHUNK_SIZE):
+                body += chunk
+                if len(body) >= byte_limit:
+                    body_truncated = True
+                    break
+            charset = resp.charset or "utf-8"
+            content_type = resp.headers.get("content-type", "")
+        
+        try:
+            html = body.decode(charset, errors="replace")
+        except LookupError:
+            html = body.decode("utf-8", errors="replace")
         
         # Simple HTML to text extraction
         text = _html_to_text(html)
         
-        if len(text) > max_length:
+        if body_truncated:
+            text = text[:max_length] + f"\n... [truncated after {len(body)} bytes of HTML]"
+        elif len(text) > max_length:
             text = text[:max_length] + f"\n... [truncated, {len(text)} total chars]"
         
         # Extract title
         title = _extract_title(html)
         
-        return {
+        result = {
             "success": True,
             "url": url,
             "title": title,
@@ -125,6 +197,9 @@ async def web_fetch(
             "content_type": content_type,
             "display_title": f"Fetched: {title or url}",
         }
+        if status == 200:
+            _cache_fetch(key, etag, result)
+        return dict(result)
         
     except ImportError:
         return {"success": False, "error": "aiohttp not installed", "url": url}
@@ -132,6 +207,14 @@ async def web_fetch(
         return {"success": False, "error": str(e), "url": url}
 
 
+def _cache_fetch(key: Tuple[str, int], etag: Optional[str], result: Dict[str, Any]) -> None:
+    """Store (or refresh) a web_fetch result, evicting least recently used entries"""
+    _FETCH_CACHE[key] = (time.monotonic() + FETCH_CACHE_TTL, etag, result)
+    _FETCH_CACHE.move_to_end(key)
+    while len(_FETCH_CACHE) > FETCH_CACHE_SIZE:
+        _FETCH_CACHE.popitem(last=False)
+
+
 async def grep(
     pattern: str,
     path: str = ".",
@@ -146,27 +229,34 @@ async def grep(
     """
     try:
         # Try ripgrep first (faster)
-        cmd = f"rg --json -m {max_results}"
-        if include:
-            cmd += f" --glob '{include}'"
-        cmd += f" -C {context_lines}"
-        cmd += f" '{pattern}' {path}"
-        
-        process = await asyncio.create_subprocess_shell(
-            cmd,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-        )
-        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=30)
-        
-        if process.returncode == 0:
-            matches = _parse_rg_output(stdout.decode("utf-8", errors="replace"))
-        elif process.returncode == 1:
-            # No matches
-            matches = []
-        else:
-            # Fallback to grep
+        try:
+            process = await asyncio.create_subprocess_exec(
+                "rg", "--json", "-m", str(max_results),
+                *(("--glob", include) if include else ()),
+                "-C", str(context_lines),
+                "-e", pattern, "--", path,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL,
+                limit=RG_LINE_LIMIT,
+            )
+        except FileNotFoundError:
             matches = await _fallback_grep(pattern, path, include, max_results, context_lines)
+        else:
+            try:
+                matches, complete = await asyncio.wait_for(
+                    _read_rg_matches(process.stdout, max_results), timeout=30,
+                )
+            except BaseException:
+                _kill(process)
+                await process.wait()
+                raise
+            if not complete:
+                # Enough matches; stop ripgrep instead of draining the rest
+                _kill(process)
+            returncode = await process.wait()
+            if complete and returncode not in (0, 1):
+                # Fallback to grep
+                matches = await _fallback_grep(pattern, path, include, max_results, context_lines)
         
         return {
             "success": True,
@@ -196,18 +286,7 @@ async def glob_search(
     Like Claude Code's Glob tool.
     """
     try:
-        full_pattern = os.path.join(path, pattern)
-        matches = glob_module.glob(full_pattern, recursive=True)
-        
-        results = []
-        for match in sorted(matches)[:100]:
-            stat = os.stat(match)
-            results.append({
-                "path": match,
-                "name": os.path.basename(match),
-                "size": stat.st_size,
-                "is_dir": os.path.isdir(match),
-            })
+        results = await asyncio.to_thread(_glob_stat, pattern, path)
         
         return {
             "success": True,
@@ -220,6 +299,102 @@ async def glob_search(
         return {"success": False, "error": str(e), "pattern": pattern}
 
 
+def _glob_stat(pattern: str, path: str) -> List[Dict[str, Any]]:
+    """Expand a glob and stat the first GLOB_MAX_RESULTS matches in one batch off the event loop"""
+    if os.path.isabs(pattern):
+        path = os.sep
+    parts = [part for part in pattern.split(os.sep) if part]
+    if not parts:
+        return []
+    if parts[-1] == "**":
+        parts.append("*")
+    
+    # The walk yields paths in sorted order, so the first GLOB_MAX_RESULTS
+    # distinct ones are exactly sorted(glob(...))[:GLOB_MAX_RESULTS] and the
+    # rest of the tree is never listed. Repeats (e.g. from "**/**") are adjacent.
+    unique = (match for match, _ in itertools.groupby(_walk_glob(path, tuple(parts))))
+    results = []
+    for match in itertools.islice(unique, GLOB_MAX_RESULTS):
+        st = os.stat(match)
+        results.append({
+            "path": match,
+            "name": os.path.basename(match),
+            "size": st.st_size,
+            "is_dir": stat.S_ISDIR(st.st_mode),
+        })
+    return results
+
+
+def _walk_glob(directory: str, parts: Tuple[str, ...]) -> Iterator[str]:
+    """
+    Yield paths under directory matching the glob components in parts, in
+    sorted order (repeats possible, always adjacent).
+    
+    Behaves like glob(recursive=True) (hidden names only match patterns that
+    start with "."), but wildcard expansion never descends into _IGNORE_DIRS
+    and only literal components are looked up without listing the directory.
+    
+    Everything below an entry starts with "<name>/", so visiting subtrees in
+    order of name + "/" keeps the output sorted without collecting it first.
+    """
+    part, rest = parts[0], parts[1:]
+    
+    if part == "**":
+        subdirs = sorted(
+            (entry for entry in _scan_dir(directory)
+             if not entry.name.startswith(".") and entry.name not in _IGNORE_DIRS
+             and entry.is_dir()),
+            key=_subtree_key,
+        )
+        yield from heapq.merge(
+            _walk_glob(directory, rest),
+            itertools.chain.from_iterable(_walk_glob(entry.path, parts) for entry in subdirs),
+        )
+        return
+    
+    if not glob_module.has_magic(part):
+        candidate = os.path.join(directory, part)
+        if rest:
+            if os.path.isdir(candidate):
+                yield from _walk_glob(candidate, rest)
+        elif os.path.lexists(candidate):
+            yield candidate
+        return
+    
+    match_name = _glob_matcher(part)
+    show_hidden = part.startswith(".")
+    entries = sorted(_scan_dir(directory), key=_subtree_key if rest else _entry_name)
+    for entry in entries:
+        name = entry.name
+        if (name.startswith(".") and not show_hidden) or not match_name(name):
+            continue
+        if not rest:
+            yield entry.path
+        elif name not in _IGNORE_DIRS and entry.is_dir():
+            yield from _walk_glob(entry.path, rest)
+
+
+def _entry_name(entry: os.DirEntry) -> str:
+    return entry.name
+
+
+def _subtree_key(entry: os.DirEntry) -> str:
+    return entry.name + os.sep
+
+
+def _scan_dir(directory: str) -> List[os.DirEntry]:
+    try:
+        with os.scandir(directory) as it:
+            return list(it)
+    except OSError:
+        return []
+
+
+@lru_cache(maxsize=256)
+def _glob_matcher(part: str) -> Callable[[str], Optional["re.Match[str]"]]:
+    return re.compile(fnmatch.translate(part)).match
+
+
 async def ls(
     path: str = ".",
     depth: int = 2,
@@ -233,23 +408,26 @@ async def ls(
         if not os.path.exists(path):
             return {"error": f"Path not found: {path}", "success": False}
         
+        with os.scandir(path) as it:
+            dir_entries = sorted(
+                (e for e in it if not e.name.startswith(".") and e.name not in _LS_SKIP),
+                key=lambda e: e.name,
+            )
+        
         entries = []
-        for entry in sorted(os.listdir(path)):
-            if entry.startswith(".") or entry == "node_modules" or entry == "__pycache__":
-                continue
-            
-            full_path = os.path.join(path, entry)
-            is_dir = os.path.isdir(full_path)
+        for entry in dir_entries:
+            # DirEntry caches the d_type from readdir, so no stat for most entries
+            is_dir = entry.is_dir()
             
             entry_info = {
-                "name": entry,
-                "path": full_path,
+                "name": entry.name,
+                "path": entry.path,
                 "is_dir": is_dir,
             }
             
             if not is_dir:
                 try:
-                    entry_info["size"] = os.path.getsize(full_path)
+                    entry_info["size"] = entry.stat().st_size
                 except OSError:
                     pass
             
@@ -268,19 +446,50 @@ async def ls(
 
 # === Helper functions ===
 
+async def _get_session():
+    """
+    Return the shared aiohttp session, creating it on first use.
+    
+    Reusing one session keeps keep-alive connections, DNS and TLS state warm
+    across web_search/web_fetch calls. A session is bound to its event loop,
+    so a new one is made if the running loop changed.
+    """
+    global _SESSION, _SESSION_LOOP
+    import aiohttp
+    
+    loop = asyncio.get_running_loop()
+    if _SESSION is None or _SESSION.closed or _SESSION_LOOP is not loop:
+        _SESSION = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=100, ttl_dns_cache=300, enable_cleanup_closed=True),
+            timeout=aiohttp.ClientTimeout(total=30),
+        )
+        _SESSION_LOOP = loop
+    return _SESSION
+
+
+async def close_http_session() -> None:
+    """Close the shared aiohttp session (call on application shutdown)"""
+    global _SESSION, _SESSION_LOOP
+    if _SESSION is not None and not _SESSION.closed:
+        await _SESSION.close()
+    _SESSION = None
+    _SESSION_LOOP = None
+
+
 def _extract_domain(url: str) -> str:
     """Extract domain from URL"""
+    match = _DOMAIN_RE.match(url)
+    if match:
+        return match.group(1)
     try:
-        from urllib.parse import urlparse
-        parsed = urlparse(url)
-        return parsed.netloc
+        return urlparse(url).netloc
     except Exception:
         return url
 
 
 def _extract_title(html: str) -> str:
     """Extract title from HTML"""
-    match = re.search(r"<title[^>]*>(.*?)</title>", html, re.IGNORECASE | re.DOTALL)
+    match = _TITLE_RE.search(html)
     if match:
         return match.group(1).strip()
     return ""
@@ -288,37 +497,61 @@ def _extract_title(html: str) -> str:
 
 def _html_to_text(html: str) -> str:
     """Simple HTML to text conversion"""
-    # Remove scripts and styles
-    text = re.sub(r"<script[^>]*>.*?</script>", "", html, flags=re.DOTALL | re.IGNORECASE)
-    text = re.sub(r"<style[^>]*>.*?</style>", "", text, flags=re.DOTALL | re.IGNORECASE)
-    # Remove tags
-    text = re.sub(r"<[^>]+>", " ", text)
+    # Remove scripts and styles, then tags
+    text = _TAG_RE.sub(" ", _SCRIPT_STYLE_RE.sub("", html))
     # Decode entities
-    text = text.replace("&amp;", "&").replace("&lt;", "<").replace("&gt;", ">")
-    text = text.replace("&nbsp;", " ").replace("&quot;", '"')
+    if "&" in text:
+        text = _ENTITY_RE.sub(_decode_entity, text)
     # Clean whitespace
-    text = re.sub(r"\s+", " ", text).strip()
-    return text
+    return " ".join(text.split())
+
 
+def _decode_entity(match: "re.Match[str]") -> str:
+    return _HTML_ENTITIES[match.group()]
 
-def _parse_rg_output(output: str) -> List[Dict]:
-    """Parse ripgrep JSON output"""
+
+async def _read_rg_matches(stream: asyncio.StreamReader, max_results: int) -> Tuple[List[Dict], bool]:
+    """
+    Collect matches from ripgrep's JSON stream as they arrive.
+    
+    Returns the matches and whether the stream was read to the end
+    (False when reading stopped at max_results).
+    """
     matches = []
-    for line in output.strip().split("\n"):
-        if not line:
-            continue
+    while len(matches) < max_results:
         try:
-            data = json.loads(line)
-            if data.get("type") == "match":
-                match_data = data.get("data", {})
-                matches.append({
-                    "file": match_data.get("path", {}).get("text", ""),
-                    "line_number": match_data.get("line_number", 0),
-                    "text": match_data.get("lines", {}).get("text", "").strip(),
-                })
-        except json.JSONDecodeError:
-            continue
-    return matches
+            line = await stream.readline()
+        except ValueError:
+            continue  # Line longer than RG_LINE_LIMIT; skip it
+        if not line:
+            return matches, True
+        match = _parse_rg_line(line)
+        if match is not None:
+            matches.append(match)
+    return matches, False
+
+
+def _parse_rg_line(line: bytes) -> Optional[Dict]:
+    """Parse one line of ripgrep JSON output, returning None for non-match records"""
+    try:
+        data = orjson.loads(line)
+    except orjson.JSONDecodeError:
+        return None
+    if data.get("type") != "match":
+        return None
+    match_data = data.get("data", {})
+    return {
+        "file": match_data.get("path", {}).get("text", ""),
+        "line_number": match_data.get("line_number", 0),
+        "text": match_data.get("lines", {}).get("text", "").strip(),
+    }
+
+
+def _kill(process: asyncio.subprocess.Process) -> None:
+    try:
+        process.kill()
+    except ProcessLookupError:
+        pass
 
 
 async def _fallback_grep(
@@ -326,18 +559,20 @@ async def _fallback_grep(
     max_results: int, context_lines: int,
 ) -> List[Dict]:
     """Fallback to system grep if ripgrep not available"""
-    cmd = f"grep -rn"
-    if include:
-        cmd += f" --include='{include}'"
-    cmd += f" -m {max_results} -C {context_lines}"
-    cmd += f" '{pattern}' {path}"
-    
-    process = await asyncio.create_subprocess_shell(
-        cmd,
+    process = await asyncio.create_subprocess_exec(
+        "grep", "-rn",
+        *((f"--include={include}",) if include else ()),
+        "-m", str(max_results), "-C", str(context_lines),
+        "-e", pattern, "--", path,
         stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL,
     )
-    stdout, _ = await asyncio.wait_for(process.communicate(), timeout=30)
+    try:
+        stdout, _ = await asyncio.wait_for(process.communicate(), timeout=30)
+    except BaseException:
+        _kill(process)
+        await process.wait()
+        raise
     
     matches = []
     for line in stdout.decode("utf-8", errors="replace").split("\n"):
@@ -404,7 +639,12 @@ SEARCH_TOOL_DEFINITIONS = [
     },
     {
         "name": "glob",
-        "description": "Find files matching a glob pattern",
+        "description": (
+            "Find files matching a glob pattern (first 100, sorted). "
+            "Wildcards skip hidden names and never descend into "
+            f"{', '.join(sorted(_IGNORE_DIRS))}; "
+            "name such a directory literally to search inside it"
+        ),
         "handler": glob_search,
         "category": "search",
         "parameters": {
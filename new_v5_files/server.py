@@ -6,15 +6,18 @@ Provides endpoints matching Claude Code's feature set.
 """
 
 import asyncio
-import json
 import os
 import time
-import uuid
-from typing import Optional
+import secrets
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Optional, Tuple
 
+import orjson
 from fastapi import FastAPI, HTTPException, Request, Query
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
 from pydantic import BaseModel, Field
 from typing import List, Dict, Any
 
@@ -26,14 +29,38 @@ from backend.core import (
     AgentLoop, ToolRegistry, ContextManager, EventQueue,
     LoopStatus,
 )
+from backend.core.agent_loop import EventBatcher, format_sse_frame
 from backend.tools import register_all_tools
+from backend.tools.command_tools import close_all_shells, close_shell, shell_session
+from backend.tools.search_tools import close_http_session
 
 
 # === App Setup ===
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Release pooled connections held by the web tools
+    await close_http_session()
+    close_all_shells()
+
+
+class FastJSONResponse(ORJSONResponse):
+    """
+    orjson response with the loop's encoder options (non-str keys allowed,
+    as json.dumps did). Returning it directly from an endpoint also skips
+    FastAPI's jsonable_encoder pass over the whole payload; types orjson
+    doesn't know (e.g. pydantic models) still go through jsonable_encoder.
+    """
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=jsonable_encoder, option=orjson.OPT_NON_STR_KEYS)
+
+
 app = FastAPI(
     title="Skynet Agentic Loop API",
     description="Claude Code-style agentic loop with tool execution and SSE streaming",
     version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
 )
 
 app.add_middleware(
@@ -50,8 +77,97 @@ register_all_tools(tool_registry)
 event_queue = EventQueue()
 context_manager = ContextManager()
 
-# Active sessions
-sessions: Dict[str, AgentLoop] = {}
+# Active sessions, least recently used first
+sessions: "OrderedDict[str, AgentLoop]" = OrderedDict()
+SESSIONS_MAX = 1000
+
+
+def _put_session(session_id: str, agent_loop: AgentLoop) -> None:
+    sessions[session_id] = agent_loop
+    sessions.move_to_end(session_id)
+    while len(sessions) > SESSIONS_MAX:
+        sessions.popitem(last=False)
+
+# Constant SSE frames, encoded once
+_DONE_FRAME = format_sse_frame({"type": "done"})
+
+# SSE comment frame sent while a stream is idle, so proxies keep it open
+_PING_FRAME = b":\n\n"
+SSE_KEEPALIVE_INTERVAL = 15.0  # seconds
+
+# Events buffered per /api/events/stream client before the oldest are dropped
+SUBSCRIBER_BUFFER_SIZE = 1024
+
+
+async def _bounded_events(
+    events: AsyncIterator[Dict], maxsize: int = SUBSCRIBER_BUFFER_SIZE
+) -> AsyncIterator[Dict]:
+    """
+    Re-yield events through a bounded, drop-oldest buffer.
+    
+    A pump task keeps draining the source so a slow client can't make the
+    upstream subscriber queue grow without limit. When the buffer overflows
+    the oldest events are discarded and a "dropped" event reports how many.
+    """
+    buffer: Deque[Dict] = deque(maxlen=maxsize)
+    ready = asyncio.Event()
+    dropped = 0
+    finished = False
+    
+    async def pump():
+        nonlocal dropped, finished
+        try:
+            async for event in events:
+                if len(buffer) == maxsize:
+                    dropped += 1
+                buffer.append(event)
+                ready.set()
+        finally:
+            finished = True
+            ready.set()
+    
+    task = asyncio.create_task(pump())
+    try:
+        while True:
+            if dropped:
+                count, dropped = dropped, 0
+                yield {"type": "dropped", "data": {"count": count}}
+            if buffer:
+                yield buffer.popleft()
+            elif finished:
+                task.result()  # Surface a failure in the source
+                return
+            else:
+                ready.clear()
+                await ready.wait()
+    finally:
+        task.cancel()
+
+
+async def _with_keepalive(
+    chunks: AsyncIterator[bytes], interval: float = SSE_KEEPALIVE_INTERVAL
+) -> AsyncIterator[bytes]:
+    """Interleave SSE ping comments whenever the source is idle for `interval` seconds"""
+    source = chunks.__aiter__()
+    pending: Optional[asyncio.Future] = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(source.__anext__())
+            done, _ = await asyncio.wait({pending}, timeout=interval)
+            if not done:
+                yield _PING_FRAME
+                continue
+            
+            next_chunk, pending = pending, None
+            try:
+                chunk = next_chunk.result()
+            except StopAsyncIteration:
+                return
+            yield chunk
+    finally:
+        if pending is not None:
+            pending.cancel()
 
 
 # === Request/Response Models ===
@@ -84,37 +200,69 @@ class SteeringRequest(BaseModel):
 
 # === Endpoints ===
 
+_ROOT_BYTES = orjson.dumps({
+    "service": "Skynet Agentic Loop",
+    "version": "1.0.0",
+    "features": [
+        "agentic_loop",
+        "tool_execution",
+        "sse_streaming",
+        "file_operations",
+        "command_execution",
+        "web_search",
+        "context_management",
+    ],
+})
+
+# (registry fingerprint, encoded /api/tools body)
+_tools_cache: Optional[Tuple[Tuple[int, ...], bytes]] = None
+# (registry fingerprint, LLM tool definitions shared by every AgentLoop)
+_tool_definitions_cache: Optional[Tuple[Tuple[int, ...], List[Dict]]] = None
+
+
+def _new_agent_loop(max_iterations: int) -> AgentLoop:
+    """
+    Build the per-request loop. Only session state is per request; the
+    registry, context manager, event queue and tool definitions are
+    process-wide and shared by every loop.
+    """
+    global _tool_definitions_cache
+    fingerprint = tuple(map(id, tool_registry._tools.values()))
+    if _tool_definitions_cache is None or _tool_definitions_cache[0] != fingerprint:
+        _tool_definitions_cache = fingerprint, tool_registry.get_tool_definitions()
+    return AgentLoop(
+        tool_registry=tool_registry,
+        context_manager=context_manager,
+        event_queue=event_queue,
+        max_iterations=max_iterations,
+        tool_definitions=_tool_definitions_cache[1],
+    )
+
+
 @app.get("/")
 async def root():
-    return {
-        "service": "Skynet Agentic Loop",
-        "version": "1.0.0",
-        "features": [
-            "agentic_loop",
-            "tool_execution",
-            "sse_streaming",
-            "file_operations",
-            "command_execution",
-            "web_search",
-            "context_management",
-        ],
-    }
+    return Response(_ROOT_BYTES, media_type="application/json")
 
 
 @app.get("/api/tools")
 async def list_tools():
     """List all available tools"""
-    return {
-        "tools": [
-            {
-                "name": tool.name,
-                "description": tool.description,
-                "category": tool.category,
-                "risk_level": tool.risk_level,
-            }
-            for tool in tool_registry._tools.values()
-        ]
-    }
+    global _tools_cache
+    # Tools are registered at startup; re-encode only if the set changes
+    fingerprint = tuple(map(id, tool_registry._tools.values()))
+    if _tools_cache is None or _tools_cache[0] != fingerprint:
+        _tools_cache = fingerprint, orjson.dumps({
+            "tools": [
+                {
+                    "name": tool.name,
+                    "description": tool.description,
+                    "category": tool.category,
+                    "risk_level": tool.risk_level,
+                }
+                for tool in tool_registry._tools.values()
+            ]
+        })
+    return Response(_tools_cache[1], media_type="application/json")
 
 
 @app.post("/api/agent/run")
@@ -125,35 +273,37 @@ async def run_agent(request: AgentRequest):
     This is the main endpoint - equivalent to sending a message in Claude Code.
     Returns Server-Sent Events for real-time streaming of the loop execution.
     """
-    session_id = request.session_id or str(uuid.uuid4())
+    session_id = request.session_id or secrets.token_hex(16)
     
-    agent_loop = AgentLoop(
-        tool_registry=tool_registry,
-        context_manager=context_manager,
-        event_queue=event_queue,
-        max_iterations=request.max_iterations,
-    )
-    sessions[session_id] = agent_loop
+    agent_loop = _new_agent_loop(request.max_iterations)
+    _put_session(session_id, agent_loop)
+    # Set in the request task so the stream's tasks inherit it
+    shell_session.set(session_id)
     
     async def event_generator():
         try:
-            async for event in agent_loop.run(
+            async for chunk in EventBatcher(agent_loop.run(
                 user_message=request.message,
                 system_prompt=request.system_prompt,
                 session_id=session_id,
-            ):
-                yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+            )):
+                yield chunk
         except Exception as e:
-            yield f"data: {json.dumps({'type': 'error', 'data': {'message': str(e)}})}\n\n"
+            yield format_sse_frame({'type': 'error', 'data': {'message': str(e)}})
         finally:
-            yield f"data: {json.dumps({'type': 'done'})}\n\n"
+            # Finished sessions can't be interrupted; don't keep them around
+            if sessions.get(session_id) is agent_loop:
+                del sessions[session_id]
+            close_shell(session_id)
+            yield _DONE_FRAME
     
     return StreamingResponse(
-        event_generator(),
+        _with_keepalive(event_generator()),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
             "Connection": "keep-alive",
+            "X-Accel-Buffering": "no",
             "X-Session-Id": session_id,
         },
     )
@@ -165,24 +315,23 @@ async def run_agent_sync(request: AgentRequest):
     Run agent loop synchronously (non-streaming).
     Returns complete results when done.
     """
-    session_id = request.session_id or str(uuid.uuid4())
+    session_id = request.session_id or secrets.token_hex(16)
     
-    agent_loop = AgentLoop(
-        tool_registry=tool_registry,
-        context_manager=context_manager,
-        event_queue=event_queue,
-        max_iterations=request.max_iterations,
-    )
+    agent_loop = _new_agent_loop(request.max_iterations)
+    shell_session.set(session_id)
     
     events = []
-    async for event in agent_loop.run(
-        user_message=request.message,
-        system_prompt=request.system_prompt,
-        session_id=session_id,
-    ):
-        events.append(event)
+    try:
+        async for event in agent_loop.run(
+            user_message=request.message,
+            system_prompt=request.system_prompt,
+            session_id=session_id,
+        ):
+            events.append(event)
+    finally:
+        close_shell(session_id)
     
-    return {"session_id": session_id, "events": events}
+    return FastJSONResponse({"session_id": session_id, "events": events})
 
 
 @app.post("/api/tool/execute")
@@ -193,7 +342,7 @@ async def execute_tool(request: ToolExecuteRequest):
     """
     try:
         result = await tool_registry.execute(request.tool_name, request.arguments)
-        return {"success": True, "result": result}
+        return FastJSONResponse({"success": True, "result": result})
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
@@ -206,6 +355,7 @@ async def interrupt_agent(request: InterruptRequest):
     agent = sessions.get(request.session_id)
     if not agent:
         raise HTTPException(status_code=404, detail="Session not found")
+    sessions.move_to_end(request.session_id)
     agent.interrupt()
     return {"success": True, "message": "Interrupt signal sent"}
 
@@ -227,25 +377,48 @@ async def event_stream():
     
     async def generator():
         try:
-            async for event in event_queue.listen(subscriber):
-                yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+            # Coalesce bursts into fewer writes; loop events arrive with
+            # their frame already encoded
+            async for chunk in EventBatcher(_bounded_events(event_queue.listen(subscriber))):
+                yield chunk
         finally:
             event_queue.unsubscribe(subscriber)
     
     return StreamingResponse(
-        generator(),
+        _with_keepalive(generator()),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
             "Connection": "keep-alive",
+            "X-Accel-Buffering": "no",
         },
     )
 
 
+# since -> (history length, last event, encoded body); polling clients
+# re-request the same window until new events arrive
+_history_cache: "OrderedDict[int, Tuple[int, Any, bytes]]" = OrderedDict()
+HISTORY_CACHE_SIZE = 64
+
+
 @app.get("/api/events/history")
 async def event_history(since: int = Query(0, description="Sequence number to fetch from")):
     """Get event history"""
-    return {"events": event_queue.get_history(since)}
+    events = event_queue.get_history(since)
+    last = events[-1] if events else None
+    cached = _history_cache.get(since)
+    # History only grows at the tail (and may drop from the head), so an
+    # unchanged length and last event mean the window is unchanged. The
+    # cache holds a reference to `last`, so the identity check is safe.
+    if cached is not None and cached[0] == len(events) and cached[1] is last:
+        _history_cache.move_to_end(since)
+        return Response(cached[2], media_type="application/json")
+    response = FastJSONResponse({"events": events})
+    _history_cache[since] = (len(events), last, response.body)
+    _history_cache.move_to_end(since)
+    while len(_history_cache) > HISTORY_CACHE_SIZE:
+        _history_cache.popitem(last=False)
+    return response
 
 
 # === File operation shortcuts (matching Claude Code UI actions) ===
@@ -256,7 +429,7 @@ async def api_read_file(path: str, start_line: Optional[int] = None, end_line: O
     result = await tool_registry.execute("read_file", {
         "path": path, "start_line": start_line, "end_line": end_line
     })
-    return result
+    return FastJSONResponse(result)
 
 
 @app.post("/api/file/view-truncated")
@@ -265,14 +438,14 @@ async def api_view_truncated(path: str, section: str = "middle"):
     result = await tool_registry.execute("view_truncated", {
         "path": path, "section": section
     })
-    return result
+    return FastJSONResponse(result)
 
 
 @app.post("/api/file/view-multiple")
 async def api_view_multiple(paths: List[str]):
     """View multiple files - Feature #3"""
     result = await tool_registry.execute("view_files", {"paths": paths})
-    return result
+    return FastJSONResponse(result)
 
 
 @app.post("/api/file/edit")
@@ -281,7 +454,7 @@ async def api_edit_file(path: str, old_str: str, new_str: str, description: str
     result = await tool_registry.execute("edit_file", {
         "path": path, "old_str": old_str, "new_str": new_str, "description": description
     })
-    return result
+    return FastJSONResponse(result)
 
 
 @app.post("/api/command/run")
@@ -290,7 +463,7 @@ async def api_run_command(command: str, working_dir: Optional[str] = None, descr
     result = await tool_registry.execute("bash", {
         "command": command, "working_dir": working_dir, "description": description
     })
-    return result
+    return FastJSONResponse(result)
 
 
 @app.post("/api/search/web")
@@ -299,14 +472,14 @@ async def api_web_search(query: str, max_results: int = 10):
     result = await tool_registry.execute("web_search", {
         "query": query, "max_results": max_results
     })
-    return result
+    return FastJSONResponse(result)
 
 
 @app.post("/api/search/fetch")
 async def api_web_fetch(url: str):
     """Fetch webpage - Feature #5"""
     result = await tool_registry.execute("web_fetch", {"url": url})
-    return result
+    return FastJSONResponse(result)
 
 
 # === Health check ===
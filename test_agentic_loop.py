@@ -13,6 +13,7 @@ import sys
 import json
 import asyncio
 import logging
+from functools import lru_cache
 
 # ============================================================================
 # 关键：加载 CheapBuy 的环境配置
@@ -20,21 +21,29 @@ import logging
 CHEAPBUY_DIR = "/root/dylan/CheapBuy"
 SKYNET_DIR = "/root/dylan/skynetCheapBuy/skynetCheapBuy"
 
-# 加载 .env 文件
 env_file = os.path.join(CHEAPBUY_DIR, ".env")
-if os.path.exists(env_file):
+
+
+@lru_cache(maxsize=1)
+def load_env() -> bool:
+    """加载 .env 文件 (每个进程只解析一次), 返回是否找到"""
+    if not os.path.exists(env_file):
+        return False
     with open(env_file) as f:
-        for line in f:
-            line = line.strip()
-            if line and not line.startswith('#') and '=' in line:
-                key, _, value = line.partition('=')
-                key = key.strip()
-                value = value.strip().strip('"').strip("'")
-                if key and key not in os.environ:
-                    os.environ[key] = value
-    print(f"✅ 加载 .env: {env_file}")
-else:
-    print(f"⚠️  未找到 .env: {env_file}")
+        lines = [line.strip() for line in f.read().splitlines()]
+    # 倒序构建: 重复的键以文件中第一次出现的为准
+    parsed = {
+        key.strip(): value.strip().strip('"').strip("'")
+        for key, _, value in (
+            line.partition('=') for line in reversed(lines)
+            if line and not line.startswith('#') and '=' in line
+        )
+    }
+    os.environ.update({k: v for k, v in parsed.items() if k and k not in os.environ})
+    return True
+
+
+load_env()
 
 # 添加模块路径（优先 skynetCheapBuy，回退 CheapBuy）
 sys.path.insert(0, SKYNET_DIR)
@@ -47,11 +56,26 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+# 脚本输出统一先攒在内存里, 每个测试 / 每轮 / 结束 (含出错) 时一次性写出, 避免逐行同步刷新 stdout
+_pending_output: list = []
+
+
+def _emit(line: str = "") -> None:
+    _pending_output.append(line + "\n")
+
+
+def _flush() -> None:
+    if _pending_output:
+        sys.stdout.write("".join(_pending_output))
+        sys.stdout.flush()
+        _pending_output.clear()
+
+
 async def test_1_tool_executor():
     """测试 1: ToolExecutor 能正确执行工具"""
-    print("\n" + "="*60)
-    print("🧪 测试 1: ToolExecutor")
-    print("="*60)
+    _emit("\n" + "="*60)
+    _emit("🧪 测试 1: ToolExecutor")
+    _emit("="*60)
 
     from app.core.agents.agentic_loop import ToolExecutor
     import tempfile
@@ -65,17 +89,17 @@ async def test_1_tool_executor():
         "content": "print('Hello from Agentic Loop!')\n"
     }))
     assert r["success"], f"write_file failed: {r}"
-    print(f"  ✅ write_file: {r['path']} ({r['size']}B)")
+    _emit(f"  ✅ write_file: {r['path']} ({r['size']}B)")
 
     # read_file
     r = json.loads(await executor.execute("read_file", {"path": "hello.py"}))
     assert "Hello from Agentic Loop" in r["content"]
-    print(f"  ✅ read_file: {r['lines']}")
+    _emit(f"  ✅ read_file: {r['lines']}")
 
     # bash
     r = json.loads(await executor.execute("bash", {"command": "python3 hello.py"}))
     assert r["exit_code"] == 0 and "Hello from Agentic Loop" in r["stdout"]
-    print(f"  ✅ bash: {r['stdout'].strip()}")
+    _emit(f"  ✅ bash: {r['stdout'].strip()}")
 
     # edit_file
     r = json.loads(await executor.execute("edit_file", {
@@ -86,19 +110,20 @@ async def test_1_tool_executor():
     assert r["success"]
     r = json.loads(await executor.execute("bash", {"command": "python3 hello.py"}))
     assert "EDITED" in r["stdout"]
-    print(f"  ✅ edit_file + verify: {r['stdout'].strip()}")
+    _emit(f"  ✅ edit_file + verify: {r['stdout'].strip()}")
 
     # list_dir
     result = await executor.execute("list_dir", {"path": "."})
     assert "hello.py" in result
-    print(f"  ✅ list_dir: found hello.py")
+    _emit(f"  ✅ list_dir: found hello.py")
 
     # grep_search
     result = await executor.execute("grep_search", {"pattern": "EDITED", "path": "."})
     assert "EDITED" in result
-    print(f"  ✅ grep_search: found pattern")
+    _emit(f"  ✅ grep_search: found pattern")
 
-    print(f"\n  ✅ ToolExecutor 全部通过!")
+    _emit(f"\n  ✅ ToolExecutor 全部通过!")
+    _flush()
 
     import shutil
     shutil.rmtree(work_dir, ignore_errors=True)
@@ -106,9 +131,9 @@ async def test_1_tool_executor():
 
 async def test_2_claude_provider_tools():
     """测试 2: ClaudeCompatibleProvider 支持 tools"""
-    print("\n" + "="*60)
-    print("🧪 测试 2: ClaudeCompatibleProvider with tools")
-    print("="*60)
+    _emit("\n" + "="*60)
+    _emit("🧪 测试 2: ClaudeCompatibleProvider with tools")
+    _emit("="*60)
 
     from app.core.ai_engine import AIEngine
 
@@ -128,7 +153,8 @@ async def test_2_claude_provider_tools():
 
     messages = [{"role": "user", "content": "What's the weather in Beijing? Use the get_weather tool."}]
 
-    print(f"  📡 Calling claude-opus-4-6 with tools...")
+    _emit(f"  📡 Calling claude-opus-4-6 with tools...")
+    _flush()
 
     result = await ai_engine.get_completion(
         messages=messages,
@@ -143,31 +169,32 @@ async def test_2_claude_provider_tools():
     assert "tool_uses" in result, "Missing tool_uses"
     assert "stop_reason" in result, "Missing stop_reason"
 
-    print(f"  ✅ content_blocks: {len(result['content_blocks'])} blocks")
-    print(f"  ✅ tool_uses: {len(result['tool_uses'])} calls")
-    print(f"  ✅ stop_reason: {result['stop_reason']}")
+    _emit(f"  ✅ content_blocks: {len(result['content_blocks'])} blocks")
+    _emit(f"  ✅ tool_uses: {len(result['tool_uses'])} calls")
+    _emit(f"  ✅ stop_reason: {result['stop_reason']}")
 
     if result['tool_uses']:
         tu = result['tool_uses'][0]
-        print(f"  ✅ tool_use: name={tu['name']}, id={tu['id']}, input={tu['input']}")
+        _emit(f"  ✅ tool_use: name={tu['name']}, id={tu['id']}, input={tu['input']}")
     else:
-        print(f"  ⚠️  AI didn't call tool (may happen), content: {result['content'][:200]}")
+        _emit(f"  ⚠️  AI didn't call tool (may happen), content: {result['content'][:200]}")
 
     # 向后兼容
     assert isinstance(result["content"], str)
-    print(f"  ✅ backward compat: content is str, tool_calls is {result.get('tool_calls')}")
+    _emit(f"  ✅ backward compat: content is str, tool_calls is {result.get('tool_calls')}")
 
-    print(f"\n  ✅ Provider 改造通过!")
+    _emit(f"\n  ✅ Provider 改造通过!")
+    _flush()
 
 
 async def test_3_agentic_loop():
     """测试 3: 完整 Agentic Loop"""
-    print("\n" + "="*60)
-    print("🧪 测试 3: 完整 Agentic Loop (AI 自主创建+执行代码)")
-    print("="*60)
+    _emit("\n" + "="*60)
+    _emit("🧪 测试 3: 完整 Agentic Loop (AI 自主创建+执行代码)")
+    _emit("="*60)
 
     from app.core.ai_engine import AIEngine
-    from app.core.agents.agentic_loop import AgenticLoop
+    from app.core.agents.agentic_loop import AgenticLoop, preview_args
     import tempfile
 
     ai_engine = AIEngine()
@@ -179,6 +206,7 @@ async def test_3_agentic_loop():
         model="claude-opus-4-6",
         max_turns=15
     )
+    await loop.prepare()
 
     task = (
         "Create a Python file called calc.py with functions add(a,b) and multiply(a,b). "
@@ -186,48 +214,54 @@ async def test_3_agentic_loop():
         "Run the tests with python3 and verify they pass."
     )
 
-    print(f"  📝 Task: {task[:80]}...")
-    print(f"  📁 Work dir: {work_dir}")
-    print()
+    _emit(f"  📝 Task: {task[:80]}...")
+    _emit(f"  📁 Work dir: {work_dir}")
+    _emit()
+    _flush()
 
     event_counts = {}
 
-    async for event in loop.run(task):
-        t = event["type"]
-        event_counts[t] = event_counts.get(t, 0) + 1
-
-        if t == "start":
-            print(f"  🚀 Started (model={event['model']})")
-        elif t == "text":
-            text = event["content"][:150].replace('\n', ' ')
-            print(f"  📝 [Turn {event.get('turn')}] {text}")
-        elif t == "tool_start":
-            args_str = json.dumps(event["args"], ensure_ascii=False)
-            if len(args_str) > 100:
-                args_str = args_str[:100] + "..."
-            print(f"  🔧 [Turn {event.get('turn')}] {event['tool']}({args_str})")
-        elif t == "tool_result":
-            icon = "✅" if event.get("success") else "❌"
-            preview = event.get("result", "")[:120].replace('\n', ' ')
-            print(f"  {icon} [Turn {event.get('turn')}] → {preview}")
-        elif t == "turn":
-            print(f"  🔄 Turn {event['turn']} done ({event['tool_calls_this_turn']} tools, total: {event['total_tool_calls']})")
-        elif t == "done":
-            print(f"\n  ✅ DONE! {event['turns']} turns, {event['total_tool_calls']} tool calls, {event['duration']:.1f}s")
-        elif t == "error":
-            print(f"\n  ❌ Error: {event.get('message')}")
-
-    print(f"\n  📊 Events: {event_counts}")
+    try:
+        async for event in loop.run(task):
+            t = event["type"]
+            event_counts[t] = event_counts.get(t, 0) + 1
+
+            if t == "start":
+                _emit(f"  🚀 Started (model={event['model']})")
+            elif t == "text":
+                text = event["content"][:150].replace('\n', ' ')
+                _emit(f"  📝 [Turn {event.get('turn')}] {text}")
+            elif t == "tool_start":
+                args_str = preview_args(event["args"])
+                _emit(f"  🔧 [Turn {event.get('turn')}] {event['tool']}({args_str})")
+            elif t == "tool_result":
+                icon = "✅" if event.get("success") else "❌"
+                preview = event.get("result", "")[:120].replace('\n', ' ')
+                _emit(f"  {icon} [Turn {event.get('turn')}] → {preview}")
+            elif t == "turn":
+                _emit(f"  🔄 Turn {event['turn']} done ({event['tool_calls_this_turn']} tools, total: {event['total_tool_calls']})")
+                _flush()
+            elif t == "done":
+                _emit(f"\n  ✅ DONE! {event['turns']} turns, {event['total_tool_calls']} tool calls, {event['duration']:.1f}s")
+                _flush()
+            elif t == "error":
+                _emit(f"\n  ❌ Error: {event.get('message')}")
+                _flush()
+    finally:
+        _flush()
+
+    _emit(f"\n  📊 Events: {event_counts}")
 
     # 验证文件创建
     calc_exists = os.path.exists(os.path.join(work_dir, "calc.py"))
     test_exists = os.path.exists(os.path.join(work_dir, "test_calc.py"))
-    print(f"  📁 calc.py: {'✅' if calc_exists else '❌'}")
-    print(f"  📁 test_calc.py: {'✅' if test_exists else '❌'}")
+    _emit(f"  📁 calc.py: {'✅' if calc_exists else '❌'}")
+    _emit(f"  📁 test_calc.py: {'✅' if test_exists else '❌'}")
 
     if calc_exists:
         with open(os.path.join(work_dir, "calc.py")) as f:
-            print(f"  📄 calc.py content:\n{f.read()}")
+            _emit(f"  📄 calc.py content:\n{f.read()}")
+    _flush()
 
     assert calc_exists, "calc.py should exist"
     assert test_exists, "test_calc.py should exist"
@@ -237,26 +271,27 @@ async def test_3_agentic_loop():
 
 
 async def main():
-    print("="*60)
-    print("🔧 CheapBuy Agentic Loop 集成测试")
-    print("="*60)
+    _emit("="*60)
+    _emit("🔧 CheapBuy Agentic Loop 集成测试")
+    _emit("="*60)
 
     # 测试 1: ToolExecutor（纯本地）
     await test_1_tool_executor()
 
     # 检查 API 配置
     try:
-        from app.config import settings
+        from app.config import get_settings
+        settings = get_settings()
         api_key = settings.OPENAI_API_KEY
         api_base = settings.OPENAI_API_BASE
         if not api_key:
-            print("\n⚠️  OPENAI_API_KEY 为空，跳过测试 2-3")
+            _emit("\n⚠️  OPENAI_API_KEY 为空，跳过测试 2-3")
             return
-        print(f"\n📡 API: {api_base}")
-        print(f"🔑 Key: {api_key[:8]}...{api_key[-4:]}")
+        _emit(f"\n📡 API: {api_base}")
+        _emit(f"🔑 Key: {api_key[:8]}...{api_key[-4:]}")
     except Exception as e:
-        print(f"\n❌ 配置加载失败: {e}")
-        print("   检查 .env 文件是否存在且包含必要字段")
+        _emit(f"\n❌ 配置加载失败: {e}")
+        _emit("   检查 .env 文件是否存在且包含必要字段")
         return
 
     # 测试 2: Provider 改造
@@ -265,15 +300,32 @@ async def main():
     # 测试 3: 完整 agentic loop
     await test_3_agentic_loop()
 
-    print("\n" + "="*60)
-    print("✅ 全部测试通过! Agentic Loop 改造成功!")
-    print("="*60)
-    print()
-    print("下一步:")
-    print("  1. 重启 CheapBuy: systemctl restart cheapbuy")
-    print("  2. 测试 SSE 端点: curl -N POST /api/v2/agent/agentic-task")
-    print("  3. 前端对接: useAgenticLoop hook")
+    _emit("\n" + "="*60)
+    _emit("✅ 全部测试通过! Agentic Loop 改造成功!")
+    _emit("="*60)
+    _emit()
+    _emit("下一步:")
+    _emit("  1. 重启 CheapBuy: systemctl restart cheapbuy")
+    _emit("  2. 测试 SSE 端点: curl -N POST /api/v2/agent/agentic-task")
+    _emit("  3. 前端对接: useAgenticLoop hook")
+
+
+async def _run():
+    try:
+        await main()
+    finally:
+        # 断言失败 / 异常时也把已缓冲的输出写出
+        _flush()
+        try:
+            from app.core.ai_engine import close_http_client
+        except ImportError:
+            return
+        await close_http_client()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    if load_env():
+        _emit(f"✅ 加载 .env: {env_file}")
+    else:
+        _emit(f"⚠️  未找到 .env: {env_file}")
+    asyncio.run(_run())
\ No newline at end of file
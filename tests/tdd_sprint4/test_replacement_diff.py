@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+TDD Sprint 4: edit_file diff matches the whole-file diff
+========================================================
+edit_file only hands the lines around the replacement to difflib. The
+result must still be exactly what difflib.unified_diff gives for the whole
+file, including:
+
+1. Inserted / removed text that spans several lines
+2. Changed lines that repeat their neighbours (ambiguous alignment)
+3. Files of 200+ lines, where difflib's autojunk heuristic applies
+4. Randomised edits against the whole-file diff
+"""
+
+import difflib
+import random
+import sys
+import os
+
+import pytest
+
+# Add new_v5_files to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'new_v5_files'))
+
+from file_tools import _replacement_diff
+
+
+def _full_diff(original: str, updated: str) -> list:
+    return list(difflib.unified_diff(
+        original.splitlines(keepends=True), updated.splitlines(keepends=True),
+        "a/f.py", "b/f.py", lineterm="",
+    ))
+
+
+def _assert_same_diff(original: str, old_str: str, new_str: str, index: int = None):
+    if index is None:
+        index = original.index(old_str)
+    updated = original[:index] + new_str + original[index + len(old_str):]
+    diff = list(_replacement_diff(original, updated, index, len(old_str), len(new_str), "f.py"))
+    assert diff == _full_diff(original, updated)
+    return diff
+
+
+def _source(n: int) -> str:
+    """A Python-like file of about n lines with many repeated lines"""
+    chunks = []
+    for i in range(n // 6):
+        chunks.append(f"def func_{i}(x):\n    y = x + {i}\n\n    return y\n\n\n")
+    return "".join(chunks)
+
+
+# ============================================================================
+# Test 1: multi-line replacements
+# ============================================================================
+class TestMultiLineEdits:
+    def test_insert_lines_keeps_trailing_context(self):
+        original = _source(60)
+        diff = _assert_same_diff(original, "    y = x + 4\n", "    y = x + 4\n    z = 1\n    z = 2\n")
+        assert diff[2].startswith("@@ -")
+
+    def test_replace_with_more_lines(self):
+        _assert_same_diff(_source(60), "return y\n\n\ndef func_5", "return y\n\n\n\n# moved\ndef func_5")
+
+    def test_delete_lines(self):
+        _assert_same_diff(_source(60), "def func_3(x):\n    y = x + 3\n\n", "")
+
+    def test_edit_at_file_start_and_end(self):
+        original = _source(60)
+        _assert_same_diff(original, "def func_0", "import os\n\ndef func_0")
+        _assert_same_diff(original, original[-12:], "    return 0\n", len(original) - 12)
+
+    def test_crlf_line_endings(self):
+        original = _source(60).replace("\n", "\r\n")
+        _assert_same_diff(original, "y = x + 2\r\n", "y = x + 2\r\n\r\n    y += 1\r\n")
+
+    def test_other_line_breaks(self):
+        _assert_same_diff(_source(60), "y = x + 2\n", "y = x\x0c+ 2\r")
+        _assert_same_diff("a\x0cb\nc\nd\n", "c", "x\ny")
+
+
+# ============================================================================
+# Test 2: changed lines that repeat their neighbours
+# ============================================================================
+class TestAmbiguousAlignment:
+    @pytest.mark.parametrize("n", [60, 600])
+    def test_blank_line_next_to_blank_lines(self, n):
+        original = _source(n)
+        for marker in ("def func_1(", "def func_8("):
+            _assert_same_diff(original, marker, "\n" + marker)
+            _assert_same_diff(original, "\n\n" + marker, marker)
+
+    def test_line_inside_a_run_of_equal_lines(self):
+        original = "head\n" + "x\n" * 30 + "tail\n" + "z\n" * 10
+        for pos in (5, 20, 33):
+            index = len("head\n") + 2 * pos if pos < 30 else original.index("tail")
+            _assert_same_diff(original, "", "x\n", index)
+            _assert_same_diff(original, "x\n", "", len("head\n") + 2 * min(pos, 29))
+
+    def test_changed_line_equals_lines_after_it(self):
+        original = "a\nb\n" + "y = 1\n" * 8 + "c\n" * 3
+        _assert_same_diff(original, "y =", "", original.index("y = 1") + 6)
+
+
+# ============================================================================
+# Test 3: files difflib applies autojunk to
+# ============================================================================
+class TestLargeFiles:
+    def test_popular_lines_inside_the_change(self):
+        original = _source(1200)
+        _assert_same_diff(
+            original,
+            "    y = x + 100\n\n    return y\n",
+            "    y = x * 100\n\n    return -y\n",
+        )
+
+    def test_edit_between_popular_lines(self):
+        original = _source(1200)
+        _assert_same_diff(original, "\n\n\ndef func_150", "\n\n\n# note\n\n\ndef func_150")
+
+
+# ============================================================================
+# Test 4: randomised edits
+# ============================================================================
+class TestRandomEdits:
+    @pytest.mark.parametrize("seed", range(6))
+    def test_matches_whole_file_diff(self, seed):
+        rng = random.Random(seed)
+        size = (20, 60, 250, 600, 40, 300)[seed]
+        vocab = [f"line {i}\n" for i in range((3, 10, 4, 40, 2, 300)[seed])] + ["\n", "}\n", "x"]
+        for _ in range(150):
+            original = "".join(rng.choice(vocab) for _ in range(rng.randint(1, size)))
+            index = rng.randrange(len(original) + 1)
+            old_str = original[index:index + rng.randint(0, 40)]
+            new_str = "".join(rng.choice(vocab) for _ in range(rng.randint(0, 6)))
+            if old_str != new_str:
+                _assert_same_diff(original, old_str, new_str, index)
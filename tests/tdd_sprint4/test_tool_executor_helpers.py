@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+TDD Sprint 4: ToolExecutor helper behaviour
+============================================
+Covers the helpers the agentic loop relies on for tool output handling:
+
+1. _bre_to_re() translates grep basic regex into Python re
+2. _truncate_output() keeps head/tail on line boundaries
+3. The read-result cache is invalidated by write_file / edit_file / bash
+4. _tool_failed() judges failure from the parsed tool result
+"""
+
+import asyncio
+import re
+import sys
+import os
+
+import pytest
+
+# Add project root to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from app.core.agents.agentic_loop import (
+    ToolExecutor, _bre_to_re, _tool_failed, _truncate_output,
+)
+
+
+def _matches(pattern: str, line: str) -> bool:
+    return re.search(_bre_to_re(pattern), line) is not None
+
+
+# ============================================================================
+# Test 1: grep BRE -> Python re translation
+# ============================================================================
+class TestBreToRe:
+    def test_escaped_alternation(self):
+        """\\| is alternation in GNU BRE"""
+        assert _matches(r"foo\|bar", "xx bar")
+        assert _matches(r"foo\|bar", "foo")
+
+    def test_escaped_plus_and_question(self):
+        assert _matches(r"a\+b", "aaab")
+        assert not _matches(r"a\+b", "b")
+        assert _matches(r"colou\?r", "color")
+
+    def test_escaped_interval(self):
+        assert _matches(r"x\{2\}", "axxb")
+        assert not _matches(r"^x\{2\}$", "x")
+
+    def test_groups_and_backreference(self):
+        assert _matches(r"\(ab\)\1", "abab")
+        assert not _matches(r"\(ab\)\1", "abac")
+
+    @pytest.mark.parametrize("pattern,literal,other", [
+        ("a+b", "a+b", "aab"),
+        ("x?y", "x?y", "y"),
+        ("f(x)", "f(x)", "fx"),
+        ("x{2}", "x{2}", "xx"),
+        ("foo|bar", "foo|bar", "foo"),
+    ])
+    def test_bare_operators_are_literal(self, pattern, literal, other):
+        """Unescaped + ? ( ) { } | are ordinary characters in BRE"""
+        assert _matches(pattern, literal)
+        assert not _matches(pattern, other)
+
+    def test_leading_star_is_literal(self):
+        assert _matches("*star", "a *star")
+        assert not _matches("*star", "star")
+
+    def test_posix_bracket_classes(self):
+        assert _matches(r"[[:digit:]]\{3\}", "id 123")
+        assert not _matches(r"[[:digit:]]\{3\}", "id 12")
+        assert _matches("[[:upper:]][[:lower:]]*", "Hello")
+
+    def test_bracket_literals(self):
+        """] first in a bracket and \\ inside a bracket are literal"""
+        assert _matches("[]x]", "a]")
+        assert _matches("[\\]", "back\\slash")
+
+    def test_negated_bracket(self):
+        assert _matches("[^[:alpha:][:space:]]", "ab 1")
+        assert not _matches("[^[:alpha:][:space:]]", "ab cd")
+
+    def test_word_boundaries(self):
+        assert _matches(r"\<foo\>", "a foo b")
+        assert not _matches(r"\<foo\>", "foobar")
+
+    def test_unsupported_class_raises(self):
+        with pytest.raises(re.error):
+            _bre_to_re("[[:cntrl:]]")
+
+
+# ============================================================================
+# Test 2: _truncate_output head/tail on line boundaries
+# ============================================================================
+class TestTruncateOutput:
+    def test_short_output_unchanged(self):
+        assert _truncate_output("abc\n", limit=100) == "abc\n"
+
+    def test_cuts_on_line_boundaries(self):
+        lines = [f"line {i:04d}" for i in range(2000)]
+        text = "\n".join(lines)
+        out = _truncate_output(text, limit=1000)
+        head, rest = out.split("\n...[truncated ", 1)
+        omitted, tail = rest.split(" chars]...\n", 1)
+        # Both sides consist of whole lines only
+        assert head.split("\n") == lines[:len(head.split("\n"))]
+        assert tail.split("\n") == lines[-len(tail.split("\n")):]
+        # Head gets about 60% of the budget, and the count is exact
+        assert len(head) <= 600 < len(head) + 20
+        assert len(head) + int(omitted) + len(tail) == len(text)
+
+    def test_keeps_the_end(self):
+        text = "x" * 5000 + "\nFAILED: 3 tests\n"
+        assert _truncate_output(text, limit=500).endswith("FAILED: 3 tests\n")
+
+
+# ============================================================================
+# Test 3: read-result cache invalidation
+# ============================================================================
+class TestResultCacheInvalidation:
+    def _run(self, coro):
+        return asyncio.run(coro)
+
+    def _cached_paths(self, executor):
+        return {key[1] for key in executor._result_cache}
+
+    def test_write_file_invalidates_only_that_file(self, tmp_path):
+        (tmp_path / "a.txt").write_text("old\n")
+        (tmp_path / "b.txt").write_text("other\n")
+        executor = ToolExecutor(str(tmp_path))
+        a, b = str(tmp_path / "a.txt"), str(tmp_path / "b.txt")
+
+        async def scenario():
+            await executor.execute("read_file", {"path": "a.txt"})
+            await executor.execute("read_file", {"path": "b.txt"})
+            await executor.execute("list_dir", {"path": "."})
+            assert self._cached_paths(executor) == {a, b, str(tmp_path)}
+            await executor.execute("write_file", {"path": "a.txt", "content": "new\n"})
+            # The file itself and its parent directory listing are dropped
+            assert self._cached_paths(executor) == {b}
+            return await executor.execute("read_file", {"path": "a.txt"})
+
+        assert "new" in self._run(scenario())
+
+    def test_edit_file_invalidates(self, tmp_path):
+        (tmp_path / "a.txt").write_text("value = 1\n")
+        executor = ToolExecutor(str(tmp_path))
+
+        async def scenario():
+            await executor.execute("read_file", {"path": "a.txt"})
+            await executor.execute("edit_file", {
+                "path": "a.txt", "old_str": "value = 1", "new_str": "value = 2"})
+            assert not executor._result_cache
+            return await executor.execute("read_file", {"path": "a.txt"})
+
+        assert "value = 2" in self._run(scenario())
+
+    def test_bash_clears_everything(self, tmp_path):
+        (tmp_path / "a.txt").write_text("x\n")
+        executor = ToolExecutor(str(tmp_path))
+
+        async def scenario():
+            await executor.execute("read_file", {"path": "a.txt"})
+            assert executor._result_cache
+            await executor.execute("bash", {"command": "true"})
+            assert not executor._result_cache
+
+        self._run(scenario())
+
+
+# ============================================================================
+# Test 4: _tool_failed judges the parsed result
+# ============================================================================
+class TestToolFailed:
+    @pytest.mark.parametrize("result", [
+        '{"error": "File not found"}',
+        '{"exit_code": 1, "stdout": "", "stderr": "boom"}',
+        '{"success": false}',
+        '{"passed": false}',
+        '{"failed": 2, "total": 5}',
+        'Error: something broke',
+    ])
+    def test_failures(self, result):
+        assert _tool_failed(result)
+
+    @pytest.mark.parametrize("result", [
+        '{"exit_code": 0, "stdout": "error: this is just output"}',
+        '{"success": true, "content": "no errors"}',
+        '{"failed": 0, "total": 5}',
+        '[1, 2, 3]',
+        '[DIR] src\n[FILE] main.py',
+    ])
+    def test_successes(self, result):
+        assert not _tool_failed(result)